@@ -1,73 +1,63 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
-import sys
-import cProfile
-import signal
-import subprocess
+from __future__ import print_function
+
+import json
 import logging
 
-from marrow.io.ioloop import IOLoop
 from marrow.script import execute, script, describe
-from marrow.server.http import HTTPServer
-
 
+from marrow.server.http.benchmark import run, SCENARIOS
 
-def hello(request):
-    return b'200 OK', [(b'Content-Length', b'13'), (b'Content-Type', b'text/plain')], [b'Hello world!\n']
 
 
 @script(
         title="Marrow HTTPD Benchmark",
-        version="1.0",
+        version="2.0",
         copyright="Copyright 2010 Alice Bevan-McGregor"
     )
 @describe(
         host="The interface to bind to.\nDefault: \"127.0.0.1\"",
-        port="The port number to bind to.\nDefault: 8888",
-        profile="If enabled, profiling results will be saved to \"results.prof\".",
-        threads="If defined, allow this many threads in the executor pool.\nDefault: No threading.",
-        verbose="Increase the logging level from INFO to DEBUG."
+        scenarios="A comma-separated list of scenarios to run.\nDefault: all of " + ", ".join(SCENARIOS) + ".",
+        threads="Also benchmark a threaded server with this many threads in the executor pool; zero to disable.\nDefault: 4",
+        requests="The number of requests to send per scenario.\nDefault: 10000",
+        concurrency="The number of concurrent connections.\nDefault: 25",
+        clients="The number of client processes amongst which connections are divided.\nDefault: 2",
+        loop="The event loop to use: marrow (the default) or asyncio.",
+        workers="The number of server processes to fork.\nDefault: 1",
+        reuseport="Compare a shared listening socket against per-worker SO_REUSEPORT sockets.  Requires --workers.",
+        output="Write the JSON results to this file rather than standard output.",
+        verbose="Report progress."
     )
-def main(host="127.0.0.1", port=8888, profile=False, threads=0, verbose=False):
-    """A simple benchmark of Marrow's HTTP server.
-    
-    This script requires that ApacheBench (ab) be installed.
-    Based on the simple benchmark for Tornado.
-    
-    If profiling is enabled, you can examine the results by running:
+def main(host="127.0.0.1", scenarios="", threads=4, requests=10000, concurrency=25, clients=2, loop="marrow", workers=1,
+        reuseport=False, output="", verbose=False):
+    """A benchmark of Marrow's HTTP server.
     
-    python -c 'import pstats; pstats.Stats("/tmp/prof").strip_dirs().sort_stats("time").print_callers(20)'
+    Each scenario is served by a fresh server process and loaded over the loopback interface by one or more client
+    processes.  Results, including requests per second and latency percentiles in milliseconds, are reported as JSON
+    for comparison between releases.  With multiple workers, the number of responses served by each is reported too.
     """
     
-    if threads == 0:
-        threads = False
+    logging.basicConfig(level=logging.INFO if verbose else logging.WARN)
     
-    logging.basicConfig(level=logging.DEBUG if verbose else logging.INFO)
+    scenarios = [i.strip() for i in scenarios.split(',') if i.strip()]
+    unknown = [i for i in scenarios if i not in SCENARIOS]
     
-    def do():
-        
-        server = HTTPServer(host=host, port=port, application=hello, threading=threads)
-        
-        def handle_sigchld(sig, frame):
-            server.io.add_callback(server.stop)
-        
-        signal.signal(signal.SIGCHLD, handle_sigchld)
-        
-        server.start(testing=IOLoop.instance())
-        proc = subprocess.Popen("ab -n 10000 -c 25 http://%s:%d/" % (host, port), shell=True)
-        server.io.start()
+    if unknown:
+        print("Unknown scenario: %s" % (", ".join(unknown), ))
+        return 1
     
-    try:
-        if not profile:
-            do()
+    results = run(scenarios, (False, threads) if threads else (False, ), requests, concurrency, clients, host, loop,
+            workers, (False, True) if reuseport else (False, ))
+    results = json.dumps(results, indent=4, sort_keys=True)
     
-        else:
-            cProfile.runctx('do()', globals(), locals(), 'results.prof')
-            sys.stdout.write(b"\nProfiling results written to: results.prof\n\n")
+    if not output:
+        print(results)
+        return
     
-    except KeyboardInterrupt:
-        sys.stdout.write(b"\nBenchmark cancelled.\n\n")
+    with open(output, 'w') as fh:
+        fh.write(results + "\n")
 
 
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Memory benchmark of per-connection state.
+
+Reports the memory, in bytes and allocated blocks, retained by each HTTPProtocol.Connection: as originally structured
+(an instance __dict__, a complete copy of the environment template, and a deque for the response queue) against the
+current slotted connection sharing the protocol-level template.  Both are measured freshly accepted and idle after
+serving a request; the IOStream and socket, identical in both cases, are excluded.
+"""
+
+from __future__ import print_function
+
+import sys
+import tracemalloc
+
+from collections import deque
+
+from marrow.server.http.input import EMPTY
+from marrow.server.http.timer import TimerWheel
+from marrow.server.http.parser import HeadParser
+from marrow.server.http.protocol import HTTPProtocol
+from marrow.server.http.sendfile import FileWrapper
+
+
+REQUEST = b"GET /articles/2010/12/marrow-http?page=2 HTTP/1.1\r\n" \
+        b"Host: www.example.com\r\n" \
+        b"Connection: keep-alive\r\n" \
+        b"User-Agent: Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36\r\n" \
+        b"Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n" \
+        b"Accept-Encoding: gzip, deflate, br\r\n" \
+        b"Accept-Language: en-CA,en;q=0.9\r\n\r\n"
+
+
+
+class Socket(object):
+    def getpeername(self):
+        return ('127.0.0.1', 54321)
+
+
+class Client(object):
+    """A stand-in for the IOStream, providing only what a connection touches when accepted."""
+    
+    socket = Socket()
+    
+    def read_until(self, delimiter, callback):
+        pass
+
+
+class Server(object):
+    name = 'localhost'
+    address = ('127.0.0.1', 8080)
+    threaded = False
+    fork = 1
+
+
+class Protocol(object):
+    head_timeout = idle_timeout = 30
+    
+    def __init__(self):
+        self.timers = TimerWheel()
+        self.template = template()
+
+
+def template():
+    env = dict()
+    env['SERVER_NAME'] = 'localhost'
+    env['SERVER_ADDR'] = '127.0.0.1'
+    env['SERVER_PORT'] = '8080'
+    env['SCRIPT_NAME'] = ''
+    env['wsgi.input'] = EMPTY
+    env['wsgi.errors'] = sys.stderr
+    env['wsgi.file_wrapper'] = FileWrapper
+    env['wsgi.version'] = (2, 0)
+    env['wsgi.multithread'] = False
+    env['wsgi.multiprocess'] = False
+    env['wsgi.run_once'] = False
+    env['wsgi.url_scheme'] = 'http'
+    env['wsgi.async'] = False
+    return env
+
+
+class Legacy(object):
+    """The state held by HTTPProtocol.Connection prior to the introduction of __slots__."""
+    
+    def __init__(self, server, protocol, client):
+        self.server = server
+        self.protocol = protocol
+        self.client = client
+        
+        env = template()
+        env['REMOTE_ADDR'] = client.socket.getpeername()
+        
+        self.environ = None
+        self.environ_template = env
+        
+        self.finished = False
+        self.streaming = False
+        self.writer = None
+        self.queue = deque()
+        self.waiting = None
+        self.timeout = protocol.timers.schedule(protocol.head_timeout, self.finish)
+    
+    def finish(self):
+        pass
+    
+    def served(self, parser):
+        # The environment of the last request was retained until the next arrived.
+        self.environ = parser(REQUEST, dict(self.environ_template))
+        self.chunked = False
+        self.remaining = 0
+
+
+class Current(HTTPProtocol.Connection):
+    __slots__ = ()
+    
+    def served(self, parser):
+        self.environ = parser(REQUEST, dict(self.protocol.template))
+        self.environ['REMOTE_ADDR'] = self.remote
+        self.read_head()
+
+
+def measure(cls, number, idle):
+    server, protocol, client, parser = Server(), Protocol(), Client(), HeadParser()
+    retained = []
+    
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    
+    for i in range(number):
+        connection = cls(server, protocol, client)
+        if idle: connection.served(parser)
+        retained.append(connection)
+    
+    stats = tracemalloc.take_snapshot().compare_to(start, 'filename')
+    tracemalloc.stop()
+    
+    return sum(i.size_diff for i in stats) / float(number), sum(i.count_diff for i in stats) / float(number)
+
+
+def main(number=10000):
+    print("%-9s %-7s %10s %10s" % ("state", "", "bytes", "blocks"))
+    
+    for state, idle in (('accepted', False), ('idle', True)):
+        for label, cls in (('before', Legacy), ('after', Current)):
+            size, blocks = measure(cls, number, idle)
+            print("%-9s %-7s %10.0f %10.1f" % (state, label, size, blocks))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:2]])
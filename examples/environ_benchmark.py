@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""Micro-benchmark of per-request environment and wsgi.input construction.
+
+Compares the cost, in time and in memory allocated, of preparing the environment for a request the way
+HTTPProtocol.Connection.headers did in marrow.server.http 0.9 (a SpooledTemporaryFile for every request) against the
+current approach: the shared EMPTY input for bodyless requests and a plain BytesIO for small bodies.
+"""
+
+from __future__ import print_function
+
+import sys
+import timeit
+import tempfile
+import tracemalloc
+
+from io import BytesIO
+
+from marrow.server.http.input import EMPTY
+
+
+TEMPLATE = dict(
+        REMOTE_ADDR = ('127.0.0.1', 54321),
+        SERVER_NAME = 'localhost',
+        SERVER_ADDR = '127.0.0.1',
+        SERVER_PORT = '8080',
+        SCRIPT_NAME = '',
+        **{
+            'wsgi.input': EMPTY,
+            'wsgi.errors': sys.stderr,
+            'wsgi.version': (2, 0),
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'wsgi.url_scheme': 'http',
+            'wsgi.async': False
+        }
+    )
+
+BODY = b'{"user": 12345, "fields": ["name", "email"]}'
+
+
+def spooled():
+    return tempfile.SpooledTemporaryFile(1*1024*1024, 'w+b', suffix='http', prefix='marrow')
+
+
+def before_get():
+    environ = dict(TEMPLATE)
+    environ['wsgi.input'] = spooled()
+    environ['wsgi.input'].seek(0)
+    return environ
+
+
+def after_get():
+    return dict(TEMPLATE)
+
+
+def before_post():
+    environ = dict(TEMPLATE)
+    environ['wsgi.input'] = spooled()
+    environ['wsgi.input'].write(BODY)
+    environ['wsgi.input'].seek(0)
+    return environ
+
+
+def after_post():
+    environ = dict(TEMPLATE)
+    environ['wsgi.input'] = BytesIO()
+    environ['wsgi.input'].write(BODY)
+    environ['wsgi.input'].seek(0)
+    return environ
+
+
+def allocations(fn, number):
+    """Return the bytes and blocks allocated, and still live, per call."""
+    
+    retained = []
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    
+    for i in range(number):
+        retained.append(fn())
+    
+    stats = tracemalloc.take_snapshot().compare_to(start, 'filename')
+    tracemalloc.stop()
+    
+    return sum(i.size_diff for i in stats) / float(number), sum(i.count_diff for i in stats) / float(number)
+
+
+def main(number=20000):
+    print("%-6s %-7s %10s %10s %10s" % ("case", "", "ns", "bytes", "blocks"))
+    
+    for case, before, after in (('GET', before_get, after_get), ('POST', before_post, after_post)):
+        for label, fn in (('before', before), ('after', after)):
+            duration = min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+            size, blocks = allocations(fn, number // 10)
+            print("%-6s %-7s %10.0f %10.0f %10.1f" % (case, label, duration, size, blocks))
+
+
+if __name__ == '__main__':
+    main(*[int(i) for i in sys.argv[1:2]])
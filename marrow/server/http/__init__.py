@@ -1,5 +1,11 @@
 # encoding: utf-8
 
+import os
+import time
+import random
+import signal
+import socket
+
 try:
     import fcntl
 except ImportError:
@@ -10,15 +16,162 @@ except ImportError:
     else:
         raise
 
+from marrow.io.ioloop import PeriodicCallback
 from marrow.server.base import Server
 
 from marrow.server.http.protocol import HTTPProtocol
+from marrow.server.http.master import Master, processors, memory, resident
 
 
 __all__ = ['HTTPProtocol', 'HTTPServer']
 log = __import__('logging').getLogger(__name__)
 
 
+REUSEPORT = getattr(socket, 'SO_REUSEPORT', None)
+
+
 
 class HTTPServer(Server):
+    """An HTTP/1.1 server.
+    
+    When forking, all workers accept connections from a single listening socket bound by the master process unless
+    `reuseport` is enabled, in which case each worker binds its own using SO_REUSEPORT and the kernel balances new
+    connections amongst them.  If `affinity` is enabled, each worker is pinned to a single CPU.
+    
+    If the application was loaded before starting the server, `freeze` improves the sharing of its memory amongst
+    workers, and disabling `full_collections` improves it further; see marrow.server.http.master.
+    
+    Workers which exit are replaced.  A worker is recycled -- it stops accepting connections, finishes the requests
+    in progress, and exits to be replaced -- once it has delivered `max_requests` responses, plus up to
+    `max_requests_jitter` more chosen at random so that workers don't all restart at once, or once its resident memory
+    exceeds `max_memory` bytes.  Workers receiving SIGTERM exit the same way.  Connections still open after `grace`
+    seconds are abandoned.
+    """
+    
     protocol = HTTPProtocol
+    
+    def __init__(self, host=None, port=None, reuseport=False, affinity=False, freeze=False, full_collections=True,
+            max_requests=None, max_requests_jitter=0, max_memory=None, grace=30, **options):
+        super(HTTPServer, self).__init__(host, port, **options)
+        
+        if reuseport and REUSEPORT is None:
+            raise ValueError("SO_REUSEPORT is not supported on this platform.")
+        
+        self.reuseport = reuseport
+        self.affinity = affinity
+        self.freeze = freeze
+        self.full_collections = full_collections
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.max_memory = max_memory
+        self.grace = grace
+        self.limit = None
+        self.watchdog = None
+        self.draining = False
+    
+    def start(self, testing=False):
+        if testing or self.fork == 1:
+            return super(HTTPServer, self).start(testing)
+        
+        if not self.reuseport:
+            # Bound once here, then inherited by every worker.
+            self.socket = self._socket()
+            self.socket.bind(self.address)
+            self.socket.listen(self.pool)
+        
+        Master(self.worker, processors(self.fork), self.affinity, self.freeze, self.full_collections, True).run()
+    
+    def worker(self, index):
+        if self.reuseport:
+            self.socket = self._socket()
+            self.socket.bind(self.address)
+            self.socket.listen(self.pool)
+        
+        self.serve(False)
+        self.started(index)
+        
+        try:
+            self.io.start()
+        
+        finally:
+            self.stop()
+    
+    def started(self, index):
+        """Called in each worker once it is ready to accept connections."""
+        
+        usage = memory()
+        
+        if usage is not None:
+            log.info("Worker %d (PID %d) started: %d KiB resident, %d KiB shared, %d KiB private, %d KiB proportional.",
+                    index, os.getpid(), usage['rss'] // 1024, usage['shared'] // 1024, usage['private'] // 1024,
+                    usage['pss'] // 1024)
+        
+        # The handler may interrupt the IOLoop at any point; defer the real work to it.
+        signal.signal(signal.SIGTERM, lambda number, frame: self.io.add_callback(self.drain))
+        
+        if self.max_requests:
+            self.limit = self.max_requests + random.randint(0, self.max_requests_jitter or 0)
+        
+        if self.limit or self.max_memory:
+            self.watchdog = PeriodicCallback(self.inspect, 1000, self.io)
+            self.watchdog.start()
+    
+    def inspect(self):
+        """Periodically determine if this worker should be recycled."""
+        
+        if self.limit and self.protocol.completed >= self.limit:
+            log.info("Recycling worker (PID %d) after %d requests.", os.getpid(), self.protocol.completed)
+            self.drain()
+            return
+        
+        if self.max_memory:
+            usage = resident()
+            
+            if usage and usage > self.max_memory:
+                log.warning("Recycling worker (PID %d) using %d KiB of memory.", os.getpid(), usage // 1024)
+                self.drain()
+    
+    def drain(self):
+        """Stop accepting connections, then stop serving once those open have closed or `grace` seconds have passed."""
+        
+        if self.draining:
+            return
+        
+        self.draining = True
+        
+        if self.watchdog is not None:
+            self.watchdog.stop()
+            self.watchdog = None
+        
+        self.deafen()
+        self.protocol.drain(self.io.stop)
+        
+        if self.grace:
+            self.io.add_timeout(time.time() + self.grace, self.io.stop)
+    
+    def deafen(self):
+        """Stop accepting new connections."""
+        
+        self.io.remove_handler(self.socket.fileno())
+        self.socket.close()
+    
+    def pause(self):
+        """Temporarily stop accepting connections, leaving them waiting in the listen backlog."""
+        
+        self.io.update_handler(self.socket.fileno(), 0)
+    
+    def resume(self):
+        self.io.update_handler(self.socket.fileno(), self.io.READ)
+    
+    def _socket(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        
+        if self.reuseport:
+            sock.setsockopt(socket.SOL_SOCKET, REUSEPORT, 1)
+        
+        flags = fcntl.fcntl(sock.fileno(), fcntl.F_GETFD)
+        fcntl.fcntl(sock.fileno(), fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+        sock.setblocking(0)
+        
+        return sock
@@ -0,0 +1,221 @@
+# encoding: utf-8
+
+"""A buffered access log.
+
+Formatting and writing a log line for every request would cost the IOLoop thread more than many requests do.  Instead,
+as each response is delivered, a fixed-layout record of it -- a tuple -- is stored in a preallocated ring buffer; a
+background thread formats the records accumulated every `interval` seconds and writes them in a single call.  If the
+buffer fills faster than it is written, further records are counted as dropped rather than slowing the server.
+
+Records may be sampled, keeping the given fraction of them; server errors are always kept.  Each record contains:
+
+* `time` -- when the response was delivered, in seconds since the epoch;
+* `remote` -- the client address;
+* `method`, `path`, `query`, and `protocol` -- from the request line;
+* `status` -- the three-digit response status;
+* `size` -- bytes of the response body sent, excluding any chunked framing;
+* `duration` -- seconds from the arrival of the request head until the response was delivered;
+* `referer` and `agent` -- the request's `Referer` and `User-Agent` headers.
+
+Logs are written in the `combined` or `common` log formats, or as JSON lines (`json`); `format` may also be a callable
+accepting a record and returning a line.  As in Apache's logs, quotes, backslashes, and control characters within the
+request fields of the text formats are escaped.  When given a path, each worker process opens it for appending, and each
+batch is written by a single system call, so that batches from several workers sharing the file don't interleave.
+"""
+
+import os
+import json
+import time
+import threading
+
+from random import random
+
+from marrow.util.compat import binary, unicode
+
+
+__all__ = ['AccessLog', 'FORMATS']
+log = __import__('logging').getLogger(__name__)
+
+
+FIELDS = ('time', 'remote', 'method', 'path', 'query', 'protocol', 'status', 'size', 'duration', 'referer', 'agent')
+
+# Escapes for quoted fields of text formats, as Apache applies them, so that no request can forge or break a line.
+ESCAPES = dict((i, '\\x%02x' % (i, )) for i in list(range(0x20)) + list(range(0x7f, 0xa0)))
+ESCAPES.update({ord('"'): '\\"', ord('\\'): '\\\\'})
+
+
+
+def text(value, default='-'):
+    if value is None or value == '':
+        return default
+    
+    if isinstance(value, binary):
+        return value.decode('iso-8859-1')
+    
+    if isinstance(value, tuple):
+        # An address; the host alone.
+        return text(value[0], default)
+    
+    return value if isinstance(value, unicode) else unicode(value)
+
+
+def quoted(value, default='-'):
+    return text(value, default).translate(ESCAPES)
+
+
+class Timestamp(object):
+    """Format timestamps as in Apache logs, reformatting at most once a second."""
+    
+    def __init__(self):
+        self.second = None
+        self.value = None
+    
+    def __call__(self, when):
+        second = int(when)
+        
+        if second != self.second:
+            self.value = time.strftime('%d/%b/%Y:%H:%M:%S +0000', time.gmtime(second))
+            self.second = second
+        
+        return self.value
+
+
+def common(record, timestamp=None):
+    when, remote, method, path, query, protocol, status, size, duration, referer, agent = record
+    
+    return '%s - - [%s] "%s %s%s %s" %s %s' % (text(remote), (timestamp or Timestamp())(when), quoted(method),
+            quoted(path, '/'), '?' + quoted(query) if query else '', quoted(protocol), text(status), size or '-')
+
+
+def combined(record, timestamp=None):
+    return '%s "%s" "%s"' % (common(record, timestamp), quoted(record[9]), quoted(record[10]))
+
+
+def jsonl(record, timestamp=None):
+    entry = dict(zip(FIELDS, (text(i, None) if isinstance(i, (binary, tuple)) else i for i in record)))
+    entry['time'] = round(record[0], 3)
+    entry['duration'] = None if record[8] is None else round(record[8] * 1000, 3) # In milliseconds.
+    entry['status'] = int(record[6]) if record[6] else None
+    
+    return json.dumps(entry, sort_keys=True)
+
+
+FORMATS = dict(common=common, combined=combined, json=jsonl)
+
+
+class AccessLog(object):
+    """Record delivered responses, writing them to `target` (a path or file-like object) every `interval` seconds.
+    
+    The buffer holds up to `size` records; `sample` is the fraction of records kept.
+    """
+    
+    def __init__(self, target, format='combined', size=65536, interval=1.0, sample=1.0):
+        self.target = target
+        self.format = FORMATS[format] if isinstance(format, str) else format
+        self.size = size
+        self.interval = interval
+        self.sample = sample
+        self.ring = [None] * size
+        self.head = 0 # Records stored; advanced only by the IOLoop thread.
+        self.tail = 0 # Records written; advanced only by the writer thread.
+        self.dropped = 0 # Records not stored for lack of room; advanced only by the IOLoop thread.
+        self.reported = 0
+        self.descriptor = None
+        self.timestamp = Timestamp()
+        self.thread = None
+        self.finished = threading.Event()
+    
+    def start(self):
+        if not hasattr(self.target, 'write'):
+            self.descriptor = os.open(self.target, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        
+        self.finished.clear()
+        self.thread = threading.Thread(target=self.run, name="marrow.server.http.access")
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def stop(self):
+        if self.thread is not None:
+            self.finished.set()
+            self.thread.join()
+            self.thread = None
+        
+        self.flush()
+        
+        if self.descriptor is not None:
+            os.close(self.descriptor)
+            self.descriptor = None
+    
+    def record(self, env, status, size, duration):
+        """Store a record of a delivered response; called from the IOLoop thread."""
+        
+        if self.sample < 1 and status[:1] != b'5' and random() >= self.sample:
+            return
+        
+        head = self.head
+        
+        if head - self.tail >= self.size:
+            self.dropped += 1
+            return
+        
+        get = env.get
+        self.ring[head % self.size] = (time.time(), get('REMOTE_ADDR'),
+                'HEAD' if get('marrow.head') else get('REQUEST_METHOD'), get('PATH_INFO'),
+                get('QUERY_STRING'), get('SERVER_PROTOCOL'), status, size, duration, get('HTTP_REFERER'),
+                get('HTTP_USER_AGENT'))
+        
+        self.head = head + 1
+    
+    def run(self):
+        while not self.finished.wait(self.interval):
+            self.flush()
+    
+    def flush(self):
+        """Write any stored records, returning the number written."""
+        
+        head, tail = self.head, self.tail
+        
+        if head == tail:
+            return 0
+        
+        ring, size, format, timestamp = self.ring, self.size, self.format, self.timestamp
+        lines = []
+        
+        for i in range(tail, head):
+            try:
+                lines.append(format(ring[i % size], timestamp))
+            
+            except:
+                log.exception("Unable to format access log record: %r", ring[i % size])
+            
+            ring[i % size] = None
+        
+        self.tail = head
+        
+        if not lines:
+            return 0
+        
+        dropped = self.dropped
+        
+        if dropped != self.reported:
+            log.warning("Dropped %d access log records; the buffer is too small or the log can't keep up.",
+                    dropped - self.reported)
+            self.reported = dropped
+        
+        data = '\n'.join(lines) + '\n'
+        
+        try:
+            if self.descriptor is None:
+                self.target.write(data)
+                self.target.flush()
+            
+            else:
+                data = data.encode('utf-8')
+                
+                while data:
+                    data = data[os.write(self.descriptor, data):]
+        
+        except EnvironmentError:
+            log.exception("Unable to write the access log.")
+        
+        return head - tail
@@ -0,0 +1,113 @@
+# encoding: utf-8
+
+"""Admission control for the threaded executor.
+
+Without a limit, every request is submitted to the executor as soon as it is received; under overload its queue grows
+without bound, and every request waits behind it, until all of them time out.  Instead, requests beyond a limit on the
+number in flight (submitted, but not yet composed) are refused immediately with a `503 Service Unavailable`, while
+those admitted are served promptly.
+
+The limit adapts to the latency of admitted requests, measured from submission, so including any time spent waiting
+for a thread.  A short-term average is compared against a long-term one; while the two agree, and the limit is being
+approached, it grows, and as queueing pushes the short-term average above the long-term one (by more than
+`tolerance`) it shrinks in proportion.  The limit never falls below the number of executor threads, so requests are
+only refused once every thread is busy and more are waiting.  A fixed bound on the number waiting may also be given.
+
+All accounting happens in the IOLoop thread; nothing is locked.
+"""
+
+from math import sqrt
+
+
+__all__ = ['Admission']
+log = __import__('logging').getLogger(__name__)
+
+
+
+class Admission(object):
+    """An adaptive limit on the number of requests in flight in the executor.
+    
+    `minimum` defaults to the number of executor threads, `initial` to twice that; `queue`, if given, limits the
+    number of requests waiting for a thread regardless of the adaptive limit.
+    """
+    
+    def __init__(self, initial=None, minimum=None, maximum=1000, queue=None, tolerance=1.5, smoothing=0.2, window=500):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.queue = queue
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.window = window
+        self.threads = None
+        self.limit = initial
+        self.inflight = 0
+        self.short = None # Average latency over recent requests, in seconds.
+        self.long = None # Average latency over roughly `window` requests.
+        self.admitted = 0
+        self.refused = 0
+    
+    @property
+    def queued(self):
+        """The number of requests in flight waiting for an executor thread."""
+        
+        return max(0, self.inflight - (self.threads or 0))
+    
+    def start(self, executor):
+        # ThreadPoolExecutor doesn't otherwise expose its size.
+        self.threads = getattr(executor, '_max_workers', None)
+        
+        if self.minimum is None:
+            self.minimum = self.threads or 1
+        
+        if self.initial is None:
+            self.initial = self.minimum * 2
+        
+        self.limit = float(min(max(self.initial, self.minimum), self.maximum))
+    
+    def admit(self):
+        """Reserve a place for a request, returning False if it should be refused."""
+        
+        if self.inflight >= int(self.limit) or (self.queue is not None and self.queued >= self.queue):
+            self.refused += 1
+            return False
+        
+        self.inflight += 1
+        self.admitted += 1
+        return True
+    
+    def release(self, latency):
+        """Release the place of an admitted request, adjusting the limit according to its latency."""
+        
+        self.inflight -= 1
+        
+        if self.long is None:
+            self.short = self.long = latency
+            return
+        
+        self.short += (latency - self.short) * 0.1
+        self.long += (latency - self.long) / self.window
+        
+        if self.long > self.short * 2:
+            # Recovering from a period of overload; let the long-term average catch up.
+            self.long *= 0.95
+        
+        gradient = max(0.5, min(1.0, self.tolerance * self.long / self.short)) if self.short else 1.0
+        target = self.limit * gradient
+        
+        if self.inflight * 2 >= self.limit:
+            # Only grow the limit while it is actually being approached.
+            target += sqrt(self.limit)
+        
+        limit = self.limit + (target - self.limit) * self.smoothing
+        self.limit = min(max(limit, self.minimum), self.maximum)
+    
+    def snapshot(self):
+        return dict(
+                limit = int(self.limit),
+                inflight = self.inflight,
+                queued = self.queued,
+                admitted = self.admitted,
+                refused = self.refused,
+                latency = None if self.short is None else round(self.short * 1000, 3)
+            )
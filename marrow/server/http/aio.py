@@ -0,0 +1,376 @@
+# encoding: utf-8
+
+"""An asyncio transport backend for HTTPProtocol.
+
+HTTPProtocol is written against the marrow.io IOLoop and IOStream.  This module presents an asyncio event loop and its
+transports through the small subset of those interfaces the protocol uses, so the same request parsing and response
+composition code runs unmodified within an asyncio application, or on an alternative event loop implementation.
+
+Requires Python 3.7 or later.
+"""
+
+import os
+import time
+import asyncio
+
+from functools import partial
+from concurrent.futures import Future
+
+from marrow.server.http import HTTPServer as BaseHTTPServer
+
+
+__all__ = ['IOLoop', 'Stream', 'HTTPServer']
+log = __import__('logging').getLogger(__name__)
+
+
+
+class IOLoop(object):
+    """Present an asyncio event loop as a marrow.io IOLoop."""
+    
+    NONE = 0
+    READ = 0x001
+    WRITE = 0x004
+    ERROR = 0x018
+    
+    def __init__(self, loop):
+        self.loop = loop
+    
+    def add_callback(self, callback):
+        """Run the callback on the next iteration of the loop; safe to call from any thread."""
+        
+        self.loop.call_soon_threadsafe(callback)
+    
+    def schedule(self, awaitable):
+        """Run an awaitable on the loop, returning a concurrent.futures.Future of its result; safe from any thread."""
+        
+        future = Future()
+        
+        def done(task):
+            if task.cancelled():
+                future.set_exception(asyncio.CancelledError())
+            
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            
+            else:
+                future.set_result(task.result())
+        
+        def run():
+            asyncio.ensure_future(awaitable, loop=self.loop).add_done_callback(done)
+        
+        self.loop.call_soon_threadsafe(run)
+        
+        return future
+    
+    def add_timeout(self, deadline, callback):
+        return self.loop.call_later(max(deadline - time.time(), 0), callback)
+    
+    def remove_timeout(self, timeout):
+        timeout.cancel()
+    
+    def add_handler(self, fd, handler, events):
+        if events & self.READ:
+            self.loop.add_reader(fd, handler, fd, self.READ)
+        
+        if events & self.WRITE:
+            self.loop.add_writer(fd, handler, fd, self.WRITE)
+    
+    def remove_handler(self, fd):
+        self.loop.remove_reader(fd)
+        self.loop.remove_writer(fd)
+    
+    def start(self):
+        self.loop.run_forever()
+    
+    def stop(self):
+        self.loop.stop()
+
+
+class Stream(asyncio.Protocol):
+    """Present an asyncio transport as a marrow.io IOStream.
+    
+    As with IOStream, a write callback is run only once everything written has been handed to the kernel; the
+    transport's write buffer limits are set to zero so that flow control reports exactly that.  Reading is paused
+    while no read is pending and `read_size` bytes are already buffered, pushing back on the client.
+    """
+    
+    max_buffer_size = 104857600
+    
+    def __init__(self, server, read_size=65536):
+        self.server = server
+        self.read_size = read_size
+        self.loop = server.loop
+        
+        self.transport = None
+        self.socket = None
+        self.buffer = bytearray()
+        self.reader = None
+        self.reading = True
+        self.writer = None
+        self.paused = False
+        self.close_callback = None
+        self._closed = False
+    
+    # asyncio.Protocol interface.
+    
+    def connection_made(self, transport):
+        self.transport = transport
+        self.socket = transport.get_extra_info('socket')
+        transport.set_write_buffer_limits(0)
+        
+        self.server.protocol.accept(self)
+    
+    def data_received(self, data):
+        self.buffer += data
+        self.consume()
+        
+        if self.reader is not None and len(self.buffer) > self.max_buffer_size:
+            # A pending read which can't be satisfied without buffering more than is allowed.
+            log.error("Reached maximum read buffer size.")
+            self.close()
+            return
+        
+        if self.reader is None and len(self.buffer) >= self.read_size:
+            self.reading = False
+            self.transport.pause_reading()
+    
+    def pause_writing(self):
+        self.paused = True
+    
+    def resume_writing(self):
+        self.paused = False
+        self.written()
+    
+    def connection_lost(self, exc):
+        self._closed = True
+        self.reader = self.writer = None
+        
+        callback, self.close_callback = self.close_callback, None
+        
+        if callback is not None:
+            callback()
+    
+    # IOStream interface.
+    
+    def read_until(self, delimiter, callback):
+        assert self.reader is None, "Already reading."
+        self.reader = (delimiter, None, callback)
+        self.consume()
+    
+    def read_bytes(self, count, callback):
+        assert self.reader is None, "Already reading."
+        self.reader = (None, count, callback)
+        self.consume()
+    
+    def consume(self):
+        """Satisfy the pending read, if possible, from the buffer; otherwise ensure more data is being read."""
+        
+        if self.reader is None:
+            return
+        
+        delimiter, count, callback = self.reader
+        
+        if delimiter is not None:
+            count = self.buffer.find(delimiter)
+            count = -1 if count < 0 else count + len(delimiter)
+        
+        elif len(self.buffer) < count:
+            count = -1
+        
+        if count < 0:
+            if not self.reading and not self._closed:
+                self.reading = True
+                self.transport.resume_reading()
+            
+            return
+        
+        data = bytes(self.buffer[:count])
+        del self.buffer[:count]
+        self.reader = None
+        
+        self.loop.call_soon(callback, data)
+    
+    def write(self, data, callback=None):
+        if self._closed:
+            raise IOError("Stream is closed.")
+        
+        if data:
+            self.transport.write(data)
+        
+        self.writer = callback
+        
+        if callback is not None and not self.paused:
+            self.loop.call_soon(self.written)
+    
+    def written(self):
+        callback, self.writer = self.writer, None
+        
+        if callback is not None:
+            callback()
+    
+    def sendfile(self, fd, offset, count, callback):
+        """Transmit a portion of a file using the event loop, then call back with the number of bytes sent.
+        
+        The transport's buffer is flushed first, and writing it is paused until transmission completes.
+        """
+        
+        # loop.sendfile requires a file object; it must not close the descriptor belonging to the response body.
+        fileobj = os.fdopen(os.dup(fd), 'rb')
+        
+        def done(future):
+            fileobj.close()
+            
+            if future.cancelled() or future.exception() is not None:
+                error = None if future.cancelled() else future.exception()
+                
+                if error is None or isinstance(error, ConnectionError):
+                    log.debug("Client disconnected during file transmission.")
+                
+                else:
+                    log.error("Error transmitting file.", exc_info=error)
+                
+                # Closed first, so the body writer doesn't mistake the shortfall for a truncated file.
+                self.close()
+                callback(0)
+                return
+            
+            callback(future.result())
+        
+        future = asyncio.ensure_future(self.loop.sendfile(self.transport, fileobj, offset, count), loop=self.loop)
+        future.add_done_callback(done)
+    
+    def writing(self):
+        return self.paused or self.writer is not None
+    
+    def closed(self):
+        return self._closed
+    
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.transport.close()
+    
+    def set_close_callback(self, callback):
+        self.close_callback = callback
+
+
+class HTTPServer(BaseHTTPServer):
+    """An HTTPServer using an asyncio event loop in place of the marrow.io IOLoop.
+    
+    The event loop used may be passed as `loop`; by default a new one is created.  When forking, each worker process
+    creates its own.
+    """
+    
+    def __init__(self, host=None, port=8080, loop=None, **options):
+        super(HTTPServer, self).__init__(host, port, **options)
+        
+        if self.fork != 1 and loop is not None:
+            raise ValueError("An event loop can not be shared amongst forked workers.")
+        
+        self.loop = loop
+        self.listener = None
+        self.socket = None
+    
+    def serve(self):
+        """Begin accepting connections, returning a future which completes once the server is ready.
+        
+        Within a running event loop, await the result; otherwise run the loop until it completes, as `start` does.
+        """
+        
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        
+        self.io = IOLoop(self.loop)
+        
+        if self.threaded is not False:
+            from concurrent.futures import ThreadPoolExecutor
+            self.executor = ThreadPoolExecutor(None if self.threaded is True else self.threaded)
+        
+        host, port = self.address
+        factory = partial(Stream, self, self.options.get('read_size', 65536))
+        
+        if self.socket is not None:
+            # Inherited from the master process.
+            created = self.loop.create_server(factory, sock=self.socket, backlog=self.pool)
+        
+        else:
+            created = self.loop.create_server(factory, host or None, port, backlog=self.pool, reuse_address=True,
+                    reuse_port=self.reuseport or None)
+        
+        future = asyncio.ensure_future(created, loop=self.loop)
+        
+        # Run before any connection can be accepted, and before anything awaiting the future is resumed.
+        future.add_done_callback(self.listening)
+        
+        return future
+    
+    def listening(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        
+        self.listener = future.result()
+        
+        # If bound to an ephemeral port, report the one actually allocated.
+        self.address = (self.address[0], self.listener.sockets[0].getsockname()[1])
+        
+        self.protocol = self.protocol(self, False, **self.options)
+        self.protocol.start()
+    
+    def start(self, testing=False):
+        """Serve requests until interrupted; if testing, return once ready, leaving the caller to run the loop."""
+        
+        if self.fork != 1 and not testing:
+            # Forks workers, each of which calls `worker` below.
+            return super(HTTPServer, self).start()
+        
+        self.worker(None, testing)
+    
+    def worker(self, index, testing=False):
+        log.info("Starting up.")
+        
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        
+        self.loop.run_until_complete(self.serve())
+        
+        if testing:
+            return
+        
+        if index is not None:
+            self.started(index)
+        
+        try:
+            self.loop.run_forever()
+        
+        except KeyboardInterrupt:
+            log.info("Recieved Control+C.")
+        
+        finally:
+            self.stop()
+    
+    def deafen(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+    
+    def pause(self):
+        # asyncio offers no public means of suspending accept on a listening socket; connections are always accepted.
+        pass
+    
+    def resume(self):
+        pass
+    
+    def stop(self, close=False):
+        log.info("Shutting down.")
+        
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        
+        if not isinstance(self.protocol, type):
+            self.protocol.stop()
+            self.protocol = type(self.protocol)
+        
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
@@ -0,0 +1,123 @@
+# encoding: utf-8
+
+"""Support for asynchronous (`wsgi.async`) applications.
+
+An application may, in place of its usual `(status, headers, body)` result, return:
+
+* a future (such as a `concurrent.futures.Future`) whose result is the response;
+* an awaitable, such as a coroutine, whose result is the response; this requires the asyncio backend; or
+* a generator, which yields futures (or awaitables) and is resumed with their result (or has their exception raised
+  within it), finally yielding or returning the response.
+
+Likewise a response body iterator may yield a future or awaitable in place of a chunk of the body.
+
+In each case the connection is suspended until the result is available, occupying no thread in the meantime.
+Generators are always resumed from the IOLoop thread.
+"""
+
+from functools import partial
+from inspect import isgenerator
+from concurrent.futures import Future
+
+
+__all__ = ['future', 'suspend', 'Task']
+log = __import__('logging').getLogger(__name__)
+
+
+
+def future(value, io):
+    """Return the value as a future if it is a future or awaitable, otherwise None."""
+    
+    if hasattr(value, 'add_done_callback'):
+        return value
+    
+    if hasattr(value, '__await__'):
+        schedule = getattr(io, 'schedule', None)
+        
+        if schedule is None:
+            if hasattr(value, 'close'):
+                value.close()
+            
+            raise TypeError("Awaitables can only be used with the asyncio backend.")
+        
+        return schedule(value)
+    
+    return None
+
+
+def suspend(result, io, schedule):
+    """Return a future of the response if an application's result is asynchronous, otherwise None.
+    
+    The `schedule` callable, safe to call from any thread, must arrange for a callback to be run in the IOLoop thread.
+    """
+    
+    if isgenerator(result):
+        return Task(result, io, schedule).future
+    
+    return future(result, io)
+
+
+class Task(object):
+    """Run a generator yielding futures, resuming it with the result of each, until it produces its final value."""
+    
+    def __init__(self, generator, io, schedule):
+        self.generator = generator
+        self.io = io
+        self.schedule = schedule
+        self.future = Future()
+        self.step()
+    
+    def wake(self, future):
+        self.schedule(partial(self.resume, future))
+    
+    def resume(self, future):
+        try:
+            value = future.result()
+        
+        except BaseException as e:
+            self.step(throw=e)
+        
+        else:
+            self.step(value)
+    
+    def step(self, value=None, throw=None):
+        generator = self.generator
+        
+        # Loop rather than recurse while yielded futures are already complete.
+        while True:
+            try:
+                if throw is not None:
+                    result = generator.throw(throw)
+                
+                else:
+                    result = generator.send(value)
+                
+                pending = future(result, self.io)
+            
+            except StopIteration as e:
+                result = getattr(e, 'value', None)
+                
+                if result is None:
+                    self.future.set_exception(RuntimeError("Asynchronous application ended without a response."))
+                    return
+                
+                pending = None
+            
+            except BaseException as e:
+                self.future.set_exception(e)
+                return
+            
+            if pending is None:
+                generator.close()
+                self.future.set_result(result)
+                return
+            
+            if not pending.done():
+                pending.add_done_callback(self.wake)
+                return
+            
+            try:
+                value, throw = pending.result(), None
+            
+            except BaseException as e:
+                value, throw = None, e
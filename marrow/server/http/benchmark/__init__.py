@@ -0,0 +1,201 @@
+# encoding: utf-8
+
+"""A self-contained HTTP server benchmark.
+
+Runs each scenario against a server in its own process, loaded by one or more client processes over the loopback
+interface, and reports request throughput and latency percentiles.  No external tools or network access are required.
+    
+    from marrow.server.http.benchmark import run
+    print(json.dumps(run(['keepalive', 'pipelined'], threads=(False, 4)), indent=4))
+"""
+
+import os
+import sys
+import time
+import socket
+import logging
+import platform
+import multiprocessing
+
+from marrow.server.http.release import version
+from marrow.server.http.benchmark.client import generate
+from marrow.server.http.benchmark.scenarios import Scenario, SCENARIOS
+
+
+__all__ = ['run', 'measure', 'summarize', 'Scenario', 'SCENARIOS']
+log = __import__('logging').getLogger(__name__)
+
+
+
+def tag(env, status, headers, body):
+    """An egress filter identifying the worker process serving each response."""
+    
+    headers.append((b'X-Worker', str(os.getpid()).encode('ascii')))
+    return status, headers, body
+
+
+def serve(scenario, address, threaded, loop, workers=1, reuseport=False):
+    """Run a server for the scenario; the target of the server process."""
+    
+    logging.basicConfig(level=logging.WARN)
+    
+    if loop == 'asyncio':
+        from marrow.server.http.aio import HTTPServer
+    
+    else:
+        from marrow.server.http import HTTPServer
+    
+    options = dict(scenario.options)
+    
+    if workers != 1:
+        options['egress'] = list(options.get('egress', ())) + [tag]
+    
+    HTTPServer(address[0], address[1], application=scenario.application, threaded=threaded, fork=workers,
+            reuseport=reuseport, **options).start()
+
+
+def available(host):
+    """Return a port number on the given interface not currently in use."""
+    
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    
+    try:
+        listener.bind((host, 0))
+        return listener.getsockname()[1]
+    
+    finally:
+        listener.close()
+
+
+def ready(address, timeout=10):
+    deadline = time.time() + timeout
+    
+    while time.time() < deadline:
+        try:
+            socket.create_connection(address, 1).close()
+            return True
+        
+        except socket.error:
+            time.sleep(0.05)
+    
+    return False
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 3)
+
+
+def summarize(outcomes):
+    """Combine the outcomes reported by each client process."""
+    
+    latencies = sorted(i for outcome in outcomes for i in outcome['latencies'])
+    elapsed = max(i['finished'] for i in outcomes) - min(i['started'] for i in outcomes)
+    workers = dict()
+    
+    for outcome in outcomes:
+        for worker, count in outcome['workers'].items():
+            workers[worker] = workers.get(worker, 0) + count
+    
+    distribution = sorted(workers.values(), reverse=True)
+    
+    return dict(
+            requests = len(latencies),
+            failures = sum(i['failures'] for i in outcomes),
+            seconds = round(elapsed, 3),
+            rps = round(len(latencies) / elapsed, 1) if elapsed else None,
+            received = sum(i['received'] for i in outcomes),
+            latency = dict(
+                    mean = round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+                    p50 = percentile(latencies, 0.5),
+                    p99 = percentile(latencies, 0.99),
+                    p999 = percentile(latencies, 0.999),
+                    max = round(latencies[-1] * 1000, 3) if latencies else None
+                ),
+            # Responses served by each worker process, busiest first, and the busiest relative to the mean.
+            distribution = distribution,
+            imbalance = round(distribution[0] * len(distribution) / float(sum(distribution)), 3) if distribution else None
+        )
+
+
+def measure(scenario, threaded=False, requests=10000, concurrency=25, clients=2, host='127.0.0.1', loop='marrow',
+        workers=1, reuseport=False):
+    """Benchmark a single scenario, returning a summary of the results.
+    
+    `concurrency` connections are divided amongst `clients` client processes.  The server forks `workers` processes,
+    each binding its own listening socket if `reuseport` is enabled.
+    """
+    
+    address = (host, available(host))
+    server = multiprocessing.Process(target=serve, args=(scenario, address, threaded, loop, workers, reuseport))
+    server.daemon = True
+    server.start()
+    
+    try:
+        if not ready(address):
+            raise RuntimeError("The benchmark server failed to start.")
+        
+        requests = max(int(requests * scenario.scale), clients)
+        clients = min(clients, concurrency)
+        
+        start = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        processes = []
+        
+        for i in range(clients):
+            process = multiprocessing.Process(target=generate, args=(address, scenario.request, scenario.depth,
+                    requests // clients + (i < requests % clients), concurrency // clients + (i < concurrency % clients),
+                    start, results))
+            process.daemon = True
+            process.start()
+            processes.append(process)
+        
+        start.set()
+        outcomes = [results.get() for i in processes]
+        
+        for process in processes:
+            process.join()
+    
+    finally:
+        server.terminate()
+        server.join()
+    
+    summary = summarize(outcomes)
+    summary.update(scenario=scenario.name, threaded=threaded, concurrency=concurrency, depth=scenario.depth,
+            workers=workers, reuseport=reuseport)
+    
+    return summary
+
+
+def run(scenarios=None, threads=(False, 4), requests=10000, concurrency=25, clients=2, host='127.0.0.1',
+        loop='marrow', workers=1, reuseport=(False, )):
+    """Benchmark each of the named scenarios (by default, all) with each threading and listening socket configuration.
+    
+    Returns a description of the environment and the list of results, suitable for serializing as JSON.
+    """
+    
+    results = []
+    
+    for name in (scenarios or SCENARIOS):
+        scenario = name if isinstance(name, Scenario) else SCENARIOS[name]
+        
+        for threaded in threads:
+            for shared in reuseport:
+                log.info("Running %s (threaded=%r, workers=%d, reuseport=%r).", scenario.name, threaded, workers, shared)
+                results.append(measure(scenario, threaded, requests, concurrency, clients, host, loop, workers, shared))
+    
+    return dict(
+            version = version,
+            python = sys.version.split()[0],
+            implementation = platform.python_implementation(),
+            platform = platform.platform(),
+            processors = multiprocessing.cpu_count(),
+            loop = loop,
+            requests = requests,
+            concurrency = concurrency,
+            clients = clients,
+            workers = workers,
+            results = results
+        )
@@ -0,0 +1,277 @@
+# encoding: utf-8
+
+"""A minimal HTTP/1.x load generator.
+
+Each client process drives a number of connections from a single select loop, sending a scenario's request (pipelined,
+if the scenario calls for it) and recording the time from sending each request until its response has been received
+in full.  Responses delimited by Content-Length, chunked encoding, or the closing of the connection are understood.
+"""
+
+import time
+import errno
+import socket
+import select
+
+from collections import deque
+
+
+__all__ = ['Connection', 'generate']
+log = __import__('logging').getLogger(__name__)
+
+
+clock = getattr(time, 'perf_counter', time.time)
+
+CRLF = b"\r\n"
+dCRLF = b"\r\n\r\n"
+
+
+
+class Connection(object):
+    """A client connection, parsing responses incrementally."""
+    
+    def __init__(self, address, request):
+        self.address = address
+        self.request = request
+        self.socket = None
+        self.pending = deque() # Time each outstanding request was sent.
+        self.buffer = bytearray()
+        self.received = 0
+        self.workers = dict() # Responses received from each server process, if identified.
+        
+        # The server is not obliged to repeat the client's choice of persistence in the response.
+        lowered = request.lower()
+        self.keepalive = b'connection: keep-alive' in lowered
+        self.closing = b'connection: close' in lowered
+        
+        self.reset()
+    
+    def reset(self):
+        self.head = None # The status code once the response head has been received.
+        self.length = None # Body bytes remaining, if the length is known.
+        self.chunked = False
+        self.persistent = True
+    
+    def fileno(self):
+        return self.socket.fileno()
+    
+    def send(self, count):
+        if self.socket is None:
+            self.socket = socket.create_connection(self.address)
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        
+        now = clock()
+        self.socket.sendall(self.request * count)
+        self.pending.extend([now] * count)
+    
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+        
+        self.buffer = bytearray()
+        self.reset()
+    
+    def receive(self):
+        """Read from the socket, returning (latency, status) for each response completed and the number of failures."""
+        
+        try:
+            data = self.socket.recv(262144)
+        
+        except socket.error as e:
+            if e.args[0] in (errno.EAGAIN, errno.EINTR):
+                return [], 0
+            
+            data = b''
+        
+        if not data:
+            completed = []
+            
+            if self.head is not None and self.length is None and not self.chunked:
+                # The body was delimited by the connection closing.
+                completed.append(self.complete())
+            
+            failed = len(self.pending)
+            self.pending.clear()
+            self.close()
+            
+            return completed, failed
+        
+        self.received += len(data)
+        self.buffer += data
+        
+        completed = []
+        
+        while self.pending:
+            if not self.parse():
+                break
+            
+            completed.append(self.complete())
+            
+            if not self.persistent:
+                failed = len(self.pending)
+                self.pending.clear()
+                self.close()
+                return completed, failed
+        
+        return completed, 0
+    
+    def complete(self):
+        status = self.head
+        persistent = self.persistent
+        self.reset()
+        self.persistent = persistent
+        return clock() - self.pending.popleft(), status
+    
+    def parse(self):
+        """Consume as much of the buffer as possible, returning True once a complete response has been received."""
+        
+        buffer = self.buffer
+        
+        if self.head is None:
+            end = buffer.find(dCRLF)
+            
+            if end < 0:
+                return False
+            
+            lines = bytes(buffer[:end]).split(CRLF)
+            del buffer[:end + 4]
+            
+            protocol, _, status = lines[0].partition(b' ')
+            self.head = int(status[:3])
+            self.persistent = not self.closing and (self.keepalive or protocol == b'HTTP/1.1')
+            
+            for line in lines[1:]:
+                name, _, value = line.partition(b':')
+                name, value = name.strip().lower(), value.strip().lower()
+                
+                if name == b'content-length':
+                    self.length = int(value)
+                
+                elif name == b'transfer-encoding':
+                    self.chunked = value == b'chunked'
+                
+                elif name == b'connection':
+                    self.persistent = value == b'keep-alive'
+                
+                elif name == b'x-worker':
+                    worker = value.decode('ascii')
+                    self.workers[worker] = self.workers.get(worker, 0) + 1
+            
+            if self.head in (204, 304) or 100 <= self.head < 200:
+                self.length = 0
+        
+        if self.chunked:
+            while True:
+                if self.length is None:
+                    end = buffer.find(CRLF)
+                    
+                    if end < 0:
+                        return False
+                    
+                    size = int(bytes(buffer[:end]).split(b';')[0], 16)
+                    del buffer[:end + 2]
+                    
+                    if not size:
+                        # The terminating chunk; no trailers are sent by the server.
+                        self.length = -2
+                    
+                    else:
+                        self.length = size + 2 # Including the CRLF following the chunk data.
+                
+                if self.length == -2:
+                    if len(buffer) < 2:
+                        return False
+                    
+                    del buffer[:2]
+                    return True
+                
+                consumed = min(self.length, len(buffer))
+                del buffer[:consumed]
+                self.length -= consumed
+                
+                if self.length:
+                    return False
+                
+                self.length = None
+        
+        if self.length is None:
+            # Delimited by the connection closing.
+            del buffer[:]
+            return False
+        
+        consumed = min(self.length, len(buffer))
+        del buffer[:consumed]
+        self.length -= consumed
+        
+        return not self.length
+
+
+def generate(address, request, depth, requests, concurrency, start, results):
+    """Send `requests` requests using `concurrency` connections, then put the outcome on the `results` queue.
+    
+    Intended as the target of a client process; sending begins once the `start` event is set.
+    """
+    
+    connections = [Connection(address, request) for i in range(concurrency)]
+    latencies = []
+    failures = 0
+    remaining = requests
+    
+    start.wait()
+    started = time.time()
+    
+    while True:
+        for connection in connections:
+            if remaining and not connection.pending:
+                count = min(depth, remaining)
+                remaining -= count
+                
+                try:
+                    connection.send(count)
+                
+                except socket.error:
+                    connection.pending.clear()
+                    connection.close()
+                    failures += count
+        
+        waiting = [i for i in connections if i.pending]
+        
+        if not waiting:
+            break
+        
+        readable = select.select(waiting, [], [], 5)[0]
+        
+        if not readable:
+            log.error("Timed out waiting for responses.")
+            failures += sum(len(i.pending) for i in waiting)
+            break
+        
+        for connection in readable:
+            completed, failed = connection.receive()
+            failures += failed
+            
+            for latency, status in completed:
+                if 200 <= status < 300:
+                    latencies.append(latency)
+                
+                else:
+                    failures += 1
+    
+    finished = time.time()
+    
+    workers = dict()
+    
+    for connection in connections:
+        connection.close()
+        
+        for worker, count in connection.workers.items():
+            workers[worker] = workers.get(worker, 0) + count
+    
+    results.put(dict(
+            started = started,
+            finished = finished,
+            latencies = latencies,
+            failures = failures,
+            received = sum(i.received for i in connections),
+            workers = workers
+        ))
@@ -0,0 +1,90 @@
+# encoding: utf-8
+
+"""Benchmark scenarios: an application to serve and the request to send it, repeatedly."""
+
+from collections import OrderedDict
+
+from marrow.util.compat import unicode
+
+
+__all__ = ['Scenario', 'SCENARIOS', 'hello', 'stream', 'upload']
+log = __import__('logging').getLogger(__name__)
+
+
+STREAM_SIZE = 1024 * 1024
+STREAM_BLOCK = 16384
+UPLOAD_SIZE = 65536
+UPLOAD_BLOCK = 8192
+
+
+
+def hello(request):
+    return b'200 OK', [(b'Content-Length', b'13'), (b'Content-Type', b'text/plain')], [b'Hello world!\n']
+
+
+def stream(request):
+    """A large response of unknown length, delivered using chunked encoding."""
+    
+    block = b'x' * STREAM_BLOCK
+    
+    def body():
+        for i in range(STREAM_SIZE // STREAM_BLOCK):
+            yield block
+    
+    return b'200 OK', [(b'Content-Type', b'application/octet-stream')], body()
+
+
+def upload(request):
+    """Consume the request body, responding with its length."""
+    
+    size = 0
+    
+    while True:
+        data = request['wsgi.input'].read(65536)
+        if not data: break
+        size += len(data)
+    
+    result = unicode(size).encode('ascii')
+    return b'200 OK', [(b'Content-Length', unicode(len(result)).encode('ascii')), (b'Content-Type', b'text/plain')], [result]
+
+
+def chunked(path, size, block):
+    head = b"POST " + path + b" HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n"
+    chunk = (b"%x\r\n" % block) + b'x' * block + b"\r\n"
+    return head + chunk * (size // block) + b"0\r\n\r\n"
+
+
+class Scenario(object):
+    """A benchmark scenario.
+    
+    Each connection sends `depth` copies of `request` at a time, pipelined, waiting for every response before sending
+    more.  Connections are re-established whenever the server closes them.  The scenario is run with `scale` times
+    the number of requests requested of the benchmark as a whole; `options` are passed to the server.
+    """
+    
+    def __init__(self, name, application, request, depth=1, scale=1.0, description=None, **options):
+        self.name = name
+        self.application = application
+        self.request = request
+        self.depth = depth
+        self.scale = scale
+        self.description = description
+        self.options = options
+
+
+SCENARIOS = OrderedDict((i.name, i) for i in (
+        Scenario('keepalive', hello, b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n",
+                description="HTTP/1.1 persistent connections."),
+        Scenario('close', hello, b"GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n",
+                description="HTTP/1.1, a new connection per request."),
+        Scenario('http10', hello, b"GET / HTTP/1.0\r\n\r\n",
+                description="HTTP/1.0, a new connection per request."),
+        Scenario('http10-keepalive', hello, b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n",
+                description="HTTP/1.0 persistent connections."),
+        Scenario('pipelined', hello, b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n", depth=16,
+                description="HTTP/1.1, sixteen pipelined requests at a time."),
+        Scenario('upload', upload, chunked(b"/upload", UPLOAD_SIZE, UPLOAD_BLOCK), scale=0.25,
+                description="A 64KiB chunked request body."),
+        Scenario('stream', stream, b"GET /stream HTTP/1.1\r\nHost: localhost\r\n\r\n", scale=0.05,
+                description="A 1MiB chunked response."),
+    ))
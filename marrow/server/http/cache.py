@@ -0,0 +1,247 @@
+# encoding: utf-8
+
+"""An in-process micro-cache of complete, serialized responses.
+
+Responses to GET and HEAD requests which permit shared caching are retained, head and body serialized exactly as they
+were written, for a short time: `ttl` seconds, or less if the response's Cache-Control says so.  Later requests for
+the same resource are answered from the IOLoop thread by writing the stored bytes, without invoking filters, the
+application, or (if threaded) the executor.  Requests for a resource already being composed wait for, and share, that
+response rather than invoking the application again.
+
+Entries are keyed by method, protocol, scheme, host, path, and query string, plus the request headers named in `vary`.
+Responses varying on any other header, setting cookies, or which are not complete bytestrings of at most `entry` bytes
+are never stored.  As responses to requests bearing cookies may be personalized, they are only stored, and requests
+bearing cookies only answered from the cache, if the response explicitly permits shared caching: its Cache-Control
+includes `public`, `max-age`, or `s-maxage`.  The cache holds at most `size` bytes, evicting the least recently used
+entries beyond that.
+"""
+
+import time
+
+from collections import OrderedDict
+
+from marrow.util.compat import binary, unicode
+
+
+__all__ = ['ResponseCache']
+log = __import__('logging').getLogger(__name__)
+
+
+STATUSES = (b'200', b'203', b'300', b'301', b'404', b'410')
+
+
+
+class Replay(object):
+    """A partially consumed response body, reassembled."""
+    
+    def __init__(self, original, parts, iterator):
+        self.original = original
+        self.parts = parts
+        self.iterator = iterator
+    
+    def __iter__(self):
+        for chunk in self.parts:
+            yield chunk
+        
+        for chunk in self.iterator:
+            yield chunk
+    
+    def close(self):
+        try:
+            self.original.close()
+        except AttributeError:
+            pass
+
+
+class ResponseCache(object):
+    """Cache serialized responses for at most `ttl` seconds, within a total of `size` bytes.
+    
+    With the exception of `capture`, methods must be called from the IOLoop thread.
+    """
+    
+    def __init__(self, ttl=1, size=32*1024*1024, entry=1024*1024, vary=('Accept-Encoding', ), statuses=STATUSES):
+        self.ttl = ttl
+        self.size = size
+        self.entry = entry
+        self.statuses = statuses
+        
+        self.vary = tuple(i.lower().encode('ascii') for i in vary)
+        self.variables = tuple('HTTP_' + i.upper().replace('-', '_') for i in vary)
+        
+        self.used = 0
+        self.entries = OrderedDict() # key: (expires, data, shared)
+        self.pending = dict() # key: [(connection, slot), ...]
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def key(self, env):
+        if env['REQUEST_METHOD'] != 'GET' or 'HTTP_AUTHORIZATION' in env:
+            return None
+        
+        return (env.get('marrow.head', False), env['SERVER_PROTOCOL'], env['wsgi.url_scheme'], env.get('HTTP_HOST'),
+                env['PATH_INFO'], env['QUERY_STRING']) + tuple(env.get(i) for i in self.variables)
+    
+    def served(self, connection, slot):
+        """Answer the request in the given response queue slot from the cache, if possible.
+        
+        Returns True if the request was answered, or will be once an identical request already in progress completes.
+        Otherwise the request is marked for capture and the caller must dispatch it to the application.
+        """
+        
+        env = slot[0]
+        key = self.key(env)
+        
+        if key is None:
+            return False
+        
+        entry = self.entries.pop(key, None)
+        
+        if entry is not None:
+            if entry[0] > time.time():
+                self.entries[key] = entry
+                
+                if not entry[2] and 'HTTP_COOKIE' in env:
+                    # The stored response wasn't explicitly shared; this one may be personalized.
+                    return False
+                
+                slot[1] = connection.cached(entry[1])
+                connection.flush()
+                return True
+            
+            self.used -= len(entry[1])
+        
+        waiting = self.pending.get(key)
+        
+        if waiting is not None:
+            waiting.append((connection, slot))
+            return True
+        
+        self.pending[key] = []
+        env['marrow.cache'] = key
+        
+        return False
+    
+    def lifetime(self, status, headers, present):
+        """Determine the number of seconds a response may be cached for, or None if it must not be."""
+        
+        if status[:3] not in self.statuses or b'set-cookie' in present:
+            return None
+        
+        ttl = self.ttl
+        
+        if b'cache-control' in present:
+            for directive in headers[present.index(b'cache-control')][1].lower().split(b','):
+                name, _, value = directive.strip().partition(b'=')
+                
+                if name in (b'no-store', b'no-cache', b'private'):
+                    return None
+                
+                if name in (b'max-age', b's-maxage'):
+                    try:
+                        ttl = min(ttl, int(value))
+                    except ValueError:
+                        return None
+        
+        if b'vary' in present:
+            for name in headers[present.index(b'vary')][1].lower().split(b','):
+                if name.strip() not in self.vary:
+                    return None
+        
+        return ttl if ttl > 0 else None
+    
+    def shared(self, headers, present):
+        """Determine whether a response explicitly permits shared caching."""
+        
+        if b'cache-control' not in present:
+            return False
+        
+        for directive in headers[present.index(b'cache-control')][1].lower().split(b','):
+            if directive.strip().partition(b'=')[0] in (b'public', b'max-age', b's-maxage'):
+                return True
+        
+        return False
+    
+    def capture(self, env, status, headers, present, body, is_head):
+        """Gather a cacheable response body, returning its lifetime and the body to deliver.
+        
+        Called from the thread composing the response.  If the response can't be cached the lifetime is None and the
+        body is delivered as it would otherwise have been.
+        """
+        
+        ttl = self.lifetime(status, headers, present)
+        
+        if ttl is not None:
+            if self.shared(headers, present):
+                env['marrow.cache.shared'] = True
+            
+            elif 'HTTP_COOKIE' in env:
+                ttl = None
+        
+        if ttl is None or is_head:
+            return ttl, body
+        
+        parts = []
+        size = 0
+        iterator = iter(body)
+        
+        for chunk in iterator:
+            if not isinstance(chunk, binary) or size + len(chunk) > self.entry:
+                # Asynchronous, or too large to hold; deliver it as-is.
+                return None, Replay(body, parts + [chunk], iterator)
+            
+            parts.append(chunk)
+            size += len(chunk)
+        
+        try:
+            body.close()
+        except AttributeError:
+            pass
+        
+        if b'content-length' not in present:
+            headers.append((b'Content-Length', unicode(size).encode('ascii')))
+            present.append(b'content-length')
+        
+        return ttl, parts
+    
+    def complete(self, env):
+        """Store the response to a captured request, if cacheable, and answer any requests waiting on it."""
+        
+        key = env.pop('marrow.cache')
+        entry = env.pop('marrow.cache.entry', None)
+        shared = env.pop('marrow.cache.shared', False)
+        waiting = self.pending.pop(key, ())
+        
+        if entry is not None:
+            ttl, data = entry
+            
+            if len(data) <= self.entry:
+                self.store(key, time.time() + ttl, data, shared)
+        
+        for connection, slot in waiting:
+            if connection.client.closed():
+                continue
+            
+            if entry is None or (not shared and 'HTTP_COOKIE' in slot[0]):
+                # The response could not be shared; each must be composed individually.
+                connection.dispatch(slot)
+                continue
+            
+            slot[1] = connection.cached(entry[1])
+            connection.flush()
+    
+    def store(self, key, expires, data, shared=False):
+        previous = self.entries.pop(key, None)
+        
+        if previous is not None:
+            self.used -= len(previous[1])
+        
+        self.entries[key] = (expires, data, shared)
+        self.used += len(data)
+        
+        while self.used > self.size:
+            self.used -= len(self.entries.popitem(False)[1][1])
+    
+    def clear(self):
+        self.entries.clear()
+        self.used = 0
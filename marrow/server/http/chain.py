@@ -0,0 +1,46 @@
+# encoding: utf-8
+
+"""Filter chains.
+
+Ingress filters are called with the request environment before the application; egress filters are called with the
+environment, status, headers, and body the application returned, and return the (possibly replaced) status, headers,
+and body.  Each chain is prepared once, as a single function calling every filter in turn, or None if there are none,
+so that a server without filters pays nothing for them.
+"""
+
+
+__all__ = ['ingress', 'egress']
+log = __import__('logging').getLogger(__name__)
+
+
+
+def ingress(filters):
+    """Return a function calling each ingress filter with the environment, or None if there are none."""
+    
+    if not filters:
+        return None
+    
+    filters = tuple(filters)
+    
+    def ingress(env):
+        for filter_ in filters:
+            filter_(env)
+    
+    return ingress
+
+
+def egress(filters):
+    """Return a function passing a response through each egress filter in turn, or None if there are none."""
+    
+    if not filters:
+        return None
+    
+    filters = tuple(filters)
+    
+    def egress(env, status, headers, body):
+        for filter_ in filters:
+            status, headers, body = filter_(env, status, headers, body)
+        
+        return status, headers, body
+    
+    return egress
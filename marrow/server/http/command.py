@@ -3,7 +3,9 @@
 
 from __future__ import print_function
 
+import gc
 import os
+import sys
 import logging
 import pkg_resources
 
@@ -12,6 +14,9 @@ from marrow.util.object import load_object
 from marrow.script import script, annotate, describe, short
 
 from marrow.server.http import HTTPServer
+from marrow.server.http.profiler import Profiler
+from marrow.server.http.pool import ProcessPool
+from marrow.server.http.access import AccessLog
 from marrow.server.http.release import version
 
 
@@ -29,10 +34,23 @@ __all__ = ['marrowhttpd']
         host = "The interface to bind to, defaults to all.\nE.g. 127.0.0.1",
         port = "The port number to bind to, defaults to 8080.",
         fork = "The number of processes to spawn. Defaults to 1. Set to zero to detect the number of logical processors.",
+        loop = "The event loop to use: marrow (the default) or asyncio.",
+        reuseport = "Bind a listening socket in each forked process using SO_REUSEPORT, letting the kernel balance connections.",
+        affinity = "Pin each forked process to a single CPU.",
+        preload = "Load the application with garbage collection disabled, then freeze the heap before forking so that it remains shared by every process.",
+        young = "With --preload, never collect the oldest garbage generation in forked processes.",
+        requests = "Recycle each forked process after it has served this many requests.",
+        jitter = "Serve up to this many additional requests, chosen at random per process, before recycling.",
+        memory = "Recycle each forked process once its resident memory exceeds this many megabytes.",
+        grace = "Seconds allowed for open connections to finish when a forked process is recycled or stopped.\nDefault: 30",
+        processes = "Run the application in a pool of this many processes per forked process, for CPU-bound applications. Set to zero to detect the number of logical processors.",
+        access = "Append an access log, in the combined log format, to this file; - for standard output.",
+        profile = "Enable the sampling profiler, toggled in each worker by SIGUSR2, writing collapsed stacks to this directory.",
         verbose = "Increase logging level to DEBUG.",
         quiet = "Decrease logging level to WARN."
     )
-def marrowhttpd(factory, host=None, port=8080, fork=1, verbose=False, quiet=False, **options):
+def marrowhttpd(factory, host=None, port=8080, fork=1, loop='marrow', reuseport=False, affinity=False, preload=False,
+        young=False, requests=0, jitter=0, memory=0, grace=30, processes=None, access=None, profile=None, verbose=False, quiet=False, **options):
     """Marrow HTTP/1.1 Server
     
     This script allows you to use a factory function to configure middleware, application settings, and filters.  Specify the dot-notation path (e.g. mypkg.myapp:factory) as the first positional argument.
@@ -46,6 +64,20 @@ def marrowhttpd(factory, host=None, port=8080, fork=1, verbose=False, quiet=Fals
         print("Can not set verbose and quiet simultaneously.")
         return 1
     
+    if loop == 'asyncio':
+        from marrow.server.http.aio import HTTPServer as Server
+    
+    elif loop == 'marrow':
+        Server = HTTPServer
+    
+    else:
+        print("Unknown event loop: %s" % (loop, ))
+        return 1
+    
+    if preload:
+        # Objects freed while loading would leave holes in pages otherwise shared with every process.
+        gc.disable()
+    
     try:
         factory = load_object(factory)
     
@@ -55,7 +87,25 @@ def marrowhttpd(factory, host=None, port=8080, fork=1, verbose=False, quiet=Fals
     
     logging.basicConfig(level=logging.DEBUG if verbose else logging.WARN if quiet else logging.INFO)
     
-    HTTPServer(host, port, fork=fork, **factory(**options)).start()
+    arguments = factory(**options)
+    
+    if profile:
+        arguments.setdefault('profiler', Profiler(profile))
+    
+    if processes is not None:
+        arguments.setdefault('processes', ProcessPool(int(processes) or None))
+    
+    if access:
+        arguments.setdefault('access', AccessLog(sys.stdout if access == '-' else access))
+    
+    server = Server(host, port, fork=fork, reuseport=reuseport, affinity=affinity, freeze=preload,
+            full_collections=not (preload and young), max_requests=int(requests) or None, max_requests_jitter=int(jitter),
+            max_memory=int(memory) * 1024 * 1024 or None, grace=float(grace), **arguments)
+    
+    if preload and fork == 1:
+        gc.enable() # There is nothing to share.
+    
+    server.start()
 
 
 def main():
@@ -0,0 +1,108 @@
+# encoding: utf-8
+
+"""Hand-off of completed work from executor threads back to the IOLoop.
+
+Worker threads append a callback to a deque (appends and pops are atomic) and wake the IOLoop by signalling an eventfd,
+or a self-pipe where eventfd is unavailable.  Only the first completion after a drain signals; the IOLoop then runs
+every callback queued by the time it wakes, so a burst of completions costs a single wakeup rather than one each.
+"""
+
+import os
+import errno
+import fcntl
+import threading
+
+from collections import deque
+
+
+__all__ = ['CompletionQueue']
+log = __import__('logging').getLogger(__name__)
+
+
+eventfd = getattr(os, 'eventfd', None)
+
+
+
+class CompletionQueue(object):
+    def __init__(self):
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.signalled = False
+        self.io = None
+        self.reader = self.writer = None
+    
+    def start(self, io):
+        """Create the wakeup descriptor and register it with the given IOLoop."""
+        
+        if eventfd is not None:
+            self.reader = self.writer = eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        
+        else:
+            self.reader, self.writer = os.pipe()
+            
+            for fd in (self.reader, self.writer):
+                fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+                fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+        
+        self.io = io
+        io.add_handler(self.reader, self.drain, io.READ)
+    
+    def stop(self):
+        if self.io is None:
+            return
+        
+        self.io.remove_handler(self.reader)
+        self.io = None
+        
+        os.close(self.reader)
+        
+        if self.writer != self.reader:
+            os.close(self.writer)
+        
+        self.reader = self.writer = None
+    
+    def push(self, callback):
+        """Queue a callback to be run in the IOLoop thread; may be called from any thread."""
+        
+        self.pending.append(callback)
+        
+        with self.lock:
+            if self.signalled:
+                # The IOLoop has yet to drain; it will find this callback when it does.
+                return
+            
+            self.signalled = True
+        
+        try:
+            os.write(self.writer, b'\x01\x00\x00\x00\x00\x00\x00\x00')
+        
+        except EnvironmentError as e:
+            # A full pipe is already readable, and a closed one means the queue has been stopped.
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EBADF):
+                raise
+    
+    def drain(self, fd=None, events=None):
+        """Run every queued callback; the IOLoop handler for the wakeup descriptor."""
+        
+        try:
+            os.read(self.reader, 4096)
+        
+        except EnvironmentError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+        
+        # Cleared before counting: anything pushed after this point signals again, and is run on the next wakeup
+        # rather than extending this one indefinitely.
+        with self.lock:
+            self.signalled = False
+        
+        pending = self.pending
+        
+        for i in range(len(pending)):
+            callback = pending.popleft()
+            
+            try:
+                callback()
+            
+            except:
+                log.exception("Unhandled exception in completion callback.")
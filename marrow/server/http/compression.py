@@ -0,0 +1,335 @@
+# encoding: utf-8
+
+"""Response compression egress filter.
+
+Compresses response bodies of compressible types using gzip or deflate, as negotiated using the request's
+Accept-Encoding header.  Bodies are compressed incrementally as they are delivered, so memory use is bounded regardless
+of body size; the Content-Length header is removed, leaving the protocol to use chunked encoding.  Only complete
+representations, `200 OK` responses without a Content-Range, are compressed.
+
+The compressed form of cacheable responses, those identified by an ETag or permitting shared caching, is kept in an LRU
+cache so that identical payloads are compressed only once.  Responses with an ETag are keyed by their URL and ETag;
+others, if of known length, by a hash of the uncompressed body.
+"""
+
+import zlib
+import hashlib
+import threading
+
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from marrow.util.compat import binary, bytestring
+
+from marrow.server.http.cache import Replay
+
+
+__all__ = ['CompressionFilter', 'LRUCache']
+log = __import__('logging').getLogger(__name__)
+
+
+WBITS = dict(gzip=16 + zlib.MAX_WBITS, deflate=zlib.MAX_WBITS)
+
+TYPES = (b'text/', b'application/json', b'application/javascript', b'application/x-javascript', b'application/xml',
+        b'application/xhtml+xml', b'application/rss+xml', b'application/atom+xml', b'image/svg+xml',
+        b'application/wasm', b'font/ttf', b'font/otf', b'image/x-icon', b'image/vnd.microsoft.icon')
+
+SUFFIXES = (b'+json', b'+xml')
+
+
+
+class LRUCache(object):
+    """A thread safe mapping of keys to bytestrings, evicting the least recently used beyond `size` total bytes."""
+    
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def get(self, key):
+        with self.lock:
+            value = self.entries.pop(key, None)
+            
+            if value is not None:
+                self.entries[key] = value
+            
+            return value
+    
+    def set(self, key, value):
+        if len(value) > self.size:
+            return
+        
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            
+            if previous is not None:
+                self.used -= len(previous)
+            
+            self.entries[key] = value
+            self.used += len(value)
+            
+            while self.used > self.size:
+                self.used -= len(self.entries.popitem(False)[1])
+
+
+class Compressed(object):
+    """A response body, compressed as it is iterated.
+    
+    If given, `store` is called with the complete compressed body once finished, provided it does not exceed `limit`
+    bytes.  Chunks of the original body which are futures are compressed as they resolve.
+    """
+    
+    def __init__(self, body, encoding, level, store=None, limit=0):
+        self.body = body
+        self.iterator = iter(body)
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+        self.store = store
+        self.limit = limit
+        self.parts = [] if store else None
+        self.size = 0
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        compressor = self.compressor
+        
+        if compressor is None:
+            raise StopIteration
+        
+        for chunk in self.iterator:
+            if not isinstance(chunk, binary):
+                if hasattr(chunk, 'add_done_callback'):
+                    return self.deferred(chunk)
+                
+                raise TypeError("Compressed response bodies must yield bytestrings or futures.")
+            
+            data = compressor.compress(chunk)
+            
+            if data:
+                return self.keep(data)
+        
+        self.compressor = None
+        data = self.keep(compressor.flush())
+        
+        if self.parts is not None:
+            self.store(b''.join(self.parts))
+            self.parts = None
+        
+        return data
+    
+    next = __next__
+    
+    def keep(self, data):
+        if self.parts is not None:
+            self.size += len(data)
+            self.parts.append(data)
+            
+            if self.size > self.limit:
+                self.parts = None
+        
+        return data
+    
+    def deferred(self, pending):
+        result = Future()
+        
+        def done(pending):
+            try:
+                result.set_result(self.keep(self.compressor.compress(pending.result())))
+            
+            except BaseException as e:
+                result.set_exception(e)
+        
+        pending.add_done_callback(done)
+        return result
+    
+    def close(self):
+        try:
+            self.body.close()
+        except AttributeError:
+            pass
+
+
+class CompressionFilter(object):
+    """An egress filter compressing responses using gzip or deflate.
+    
+    Responses are compressed if the client accepts a supported encoding, the Content-Type is compressible (text and
+    structured data formats, as listed in `types` and `suffixes`), and the body is not known to be smaller than
+    `minimum` bytes.  Only `200 OK` responses are compressed; partial responses, those already encoded, and those which
+    forbid transformation are passed through untouched.
+    
+    Compressed bodies of cacheable responses no larger than `entry` bytes are kept in an LRU cache of `cache` bytes
+    total; set `cache` to zero to disable caching.
+    """
+    
+    cache_size = 128
+    
+    def __init__(self, level=6, minimum=512, cache=16*1024*1024, entry=1024*1024, encodings=('gzip', 'deflate'),
+            types=TYPES, suffixes=SUFFIXES):
+        self.level = level
+        self.minimum = minimum
+        self.entry = entry
+        self.encodings = encodings
+        self.types = types
+        self.suffixes = suffixes
+        self.cache = LRUCache(cache) if cache else None
+        self.negotiated = dict()
+    
+    def negotiate(self, accept):
+        """Select the preferred supported encoding given the value of an Accept-Encoding header, or None."""
+        
+        encoding = self.negotiated.get(accept, False)
+        
+        if encoding is not False:
+            return encoding
+        
+        qualities = dict()
+        
+        for part in accept.lower().split(','):
+            coding, _, params = part.partition(';')
+            coding = coding.strip()
+            quality = 1.0
+            
+            for param in params.split(';'):
+                name, _, value = param.partition('=')
+                
+                if name.strip() == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            
+            qualities[coding] = quality
+        
+        default = qualities.get('*', 0.0)
+        candidates = [(qualities.get(i, default), -n, i) for n, i in enumerate(self.encodings)]
+        quality, _, encoding = max(candidates)
+        
+        if quality <= 0:
+            encoding = None
+        
+        if len(self.negotiated) < self.cache_size:
+            self.negotiated[accept] = encoding
+        
+        return encoding
+    
+    def compressible(self, kind):
+        kind = kind.partition(b';')[0].strip().lower()
+        return kind.startswith(self.types) or kind.endswith(self.suffixes)
+    
+    def __call__(self, env, status, headers, body):
+        if status[:3] != b'200':
+            # Only complete representations are compressed; a partial one (206) must be left as its range describes.
+            return status, headers, body
+        
+        headers = list(headers)
+        names = [i[0].lower() for i in headers]
+        
+        if b'content-encoding' in names or b'content-range' in names or b'content-type' not in names:
+            return status, headers, body
+        
+        if not self.compressible(headers[names.index(b'content-type')][1]):
+            return status, headers, body
+        
+        cache_control = headers[names.index(b'cache-control')][1].lower() if b'cache-control' in names else b''
+        
+        if b'no-transform' in cache_control:
+            return status, headers, body
+        
+        # The response varies by Accept-Encoding whether compressed for this client or not.
+        if b'vary' in names:
+            i = names.index(b'vary')
+            if b'accept-encoding' not in headers[i][1].lower() and headers[i][1].strip() != b'*':
+                headers[i] = (headers[i][0], headers[i][1] + b', Accept-Encoding')
+        
+        else:
+            headers.append((b'Vary', b'Accept-Encoding'))
+            names.append(b'vary')
+        
+        encoding = self.negotiate(env.get('HTTP_ACCEPT_ENCODING', ''))
+        
+        if encoding is None:
+            return status, headers, body
+        
+        length = None
+        
+        if b'content-length' in names:
+            i = names.index(b'content-length')
+            length = int(headers[i][1])
+            del headers[i], names[i]
+            
+            if length < self.minimum:
+                headers.append((b'Content-Length', bytestring(str(length))))
+                return status, headers, body
+        
+        headers.append((b'Content-Encoding', encoding.encode('ascii')))
+        
+        if b'etag' in names:
+            # The compressed representation is not byte-for-byte identical; a strong validator becomes weak.
+            i = names.index(b'etag')
+            etag = headers[i][1]
+            
+            if not etag.startswith(b'W/'):
+                headers[i] = (headers[i][0], b'W/' + etag)
+        
+        else:
+            etag = None
+        
+        if self.cache is None or b'no-store' in cache_control:
+            return status, headers, Compressed(body, encoding, self.level)
+        
+        if etag is not None:
+            key = (encoding, env.get('HTTP_HOST'), env.get('PATH_INFO'), env.get('QUERY_STRING'), etag)
+            return status, headers, self.cached(key, headers, body, encoding)
+        
+        shared = b'public' in cache_control or b'max-age' in cache_control
+        
+        if not shared or b'private' in cache_control or length is None or length > self.entry:
+            return status, headers, Compressed(body, encoding, self.level)
+        
+        # Small enough to hold in full; identify it by content.
+        parts = []
+        rest = iter(body)
+        
+        for chunk in rest:
+            if not isinstance(chunk, binary):
+                # Asynchronous bodies can't be hashed in advance; compress the remainder as it arrives.
+                return status, headers, Compressed(Replay(body, parts + [chunk], rest), encoding, self.level)
+            
+            parts.append(chunk)
+        
+        try:
+            body.close()
+        except AttributeError:
+            pass
+        
+        data = b''.join(parts)
+        key = (encoding, hashlib.sha1(data).digest())
+        compressed = self.cache.get(key)
+        
+        if compressed is None:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, WBITS[encoding])
+            compressed = compressor.compress(data) + compressor.flush()
+            self.cache.set(key, compressed)
+        
+        headers.append((b'Content-Length', bytestring(str(len(compressed)))))
+        return status, headers, [compressed]
+    
+    def cached(self, key, headers, body, encoding):
+        compressed = self.cache.get(key)
+        
+        if compressed is None:
+            return Compressed(body, encoding, self.level, partial(self.cache.set, key), self.entry)
+        
+        try:
+            body.close()
+        except AttributeError:
+            pass
+        
+        headers.append((b'Content-Length', bytestring(str(len(compressed)))))
+        return [compressed]
@@ -0,0 +1,171 @@
+# encoding: utf-8
+
+"""Request body `wsgi.input` implementations.
+
+Requests without a body share a single immutable `EMPTY` input.
+
+When streaming is enabled the application is invoked as soon as the request head has been received; the request body
+is fed to it from the IOLoop as it arrives.  The application, running in an executor thread, blocks in `read` until
+data is available.  Only `depth` chunks are held at a time: once full, the connection stops reading from the socket
+(letting TCP flow control push back on the client) until the application has consumed half of them.
+"""
+
+import threading
+
+from collections import deque
+
+
+__all__ = ['EMPTY', 'EmptyInput', 'StreamingInput']
+log = __import__('logging').getLogger(__name__)
+
+
+
+class EmptyInput(object):
+    """The input of a request without a body; stateless, so a single instance is shared by all requests."""
+    
+    __slots__ = ()
+    
+    def read(self, size=-1):
+        return b''
+    
+    def readline(self, size=-1):
+        return b''
+    
+    def readlines(self, hint=None):
+        return []
+    
+    def __iter__(self):
+        return iter(())
+    
+    def seek(self, offset, whence=0):
+        pass
+    
+    def tell(self):
+        return 0
+
+
+EMPTY = EmptyInput()
+
+
+class StreamingInput(object):
+    def __init__(self, io, resume, depth=16):
+        self.io = io
+        self.resume = resume
+        self.depth = depth
+        
+        self.chunks = deque()
+        self.buffer = b''
+        self.condition = threading.Condition()
+        
+        self.finished = False
+        self.aborted = False
+        self.paused = False
+    
+    # Producer interface, called from the IOLoop thread.
+    
+    def write(self, data):
+        """Queue a portion of the request body, returning False if reading should pause until `resume` is called."""
+        
+        with self.condition:
+            if data:
+                self.chunks.append(data)
+                self.condition.notify()
+            
+            if len(self.chunks) >= self.depth:
+                self.paused = True
+                return False
+            
+            return True
+    
+    def eof(self):
+        with self.condition:
+            self.finished = True
+            self.condition.notify_all()
+    
+    def abort(self):
+        """The client disconnected; wake and fail any waiting reader."""
+        
+        with self.condition:
+            self.finished = self.aborted = True
+            self.condition.notify_all()
+    
+    # Consumer interface, called from the application.
+    
+    def _next(self):
+        """Return the next chunk of the body, blocking as required; an empty bytestring indicates the end."""
+        
+        while not self.chunks:
+            if self.aborted:
+                raise IOError("Client disconnected before the request body was received.")
+            
+            if self.finished:
+                return b''
+            
+            self.condition.wait()
+        
+        chunk = self.chunks.popleft()
+        
+        if self.paused and len(self.chunks) <= self.depth // 2:
+            self.paused = False
+            self.io.add_callback(self.resume)
+        
+        return chunk
+    
+    def read(self, size=-1):
+        with self.condition:
+            data, self.buffer = self.buffer, b''
+            parts = [data]
+            length = len(data)
+            
+            while size is None or size < 0 or length < size:
+                chunk = self._next()
+                if not chunk: break
+                
+                parts.append(chunk)
+                length += len(chunk)
+            
+            data = b''.join(parts)
+            
+            if size is not None and 0 <= size < length:
+                data, self.buffer = data[:size], data[size:]
+            
+            return data
+    
+    def readline(self, size=-1):
+        with self.condition:
+            data, self.buffer = self.buffer, b''
+            parts = [data]
+            length = len(data)
+            
+            while b'\n' not in parts[-1] and (size is None or size < 0 or length < size):
+                chunk = self._next()
+                if not chunk: break
+                
+                parts.append(chunk)
+                length += len(chunk)
+            
+            data = b''.join(parts)
+            end = data.find(b'\n') + 1 or len(data)
+            
+            if size is not None and 0 <= size < end:
+                end = size
+            
+            data, self.buffer = data[:end], data[end:]
+            
+            return data
+    
+    def readlines(self, hint=None):
+        return list(self)
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        line = self.readline()
+        
+        if not line:
+            raise StopIteration
+        
+        return line
+    
+    next = __next__
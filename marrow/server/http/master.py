@@ -0,0 +1,243 @@
+# encoding: utf-8
+
+"""Pre-forked worker processes.
+
+The master process forks a number of workers, each of which runs the given target, then waits for them to exit,
+replacing any which exit (for whatever reason) if `restart` is enabled.  SIGTERM and SIGINT received by the master are
+passed on to every worker, after which none are replaced.  Workers may optionally be pinned to a single CPU each,
+assigned in turn from those available to the master.
+
+When the application has been loaded in the master, its heap can be shared copy-on-write with every worker.  Merely
+examining an object writes to its header, though, and the garbage collector examines every tracked object whenever it
+collects the oldest generation.  With `freeze`, objects allocated before forking are moved to the garbage collector's
+permanent generation, which it never examines, and automatic collection (which the caller may have disabled while
+loading the application, to avoid leaving freed holes in shared pages) is enabled in each worker.  Without
+`full_collections` the oldest generation is never collected automatically in workers, either.
+"""
+
+import gc
+import os
+import sys
+import time
+import errno
+import random
+import signal
+
+from binascii import hexlify
+
+
+__all__ = ['Master', 'processors', 'memory', 'resident']
+log = __import__('logging').getLogger(__name__)
+
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+MEMORY = (('Rss', 'rss'), ('Pss', 'pss'), ('Shared_Clean', 'shared'), ('Shared_Dirty', 'shared'),
+        ('Private_Clean', 'private'), ('Private_Dirty', 'private'))
+
+
+
+def processors(count=None):
+    """Resolve a worker count: None or zero for one per logical processor, negative to leave that many free."""
+    
+    try:
+        available = len(os.sched_getaffinity(0))
+    
+    except AttributeError: # pragma: no cover
+        import multiprocessing
+        available = multiprocessing.cpu_count()
+    
+    if not count:
+        return available
+    
+    if count < 0:
+        return max(1, available + count)
+    
+    return count
+
+
+def memory(pid='self'):
+    """Return the resident memory of a process, in bytes, divided into that shared with other processes and private.
+    
+    Returns None where this isn't available, which is everywhere but Linux.
+    """
+    
+    usage = dict(rss=0, pss=0, shared=0, private=0)
+    
+    for name in ('smaps_rollup', 'smaps'):
+        try:
+            fh = open('/proc/%s/%s' % (pid, name))
+        
+        except EnvironmentError:
+            continue
+        
+        with fh:
+            for line in fh:
+                key, _, value = line.partition(':')
+                
+                for field, total in MEMORY:
+                    if key == field:
+                        usage[total] += int(value.split()[0]) * 1024
+        
+        return usage
+    
+    return None
+
+
+def resident():
+    """Return the resident memory of this process in bytes, cheaply, or None where this isn't available."""
+    
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * PAGE_SIZE
+    
+    except (EnvironmentError, ValueError, IndexError):
+        return None
+
+
+class Master(object):
+    """Fork `count` workers, each calling `target` with its index, and wait for them to exit."""
+    
+    # Workers exiting sooner than this after being forked are likely failing to start; they are replaced more slowly.
+    minimum = 1.0
+    
+    def __init__(self, target, count, affinity=False, freeze=False, full_collections=True, restart=False):
+        self.target = target
+        self.count = count
+        self.affinity = affinity
+        self.freeze = freeze
+        self.full_collections = full_collections
+        self.restart = restart
+        self.workers = dict() # Process ID to worker index.
+        self.forked = dict() # Worker index to the time it was last forked.
+        self.stopping = False
+        self.cpus = None
+        
+        if affinity:
+            if hasattr(os, 'sched_getaffinity'):
+                self.cpus = sorted(os.sched_getaffinity(0))
+            
+            else: # pragma: no cover
+                log.warning("CPU affinity is not supported on this platform; workers will not be pinned.")
+    
+    def run(self):
+        log.info("Forking %d worker processes from PID %d.", self.count, os.getpid())
+        
+        if self.freeze:
+            if hasattr(gc, 'freeze'):
+                gc.freeze()
+            
+            else: # pragma: no cover
+                log.warning("Freezing the heap requires Python 3.7 or later; memory will be shared less effectively.")
+        
+        previous = dict((number, signal.signal(number, self.signalled)) for number in (signal.SIGTERM, signal.SIGINT))
+        
+        try:
+            for index in range(self.count):
+                self.spawn(index)
+            
+            self.wait()
+        
+        finally:
+            for number, handler in previous.items():
+                signal.signal(number, handler)
+    
+    def spawn(self, index):
+        pid = os.fork()
+        
+        if pid:
+            self.workers[pid] = index
+            self.forked[index] = time.time()
+            return pid
+        
+        # In the worker, which never returns from here.
+        self.workers = dict()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        
+        if self.freeze:
+            gc.enable()
+        
+        if not self.full_collections:
+            threshold = gc.get_threshold()
+            gc.set_threshold(threshold[0], threshold[1], 2 ** 31 - 1)
+        
+        try:
+            random.seed(int(hexlify(os.urandom(16)), 16))
+        
+        except NotImplementedError: # pragma: no cover
+            random.seed(int(time.time() * 1000000))
+        
+        if self.cpus:
+            cpu = self.cpus[index % len(self.cpus)]
+            os.sched_setaffinity(0, [cpu])
+            log.debug("Worker %d pinned to CPU %d.", os.getpid(), cpu)
+        
+        status = 0
+        
+        try:
+            self.target(index)
+        
+        except KeyboardInterrupt:
+            pass
+        
+        except:
+            log.exception("Unhandled exception in worker process.")
+            status = 1
+        
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status)
+    
+    def wait(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, 0)
+            
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                
+                if e.errno == errno.ECHILD:
+                    break
+                
+                raise
+            
+            index = self.workers.pop(pid, None)
+            
+            if index is None or self.stopping:
+                continue
+            
+            if os.WIFSIGNALED(status):
+                log.warning("Worker %d (PID %d) was killed by signal %d.", index, pid, os.WTERMSIG(status))
+            
+            elif os.WEXITSTATUS(status):
+                log.warning("Worker %d (PID %d) exited with status %d.", index, pid, os.WEXITSTATUS(status))
+            
+            if not self.restart:
+                continue
+            
+            if time.time() - self.forked[index] < self.minimum:
+                time.sleep(self.minimum)
+                
+                if self.stopping:
+                    continue
+            
+            log.info("Replacing worker %d (PID %d).", index, pid)
+            self.spawn(index)
+    
+    def signalled(self, number, frame):
+        self.stop()
+    
+    def stop(self):
+        """Ask each worker to exit."""
+        
+        self.stopping = True
+        
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            
+            except OSError:
+                pass
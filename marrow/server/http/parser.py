@@ -0,0 +1,216 @@
+# encoding: utf-8
+
+"""A single-pass HTTP request head parser.
+
+The request line is parsed from the raw bytes returned by `read_until`; the remainder of the head is decoded and split
+into lines exactly once, and each header name is translated into its WSGI environment key using a table of
+pre-computed keys rather than being upper-cased and rewritten per request.
+"""
+
+from marrow.util.compat import unicode, native, uvalues, unquote
+
+
+__all__ = ['HeadParser', 'ParseError', 'HEADER_KEYS']
+log = __import__('logging').getLogger(__name__)
+
+
+CRLF = b"\r\n"
+nCRLF = native(CRLF)
+
+# Headers common enough to warrant pre-computed environment keys.  Keys for any other header are calculated once and
+# cached, up to HeadParser.cache_size distinct names.
+COMMON_HEADERS = (
+        'Accept', 'Accept-Charset', 'Accept-Encoding', 'Accept-Language', 'Authorization', 'Cache-Control',
+        'Connection', 'Content-Length', 'Content-Type', 'Cookie', 'DNT', 'Expect', 'Host', 'If-Match',
+        'If-Modified-Since', 'If-None-Match', 'If-Range', 'If-Unmodified-Since', 'Keep-Alive', 'Origin',
+        'Pragma', 'Range', 'Referer', 'TE', 'Transfer-Encoding', 'Upgrade', 'User-Agent', 'Via',
+        'X-Forwarded-For', 'X-Forwarded-Host', 'X-Forwarded-Proto', 'X-Real-IP', 'X-Requested-With'
+    )
+
+NOPREFIX = ('CONTENT_TYPE', 'CONTENT_LENGTH')
+
+
+def environ_key(name):
+    """Calculate the WSGI environment key for a header name given as a native string."""
+    
+    key = name.upper().replace('-', '_')
+    return key if key in NOPREFIX else ('HTTP_' + key)
+
+
+# Both the canonical spelling and the lower-case form are present so the common case is a single dictionary lookup.
+HEADER_KEYS = dict()
+
+for _ in COMMON_HEADERS:
+    HEADER_KEYS[_] = HEADER_KEYS[_.lower()] = environ_key(_)
+
+del _
+
+
+
+class ParseError(ValueError):
+    """Raised when a request head is malformed or exceeds the configured limits.
+    
+    The `status` attribute contains the HTTP status line (as a bytestring) the client should be answered with.
+    """
+    
+    def __init__(self, message, status=b"400 Bad Request"):
+        super(ParseError, self).__init__(message)
+        self.status = status
+
+
+class HeadParser(object):
+    """Populate a WSGI environment from a raw HTTP request head.
+    
+    One instance is shared by all connections of a protocol; it holds no per-request state.
+    """
+    
+    cache_size = 256
+    
+    def __init__(self, encoding="utf8", max_headers=100, max_size=65536):
+        self.encoding = encoding
+        self.max_headers = max_headers
+        self.max_size = max_size
+        self.keys = dict(HEADER_KEYS)
+        self.common = len(self.keys)
+    
+    def __call__(self, data, environ):
+        """Parse the request head in `data`, updating `environ` in-place.
+        
+        The head is expected to include the terminating blank line, as returned by `read_until(dCRLF, ...)`.
+        """
+        
+        if len(data) > self.max_size:
+            raise ParseError("Request head too large.", b"431 Request Header Fields Too Large")
+        
+        end = data.find(CRLF)
+        host = self.request(data[:end], environ)
+        
+        # All keys and values are native strings.  The header block is decoded and split once, at the C level; this
+        # is substantially cheaper than locating and decoding each line individually.
+        data = data[end + 2:]
+        if str is unicode: data = data.decode('iso-8859-1')
+        lines = data.split(nCRLF)
+        
+        if len(lines) > self.max_headers + 2:
+            raise ParseError("Too many request headers.", b"431 Request Header Fields Too Large")
+        
+        keys = self.keys
+        current = None
+        
+        for line in lines:
+            if not line: break
+            
+            first = line[0]
+            
+            if first == ' ' or first == '\t':
+                # Obsolete line folding; the continuation replaces the line break with a single space.
+                if current is None:
+                    raise ParseError("Continuation line without a preceding header.")
+                
+                environ[current] += ' ' + line.strip()
+                continue
+            
+            name, sep, value = line.partition(':')
+            
+            if not sep:
+                raise ParseError("Malformed request header.")
+            
+            current = keys.get(name)
+            
+            if current is None:
+                current = self.key(name)
+            
+            value = value.strip()
+            previous = environ.get(current)
+            
+            if previous is not None:
+                # Repeated headers are combined, in order, as per RFC 2616 section 4.2.
+                value = previous + ('; ' if current == 'HTTP_COOKIE' else ', ') + value
+            
+            environ[current] = value
+        
+        if host is not None:
+            # An absolute request URI takes precedence over the Host header; RFC 2616 section 5.2.
+            environ['HTTP_HOST'] = host
+        
+        return environ
+    
+    def key(self, name):
+        """Look up or calculate and cache the environment key for an uncommon header name."""
+        
+        if not name or name[-1] in ' \t':
+            raise ParseError("Malformed request header.")
+        
+        keys = self.keys
+        lower = name.lower()
+        key = keys.get(lower)
+        
+        if key is None:
+            key = environ_key(lower)
+            
+            if len(keys) - self.common < self.cache_size:
+                keys[lower] = key
+        
+        return key
+    
+    def request(self, line, environ):
+        """Parse the request line into the environment.
+        
+        Returns the host name given in an absolute request URI, if any.
+        """
+        
+        parts = line.split()
+        
+        if len(parts) != 3:
+            raise ParseError("Malformed request line.")
+        
+        method, uri, protocol = parts
+        
+        if not protocol.startswith(b'HTTP/'):
+            raise ParseError("Unsupported request protocol.", b"505 HTTP Version Not Supported")
+        
+        environ['REQUEST_URI'] = uri
+        
+        remainder, _, fragment = uri.partition(b'#')
+        remainder, _, query = remainder.partition(b'?')
+        path, _, param = remainder.partition(b';')
+        host = None
+        
+        if b"://" in path:
+            scheme, _, path = path.partition(b'://')
+            host, _, path = path.partition(b'/')
+            path = b'/' + path
+            
+            environ['wsgi.url_scheme'] = native(scheme)
+            host = native(host)
+        
+        method = native(method)
+        
+        if method == 'HEAD':
+            environ['marrow.head'] = True
+            method = 'GET'
+        
+        environ['REQUEST_METHOD'] = method
+        environ['SERVER_PROTOCOL'] = native(protocol)
+        environ['CONTENT_TYPE'] = None
+        environ['CONTENT_LENGTH'] = None
+        
+        if b'%' in path:
+            path = unquote(path)
+        
+        encoding = self.encoding
+        
+        try:
+            # The overwhelmingly common case; each component decodes cleanly using the configured encoding.
+            environ['PATH_INFO'] = path.decode(encoding)
+            environ['PARAMETERS'] = param.decode(encoding)
+            environ['QUERY_STRING'] = query.decode(encoding)
+            environ['FRAGMENT'] = fragment.decode(encoding)
+        
+        except UnicodeError:
+            encoding, (environ['PATH_INFO'], environ['PARAMETERS'], environ['QUERY_STRING'], environ['FRAGMENT']) = \
+                    uvalues((path, param, query, fragment), encoding)
+        
+        environ['wsgi.uri_encoding'] = encoding
+        
+        return host
@@ -0,0 +1,109 @@
+# encoding: utf-8
+
+"""Composition of responses in a pool of worker processes.
+
+Threads give no parallelism to pure-Python applications, and forking gives it only per connection.  With a process
+pool, the IOLoop process accepts connections, parses requests, and delivers responses, while the application itself
+runs in one of `processes` pool processes, so that a single IOLoop can keep every core busy with CPU-bound requests.
+
+Each request's environment is copied to the pool process -- less anything which can't be sent, such as `wsgi.errors`
+and `wsgi.executor`, which are replaced there -- along with the request body, read in full.  The application's status,
+headers, and (likewise read in full) body are sent back, and egress filters and delivery proceed in the IOLoop process
+as usual.  Changes the application makes to its environment are not seen by egress filters, and the application must
+respond synchronously.
+
+The application is passed to each pool process as it starts; unless processes are forked (the default on Linux), it
+must be importable by reference, such as a module-level function.
+"""
+
+import signal
+import logging
+
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+
+from marrow.util.object import LoggingFile
+from marrow.util.compat import binary, unicode
+
+from marrow.server.http.sendfile import FileWrapper
+
+
+__all__ = ['ProcessPool']
+log = __import__('logging').getLogger(__name__)
+
+
+# Environment values of these types are sent to pool processes; anything else is left behind.
+SENDABLE = (binary, unicode, bool, int, float, tuple, type(None))
+errorlog = LoggingFile(logging.getLogger('wsgi.errors'))
+
+application = None # The application, in pool processes.
+
+
+
+def install(application_):
+    """Prepare a pool process to serve the given application."""
+    
+    global application
+    application = application_
+    
+    # Shutdown is directed by the IOLoop process.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def compose(env, body):
+    """Call the application in a pool process, returning its status, headers, and body."""
+    
+    env['wsgi.input'] = BytesIO(body)
+    env['wsgi.errors'] = errorlog
+    env['wsgi.file_wrapper'] = FileWrapper
+    
+    result = application(env)
+    
+    if not isinstance(result, tuple):
+        raise TypeError("Applications run in a process pool must respond synchronously.")
+    
+    status, headers, body = result
+    
+    try:
+        body = [b''.join(body)]
+    
+    finally:
+        try:
+            result[2].close()
+        except AttributeError:
+            pass
+    
+    return status, list(headers), body
+
+
+class ProcessPool(object):
+    """A pool of `processes` worker processes, by default one per logical processor, calling the application."""
+    
+    def __init__(self, processes=None):
+        self.processes = processes
+        self.executor = None
+    
+    def start(self, application):
+        self.executor = ProcessPoolExecutor(self.processes, initializer=install, initargs=(application, ))
+        
+        # Pool processes are otherwise created upon the first submission; if forked in the midst of serving requests
+        # they inherit the sockets of connected clients, holding them open after the server closes them.
+        self.executor.submit(int).result()
+    
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+    
+    def submit(self, env):
+        """Submit a request for composition, returning a future resolving to its status, headers, and body."""
+        
+        input_ = env['wsgi.input']
+        body = input_.read()
+        input_.seek(0)
+        
+        env = dict((key, value) for key, value in env.items() if isinstance(value, SENDABLE))
+        env['wsgi.multiprocess'] = True
+        
+        return self.executor.submit(compose, env, body)
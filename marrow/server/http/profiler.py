@@ -0,0 +1,169 @@
+# encoding: utf-8
+
+"""A sampling profiler for live workers.
+
+Once started, a background thread captures the stack of every other thread in the process (the IOLoop thread and any
+executor threads) `rate` times a second, counting identical stacks.  When stopped, the counts are written in the
+collapsed-stack format understood by flame graph tools, one line per distinct stack:
+    
+    MainThread;serve (marrow/server/base.py:60);start (marrow/io/ioloop.py:230) 412
+
+Each worker process writes its own file, named for its process ID.  Profiling is toggled by sending the worker
+`signal` (SIGUSR2 by default) or, if the protocol's `profiler_path` option is set, by requesting that path with a
+`start` or `stop` query string from the local host.  Sampling stops on its own after `duration` seconds.
+"""
+
+import os
+import sys
+import time
+import signal as signals
+import threading
+
+from collections import defaultdict
+
+
+__all__ = ['Profiler']
+log = __import__('logging').getLogger(__name__)
+
+
+
+class Profiler(object):
+    """Sample the stacks of all threads, writing collapsed stacks to `directory` when stopped."""
+    
+    def __init__(self, directory='.', rate=100, duration=120, signal=getattr(signals, 'SIGUSR2', None)):
+        self.directory = directory
+        self.rate = rate
+        self.duration = duration
+        self.signal = signal
+        self.previous = None
+        self.thread = None
+        self.finished = threading.Event()
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        self.written = None
+    
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+    
+    def install(self):
+        """Toggle profiling on receipt of the signal; must be called from the main thread."""
+        
+        if self.signal is None:
+            return
+        
+        try:
+            self.previous = signals.signal(self.signal, self.signalled)
+        
+        except ValueError: # pragma: no cover
+            log.warning("Unable to install the profiler signal handler outside of the main thread.")
+    
+    def uninstall(self):
+        self.stop()
+        
+        if self.previous is not None:
+            signals.signal(self.signal, self.previous)
+            self.previous = None
+    
+    def signalled(self, number, frame):
+        if self.running:
+            self.stop()
+        
+        else:
+            self.start()
+    
+    def start(self):
+        if self.running:
+            return False
+        
+        self.finished.clear()
+        self.stacks = defaultdict(int)
+        self.samples = 0
+        
+        self.thread = threading.Thread(target=self.run, name="marrow.server.http.profiler")
+        self.thread.daemon = True
+        self.thread.start()
+        
+        log.info("Sampling profiler started at %d Hz.", self.rate)
+        return True
+    
+    def stop(self):
+        """Stop sampling, returning the path the samples were written to, if they were."""
+        
+        if not self.running:
+            return None
+        
+        self.finished.set()
+        self.thread.join()
+        
+        return self.written
+    
+    def run(self):
+        interval = 1.0 / self.rate
+        deadline = time.time() + self.duration if self.duration else None
+        
+        try:
+            while not self.finished.wait(interval):
+                self.sample()
+                
+                if deadline is not None and time.time() >= deadline:
+                    log.info("Sampling profiler stopping after %d seconds.", self.duration)
+                    break
+        
+        finally:
+            self.write()
+    
+    def sample(self):
+        ignore = threading.current_thread().ident
+        names = dict((i.ident, i.name) for i in threading.enumerate())
+        stacks = self.stacks
+        
+        for ident, frame in sys._current_frames().items():
+            if ident == ignore:
+                continue
+            
+            stack = []
+            
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            
+            stack.append(names.get(ident, ident))
+            stacks[tuple(stack)] += 1
+        
+        self.samples += 1
+    
+    def write(self):
+        if not self.samples:
+            self.written = None
+            return
+        
+        path = os.path.join(self.directory, 'profile-%d-%d.folded' % (os.getpid(), time.time()))
+        
+        try:
+            with open(path, 'w') as fh:
+                for stack, count in self.stacks.items():
+                    frames = ["%s (%s:%d)" % frame for frame in reversed(stack[:-1])]
+                    fh.write("%s %d\n" % (';'.join([str(stack[-1])] + frames), count))
+        
+        except EnvironmentError:
+            log.exception("Unable to write profile samples.")
+            self.written = None
+            return
+        
+        self.written = path
+        log.info("Sampling profiler wrote %d samples to: %s", self.samples, path)
+    
+    def control(self, env):
+        """Answer an administrative request, starting or stopping sampling according to the query string."""
+        
+        action = env.get('QUERY_STRING', '')
+        
+        if action == 'start':
+            self.start()
+        
+        elif action == 'stop':
+            self.stop()
+        
+        return dict(pid=os.getpid(), running=self.running, samples=self.samples, written=self.written)
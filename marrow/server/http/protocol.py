@@ -1,18 +1,29 @@
 # encoding: utf-8
 
+import json
 import logging
 import tempfile
 
-import time
 from functools import partial
-from email.utils import formatdate
+from concurrent.futures import Future
 
 from marrow.server.protocol import Protocol
 
 from marrow.util.object import LoggingFile
-from marrow.util.compat import binary, unicode, native, bytestring, uvalues, IO, unquote
+from marrow.util.compat import binary, unicode, bytestring, IO
 
-from marrow.server.http import release
+from marrow.server.http.parser import HeadParser, ParseError
+from marrow.server.http.response import ResponseHead, VERSION_STRING
+from marrow.server.http.sendfile import FileWrapper, SendFile, descriptor
+from marrow.server.http.input import EMPTY, StreamingInput
+from marrow.server.http.completion import CompletionQueue
+from marrow.server.http.timer import TimerWheel
+from marrow.server.http.asynchronous import future, suspend
+from marrow.server.http.stats import Statistics, clock
+from marrow.server.http.admission import Admission
+from marrow.server.http.pool import ProcessPool
+from marrow.server.http.access import AccessLog
+from marrow.server.http import chain
 
 
 __all__ = ['HTTPProtocol']
@@ -21,9 +32,14 @@ log = logging.getLogger(__name__)
 
 CRLF = b"\r\n"
 dCRLF = b"\r\n\r\n"
+DIGITS = "0123456789"
+HEXDIGITS = b"0123456789abcdefABCDEF"
 HTTP_INTERNAL_ERROR = b" 500 Internal Server Error\r\nContent-Type: text/plain\r\nContent-Length: 48\r\n\r\nThe server encountered an unrecoverable error.\r\n"
-VERSION_STRING = b'marrow.httpd/' + release.release.encode('iso-8859-1')
-nCRLF = native(CRLF)
+HTTP_ERROR_BODY = b"\r\nConnection: close\r\nContent-Length: 0\r\n\r\n"
+HTTP_TIMEOUT = b"408 Request Timeout"
+HTTP_UNAVAILABLE = b" 503 Service Unavailable\r\nContent-Type: text/plain\r\nContent-Length: 46\r\nRetry-After: "
+HTTP_UNAVAILABLE_BODY = b"\r\n\r\nThe server is temporarily unable to respond.\r\n"
+SPOOL_SIZE = 1*1024*1024
 errorlog = LoggingFile(logging.getLogger('wsgi.errors'))
 
 
@@ -35,50 +51,275 @@ class HTTPProtocol(Protocol):
         self.application = application
         self.ingress = ingress if ingress else []
         self.egress = egress if egress else []
+        self.filter_ingress = chain.ingress(self.ingress)
+        self.filter_egress = chain.egress(self.egress)
+        self.strict = options.get('strict', True)
         self.encoding = encoding
+        self.parser = HeadParser(encoding, options.get('max_headers', 100), options.get('max_head_size', 65536))
+        self.head = ResponseHead()
+        self.completions = CompletionQueue()
+        self.timers = TimerWheel()
+        self.gather = options.get('gather', 65536)
+        self.read_size = options.get('read_size', 65536)
+        # While awaiting a request head the stream buffers little more than the head may occupy; see Connection.read.
+        self.head_buffer = options.get('max_head_size', 65536) + self.read_size
+        self.buffer_size = None # The stream's own limit, restored once the head has arrived.
+        self.streaming = options.get('streaming', False)
+        self.pipeline = options.get('pipeline', True)
+        self.idle_timeout = options.get('idle_timeout', 60)
+        self.head_timeout = options.get('head_timeout', 30)
+        self.body_timeout = options.get('body_timeout', 60)
+        self.cache = options.get('cache', None)
+        self.stats = options.get('stats', None)
+        self.profiler = options.get('profiler', None)
+        self.access = options.get('access', None)
+        self.processes = options.get('processes', None)
+        self.admission = options.get('admission', None)
+        self.pause_accept = options.get('pause_accept', False)
+        self.paused = False
+        self.endpoints = dict() # Administrative paths answered for the local host, mapped to a callable.
+        self.connections = set()
+        self.completed = 0 # Responses delivered.
+        self.draining = None # Called once every connection has closed, after drain().
+        
+        if self.stats is True:
+            self.stats = Statistics()
+        
+        if self.stats is not None and options.get('stats_path'):
+            self.endpoints[options['stats_path']] = lambda env: self.stats.snapshot()
+        
+        if self.profiler is not None and options.get('profiler_path'):
+            self.endpoints[options['profiler_path']] = self.profiler.control
+        
+        if self.admission is True:
+            self.admission = Admission()
+        
+        if self.admission is not None and server.threaded is False and self.processes is None:
+            log.warning("Admission control applies only to a threaded server or process pool; all requests will be admitted.")
+            self.admission = None
+        
+        # Refusals are pre-serialized, lacking only the protocol version.
+        self.unavailable = HTTP_UNAVAILABLE + bytestring(str(options.get('retry_after', 1))) + HTTP_UNAVAILABLE_BODY
+        
+        if self.pipeline is True:
+            self.pipeline = 16
+        
+        if self.streaming is True:
+            self.streaming = 16
+        
+        if self.access is not None and not isinstance(self.access, AccessLog):
+            self.access = AccessLog(self.access)
+        
+        if self.processes is True or isinstance(self.processes, int):
+            self.processes = ProcessPool(None if self.processes is True else self.processes)
+        
+        if self.streaming and (server.threaded is False or self.processes is not None):
+            # The application would block the IOLoop waiting for body data only the IOLoop can deliver.
+            log.warning("Streaming request bodies requires a threaded server without a process pool; request bodies will be buffered.")
+            self.streaming = False
         
         self._name = server.name
         self._addr = server.address[0] if isinstance(server.address, tuple) else ''
         self._port = str(server.address[1]) if isinstance(server.address, tuple) else '80'
     
+    def start(self):
+        super(HTTPProtocol, self).start()
+        
+        server = self.server
+        
+        # The portion of the environment common to every request; only REMOTE_ADDR varies by connection.
+        env = self.template = dict()
+        env['SERVER_NAME'] = self._name
+        env['SERVER_ADDR'] = self._addr
+        env['SERVER_PORT'] = self._port
+        env['SCRIPT_NAME'] = unicode()
+        
+        env['wsgi.input'] = EMPTY
+        env['wsgi.errors'] = errorlog
+        env['wsgi.file_wrapper'] = FileWrapper
+        env['wsgi.version'] = (2, 0)
+        env['wsgi.multithread'] = getattr(server, 'threaded', False) # TODO: Temporary hack until marrow.server 1.0 release.
+        env['wsgi.multiprocess'] = server.fork != 1 or getattr(server, 'reuseport', False)
+        env['wsgi.run_once'] = False
+        env['wsgi.url_scheme'] = 'http'
+        env['wsgi.async'] = True
+        
+        if server.threaded is not False:
+            env['wsgi.executor'] = server.executor # pimp out the concurrent.futures thread pool executor
+        
+        if self.processes is not None:
+            self.processes.start(self.application)
+        
+        if self.admission is not None:
+            self.admission.start(server.executor if self.processes is None else self.processes.executor)
+        
+        # env['wsgi.script_name'] = b''
+        # env['wsgi.path_info'] = b''
+        
+        self.head.start(server.io)
+        self.timers.start(server.io)
+        
+        # Asynchronous applications may complete from any thread, threaded or not.
+        self.completions.start(server.io)
+        
+        if self.stats is not None:
+            self.stats.start(server.io)
+        
+        if self.profiler is not None:
+            self.profiler.install()
+        
+        if self.access is not None:
+            self.access.start()
+    
+    def stop(self):
+        if self.profiler is not None:
+            self.profiler.uninstall()
+        
+        if self.stats is not None:
+            self.stats.stop()
+        
+        if self.access is not None:
+            self.access.stop()
+        
+        if self.processes is not None:
+            self.processes.stop()
+        
+        self.completions.stop()
+        self.timers.stop()
+        self.head.stop()
+        super(HTTPProtocol, self).stop()
+    
     def accept(self, client):
+        if self.stats is not None:
+            self.stats.connections += 1
+        
         self.Connection(self.server, self, client)
     
+    def drain(self, callback):
+        """Close idle connections and any others once their current response is delivered, then run the callback."""
+        
+        self.draining = callback
+        
+        for connection in list(self.connections):
+            if not connection.queue and connection.environ is None:
+                connection.client.close()
+        
+        if not self.connections:
+            callback()
+    
+    def throttle(self):
+        """Stop accepting connections while the admission limit is reached, if configured to, and resume after."""
+        
+        full = self.admission.inflight >= int(self.admission.limit)
+        
+        if full is self.paused or not self.pause_accept or self.draining is not None:
+            return
+        
+        self.paused = full
+        
+        if full:
+            self.server.pause()
+        
+        else:
+            self.server.resume()
+    
     class Connection(object):
+        # Idle connections vastly outnumber active requests; keep the per-connection footprint to a minimum.
+        __slots__ = ('server', 'protocol', 'client', 'remote', 'environ', 'finished', 'streaming', 'writer', 'queue',
+                'waiting', 'timeout', 'chunked', 'remaining', 'served', 'sent')
+        
         def __init__(self, server, protocol, client):
             self.server = server
             self.protocol = protocol
             self.client = client
+            self.remote = client.socket.getpeername()
+            
+            self.environ = None
+            self.finished = False
+            self.streaming = False
+            self.writer = None
+            self.queue = [] # Bounded by the pipeline depth; far smaller than a deque when empty.
+            self.waiting = None
+            self.timeout = None
+            self.chunked = False
+            self.remaining = 0
+            self.served = 0
+            self.sent = 0 # Bytes of the current response's body written, excluding any chunked framing.
+            
+            protocol.connections.add(self)
+            client.set_close_callback(self.closed)
+            
+            if protocol.buffer_size is None:
+                protocol.buffer_size = client.max_buffer_size
+            
+            # The first request is expected promptly; later ones may follow an idle period on a persistent connection.
+            self.expect(protocol.head_timeout, self.head_expired)
+            self.read()
+        
+        def expect(self, delay=None, callback=None):
+            """Replace the connection's pending deadline, if any, with a new one; with no delay, only cancel."""
             
-            env = dict()
-            env['REMOTE_ADDR'] = client.socket.getpeername()
-            env['SERVER_NAME'] = protocol._name
-            env['SERVER_ADDR'] = protocol._addr
-            env['SERVER_PORT'] = protocol._port
-            env['SCRIPT_NAME'] = unicode()
+            timers = self.protocol.timers
             
-            env['wsgi.input'] = IO()
-            env['wsgi.errors'] = errorlog
-            env['wsgi.version'] = (2, 0)
-            env['wsgi.multithread'] = getattr(server, 'threaded', False) # TODO: Temporary hack until marrow.server 1.0 release.
-            env['wsgi.multiprocess'] = server.fork != 1
-            env['wsgi.run_once'] = False
-            env['wsgi.url_scheme'] = 'http'
-            env['wsgi.async'] = False # TODO
+            if self.timeout is not None:
+                timers.cancel(self.timeout)
             
-            if self.server.threaded is not False:
-                env['wsgi.executor'] = self.server.executor # pimp out the concurrent.futures thread pool executor
+            self.timeout = timers.schedule(delay, callback) if delay else None
+        
+        def closed(self):
+            protocol = self.protocol
+            protocol.connections.discard(self)
             
-            # env['wsgi.script_name'] = b''
-            # env['wsgi.path_info'] = b''
+            input_ = self.environ.get('wsgi.input') if self.environ else None
             
-            self.environ = None
-            self.environ_template = env
+            if isinstance(input_, StreamingInput) and not input_.finished:
+                # The application is still reading a body which will never arrive.
+                input_.abort()
             
-            self.finished = False
-            self.pipeline = protocol.options.get('pipeline', True) # TODO
+            for index, (env, response) in enumerate(self.queue):
+                # Responses yet to be delivered, or cut short, will never be written; their bodies must still be closed.
+                # (The body of a response which has been written in full already has been.)
+                if response is not None and not (index == 0 and self.finished):
+                    self.release(response)
+            
+            if protocol.draining is not None and not protocol.connections:
+                protocol.draining()
+        
+        def idle_expired(self):
+            self.timeout = None
+            
+            if self.client.closed():
+                return
+            
+            if self.queue:
+                # Earlier pipelined responses are still being composed or delivered; the connection isn't idle.
+                self.expect(self.protocol.idle_timeout, self.idle_expired)
+                return
             
-            client.read_until(dCRLF, self.headers)
+            log.debug("Closing idle persistent connection.")
+            self.client.close()
+        
+        def head_expired(self):
+            self.timeout = None
+            
+            if not self.client.closed():
+                log.debug("Timed out waiting for request head.")
+                self.reject(HTTP_TIMEOUT)
+        
+        def body_expired(self):
+            self.timeout = None
+            
+            if self.client.closed():
+                return
+            
+            log.debug("Timed out waiting for request body.")
+            
+            if self.streaming:
+                # The application is already consuming the body and its response is queued; it can only be aborted.
+                self.client.close()
+                return
+            
+            self.reject(HTTP_TIMEOUT)
         
         def finish(self):
             assert not self.finished, "Attempt complete an already completed request."
@@ -94,61 +335,33 @@ class HTTPProtocol(Protocol):
             # THREADING TODO: Experiment with threading this callback.
             
             # log.debug("Received: %r", data)
-            self.environ = environ = dict(self.environ_template)
-            
-            line = data[:data.index(CRLF)].split()
-            environ['REQUEST_URI'] = line[1]
-            
-            remainder, _, fragment = line[1].partition(b'#')
-            remainder, _, query = remainder.partition(b'?')
-            path, _, param = remainder.partition(b';')
-            
-            if b"://" in path:
-                scheme, _, path = path.partition(b'://')
-                host, _, path = path.partition(b'/')
-                path = b'/' + path
-                
-                environ['wsgi.url_scheme'] = native(scheme)
-                environ['HTTP_HOST'] = host
+            stats = self.protocol.stats
+            if stats is not None or self.protocol.access is not None: received = clock()
             
-            environ['REQUEST_METHOD'] = native(line[0])
-            environ['CONTENT_TYPE'] = None
-            environ['FRAGMENT'] = fragment
-            environ['SERVER_PROTOCOL'] = native(line[2])
-            environ['CONTENT_LENGTH'] = None
+            self.expect()
+            self.client.max_buffer_size = self.protocol.buffer_size
+            self.environ = environ = dict(self.protocol.template)
+            environ['REMOTE_ADDR'] = self.remote
             
-            environ['PATH_INFO'] = unquote(path)
-            environ['PARAMETERS'] = param
-            environ['QUERY_STRING'] = query
+            try:
+                self.protocol.parser(data, environ)
             
-            if environ['REQUEST_METHOD'] == 'HEAD':
-                environ['marrow.head'] = True
-                environ['REQUEST_METHOD'] = 'GET'
+            except ParseError as e:
+                log.debug("Rejecting malformed request: %s", e)
+                self.reject(e.status)
+                return
             
-            _ = ('PATH_INFO', 'PARAMETERS', 'QUERY_STRING', 'FRAGMENT')
-            environ['wsgi.uri_encoding'], __ = uvalues([environ[i] for i in _], self.protocol.encoding)
-            environ.update(zip(_, __))
-            del _, __
+            self.served += 1
             
-            current, header = None, None
-            noprefix = dict(CONTENT_TYPE=True, CONTENT_LENGTH=True)
+            if stats is not None:
+                # Timestamps of each phase; see marrow.server.http.stats.
+                environ['marrow.stats'] = [received, clock(), None, None, None, None]
+                stats.requests += 1
+                stats.received += len(data)
+                if self.served > 1: stats.reused += 1
             
-            # All keys and values are native strings.
-            data = native(data) if str is unicode else data
-            
-            for line in data.split(nCRLF)[1:]:
-                if not line: break
-                assert current is not None or line[0] != ' ' # TODO: Do better than dying abruptly.
-                
-                if line[0] == ' ':
-                    _ = line.lstrip()
-                    environ[current] += _
-                    continue
-                
-                header, _, value = line.partition(': ')
-                current = header.replace('-', '_').upper()
-                if current not in noprefix: current = 'HTTP_' + current
-                environ[current] = value
+            if self.protocol.access is not None:
+                environ['marrow.received'] = received
             
             # TODO: Proxy support.
             # for h in ("X-Real-Ip", "X-Real-IP", "X-Forwarded-For"):
@@ -156,154 +369,544 @@ class HTTPProtocol(Protocol):
             #     if self.remote_ip is not None:
             #         break
             
-            self.environ['wsgi.input'] = tempfile.SpooledTemporaryFile(1*1024*1024, 'w+b', suffix='http', prefix='marrow')
-            
-            if environ.get("HTTP_EXPECT", None) == "100-continue":
-                self.client.write(b"HTTP/1.1 100 (Continue)\r\n\r\n")
+            self.chunked = False
+            self.remaining = 0
             
             if environ['CONTENT_LENGTH'] is None:
-                if environ.get('HTTP_TRANSFER_ENCODING', '').lower() == 'chunked':
-                    self.client.read_until(CRLF, self.body_chunked)
+                self.chunked = environ.get('HTTP_TRANSFER_ENCODING', '').lower() == 'chunked'
+            
+            else:
+                length = environ['CONTENT_LENGTH']
+                
+                if not length or length.strip(DIGITS):
+                    # Only a plain number of bytes; not negative, nor any other form int() accepts, such as "+5".
+                    self.reject(b"400 Bad Request")
                     return
                 
+                self.remaining = int(length)
+            
+            if not self.remaining and not self.chunked:
+                # No body; the template's shared empty input is used and nothing needs to be read.
+                self.streaming = False
                 self.body_finished()
                 return
             
-            length = int(environ['CONTENT_LENGTH'])
+            if environ.get("HTTP_EXPECT", None) == "100-continue":
+                if self.queue:
+                    # The interim response must not be interleaved with the delivery of earlier pipelined responses.
+                    self.waiting = (0, self.body_continue)
+                    return
+                
+                self.body_continue()
+                return
             
-            if length > self.client.max_buffer_size:
-                # TODO: Return appropriate HTTP response in addition to logging the error.
-                raise Exception("Content-Length too long.")
+            self.body_start()
+        
+        def body_continue(self):
+            if self.protocol.stats is not None:
+                self.protocol.stats.continues += 1
+                self.protocol.stats.sent += 27
             
-            self.client.read_bytes(length, self.body)
+            self.client.write(b"HTTP/1.1 100 (Continue)\r\n\r\n")
+            self.body_start()
+        
+        def body_start(self):
+            self.streaming = self.protocol.streaming
+            
+            if not self.streaming:
+                if self.chunked or self.remaining > SPOOL_SIZE:
+                    self.environ['wsgi.input'] = tempfile.SpooledTemporaryFile(SPOOL_SIZE, 'w+b', suffix='http', prefix='marrow')
+                
+                else:
+                    # The body is known to fit within the spooling threshold; skip the spooling wrapper.
+                    self.environ['wsgi.input'] = IO()
+                
+                self.body_read()
+                return
+            
+            self.environ['wsgi.input'] = StreamingInput(self.server.io, self.body_read, self.protocol.streaming)
+            
+            # The application is invoked immediately, reading the body as it arrives.
+            self.body_finished()
+            self.body_read()
+        
+        def body_read(self):
+            """Request the next portion of the request body from the client.
+            
+            The body is read in blocks of at most `read_size` bytes; chunk boundaries are tracked by `body` using the
+            number of bytes remaining in the current chunk, including its terminating CRLF.
+            """
+            
+            if self.remaining:
+                self.expect(self.protocol.body_timeout, self.body_expired)
+                self.client.read_bytes(min(self.remaining, self.protocol.read_size), self.body)
+                return
+            
+            if self.chunked:
+                self.expect(self.protocol.body_timeout, self.body_expired)
+                self.client.read_until(CRLF, self.body_chunked)
+                return
+            
+            self.body_complete()
         
         def body(self, data):
             # log.debug("Received body: %r", data)
-            self.environ['wsgi.input'].write(data)
-            self.body_finished()
+            self.remaining -= len(data)
+            
+            if self.protocol.stats is not None:
+                self.protocol.stats.received += len(data)
+            
+            if self.chunked and self.remaining < 2:
+                # The final two bytes of each chunk are the CRLF terminating it.
+                data = data[:len(data) - min(len(data), 2 - self.remaining)]
+            
+            if self.streaming:
+                if not self.environ['wsgi.input'].write(data):
+                    # Paused; the input will call body_read once the application has caught up.
+                    self.expect()
+                    return
+            
+            elif data:
+                self.environ['wsgi.input'].write(data)
+            
+            self.body_read()
         
         def body_chunked(self, data):
             # log.debug("Received chunk header: %r", data)
-            length = int(data.strip(CRLF).split(b';')[0], 16)
+            size = data.strip(CRLF).split(b';')[0].strip()
+            
+            if not size or size.strip(HEXDIGITS):
+                if self.streaming:
+                    # As in body_expired, the application is already consuming the body and its response is queued
+                    # ahead of any rejection; closing aborts its input.
+                    log.debug("Aborting request with malformed chunk header: %r", data)
+                    self.client.close()
+                    return
+                
+                self.reject(b"400 Bad Request")
+                return
+            
+            length = int(size, 16)
+            
             # log.debug("Chunk length: %r", length)
             
             if length == 0:
+                self.expect(self.protocol.body_timeout, self.body_expired)
                 self.client.read_until(CRLF, self.body_trailers)
                 return
             
-            self.client.read_bytes(length + 2, self.body_chunk)
-        
-        def body_chunk(self, data):
-            # log.debug("Received chunk: %r", data)
-            self.environ['wsgi.input'].write(data[:-2])
-            self.client.read_until(CRLF, self.body_chunked)
+            self.remaining = length + 2
+            self.body_read()
         
         def body_trailers(self, data):
             # log.debug("Received chunk trailers: %r", data)
             # TODO: Update headers with additional headers.
+            self.body_complete()
+        
+        def body_complete(self):
+            self.expect()
+            
+            if self.streaming:
+                self.environ['wsgi.input'].eof()
+                self.next_request()
+                return
+            
+            self.environ['wsgi.input'].seek(0)
             self.body_finished()
         
         def body_finished(self):
-            self.environ['wsgi.input'].seek(0)
+            """Dispatch the request to the application, reserving its place in the response queue."""
             
-            if self.server.threaded is not False:
-                # log.debug("Deferring response composition.")
-                future = self.server.executor.submit(self.compose_response)
+            env = self.environ
+            slot = [env, None]
+            self.queue.append(slot)
+            
+            cache = self.protocol.cache
+            
+            if 'marrow.stats' in env:
+                env['marrow.stats'][2] = clock()
+            
+            if self.protocol.endpoints and env['PATH_INFO'] in self.protocol.endpoints and self.administer(slot):
+                cache = slot = None
+            
+            if slot is not None and (cache is None or not cache.served(self, slot)):
+                self.dispatch(slot)
+            
+            if not self.streaming:
+                self.next_request()
+        
+        def dispatch(self, slot):
+            env = slot[0]
+            processes = self.protocol.processes
+            
+            if self.server.threaded is not False or processes is not None:
+                # Responses composed in a pool process arrive as the status, headers, and body, as if asynchronous.
+                callback = partial(self.composed if processes is None else self.resumed, slot)
+                admission = self.protocol.admission
                 
-                def callback(future):
-                    # log.debug("Deferred response composition finished.")
-                    
-                    try:
-                        # log.debug("Retreiving composed response.")
-                        response = future.result()
-                    
-                    except:
-                        log.exception("Unhandled application exception.")
-                        self.client.write(self.environ['SERVER_PROTOCOL'].encode('iso-8859-1') + HTTP_INTERNAL_ERROR, self.finish)
+                if admission is not None:
+                    if not admission.admit():
+                        self.refuse(slot)
                         return
                     
-                    # log.debug("Delivering response.")
-                    self.deliver(response)
+                    callback = partial(self.admitted, clock(), callback)
+                    self.protocol.throttle()
                 
-                future.add_done_callback(callback)
+                # log.debug("Deferring response composition.")
+                future = self.delegate(env) if processes is not None else self.server.executor.submit(self.compose_response, env)
+                future.add_done_callback(partial(self.completed, callback))
+            
+            else:
+                try:
+                    response = self.compose_response(env)
+                
+                except:
+                    log.exception("Unhandled application exception.")
+                    response = self.failure(env)
+                
+                self.respond(slot, response)
+        
+        def delegate(self, env):
+            """Apply ingress filters, then submit the request to the process pool."""
+            
+            if 'marrow.stats' in env:
+                env['marrow.stats'][3] = clock()
+            
+            try:
+                if self.protocol.filter_ingress is not None:
+                    self.protocol.filter_ingress(env)
+                
+                return self.protocol.processes.submit(env)
+            
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+                return future
+        
+        def completed(self, callback, future):
+            # Executed in whichever thread completed the future; the result is handled in the IOLoop thread.
+            self.protocol.completions.push(partial(callback, future))
+        
+        def admitted(self, dispatched, callback, future):
+            self.protocol.admission.release(clock() - dispatched)
+            self.protocol.throttle()
+            callback(future)
+        
+        def refuse(self, slot):
+            """Shed a request the executor has no room for, asking the client to retry shortly."""
+            
+            if self.protocol.stats is not None:
+                self.protocol.stats.shed += 1
+            
+            env = slot[0]
+            response = env['SERVER_PROTOCOL'].encode('iso-8859-1') + self.protocol.unavailable
+            
+            if env.get('marrow.head', False):
+                response = response[:-len(HTTP_UNAVAILABLE_BODY) + 4]
+            
+            slot[1] = self.cached(response)
+            
+            if 'marrow.cache' in env:
+                # Identical requests waiting on this one's response must now be dispatched themselves.
+                self.protocol.cache.complete(env)
+            
+            self.flush()
+        
+        def composed(self, slot, future):
+            try:
+                # log.debug("Retreiving composed response.")
+                response = future.result()
+            
+            except:
+                log.exception("Unhandled application exception.")
+                response = self.failure(slot[0])
+            
+            self.respond(slot, response)
+        
+        def respond(self, slot, response):
+            if hasattr(response, 'add_done_callback'):
+                # An asynchronous application; the response is composed once its result is available.
+                response.add_done_callback(partial(self.completed, partial(self.resumed, slot)))
                 return
             
+            self.ready(slot, response)
+        
+        def resumed(self, slot, future):
+            env = slot[0]
+            
             try:
-                self.deliver(self.compose_response())
+                status, headers, body = future.result()
+                response = self.compose(env, status, headers, body)
             
             except:
                 log.exception("Unhandled application exception.")
-                self.client.write(self.environ['SERVER_PROTOCOL'].encode('iso-8859-1') + HTTP_INTERNAL_ERROR, self.finish)
+                response = self.failure(env)
+            
+            self.ready(slot, response)
         
-        def compose_response(self):
-            # log.debug("Composing response.")
-            env = self.environ
+        def ready(self, slot, response):
+            if 'marrow.stats' in slot[0]:
+                slot[0]['marrow.stats'][4] = clock()
             
-            for filter_ in self.protocol.ingress:
-                filter_(env)
+            if 'marrow.cache' in slot[0]:
+                self.protocol.cache.complete(slot[0])
             
-            status, headers, body = self.protocol.application(env)
+            if self.client.closed():
+                # The client went away while the response was being composed.
+                self.release(response)
+                return
             
-            for filter_ in self.protocol.egress:
-                status, headers, body = filter_(env, status, headers, body)
+            slot[1] = response
+            self.flush()
+        
+        def release(self, response):
+            """Close the body of a response which will never be delivered."""
             
-            # Canonicalize the names of the headers returned by the application.
-            present = [i[0].lower() for i in headers]
+            writer = response[1]
+            original = writer.original if isinstance(writer, SendFile) else writer.args[0]
+            
+            try:
+                original.close()
+            except AttributeError:
+                pass
+        
+        def cached(self, data):
+            """Return a response writing previously serialized response data."""
+            
+            return data, partial(self.write_body, None, iter(()), False)
+        
+        def next_request(self):
+            """Begin reading the next pipelined request, if the connection persists and the queue has room."""
+            
+            if not self.persistent(self.environ):
+                return
+            
+            if len(self.queue) >= self.protocol.pipeline:
+                self.waiting = (self.protocol.pipeline - 1, self.read_head)
+                return
+            
+            self.read_head()
+        
+        def read_head(self):
+            # Don't hold the previous request's environment (and its input) while the connection sits idle.
+            self.environ = None
+            self.expect(self.protocol.idle_timeout, self.idle_expired)
+            self.read()
+        
+        def read(self):
+            """Read a request head, closing the connection if the stream buffers far more than `max_head_size` for it."""
             
-            # These checks are optional; if the application is well-behaved they can be disabled.
-            # Of course, if disabled, m.s.http isn't WSGI 2 compliant. (But it is faster!)
-            assert isinstance(status, binary), "Response status must be a bytestring."
+            self.client.max_buffer_size = self.protocol.head_buffer
+            self.client.read_until(dCRLF, self.headers)
+        
+        def persistent(self, env):
+            """Determine if the connection may be used for further requests after the given one."""
+            
+            if not self.protocol.pipeline or self.protocol.draining is not None:
+                return False
+            
+            if env['SERVER_PROTOCOL'] == 'HTTP/1.1':
+                return env.get('HTTP_CONNECTION', '').lower() != "close"
+            
+            if env['CONTENT_LENGTH'] is not None or env['REQUEST_METHOD'] in ('HEAD', 'GET'):
+                return env.get('HTTP_CONNECTION', '').lower() == 'keep-alive'
+            
+            return False
+        
+        def administer(self, slot):
+            """Answer a request for an administrative endpoint with JSON, returning False if it isn't from the local host."""
+            
+            env = slot[0]
+            remote = env['REMOTE_ADDR'][0] if isinstance(env['REMOTE_ADDR'], tuple) else env['REMOTE_ADDR']
+            
+            if not remote.startswith('127.') and remote not in ('::1', '::ffff:127.0.0.1'):
+                return False
             
-            for i, j in headers:
-                assert isinstance(i, binary), "Response header names must be bytestrings."
-                assert isinstance(j, binary), "Response header values must be bytestrings."
+            body = json.dumps(self.protocol.endpoints[env['PATH_INFO']](env), sort_keys=True).encode('ascii')
+            headers = [(b'Content-Type', b'application/json'), (b'Cache-Control', b'no-store'), (b'Content-Length', bytestring(str(len(body))))]
+            head = self.protocol.head(env['SERVER_PROTOCOL'], b"200 OK", headers)
             
-            assert b'transfer-encoding' not in present, "Applications must not set the Transfer-Encoding header."
-            assert b'connection' not in present, "Applications must not set the Connection header."
+            slot[1] = self.cached(head if env.get('marrow.head', False) else head + body)
+            self.flush()
+            
+            return True
+        
+        def failure(self, env):
+            if self.protocol.stats is not None:
+                self.protocol.stats.errors += 1
+            
+            return env['SERVER_PROTOCOL'].encode('iso-8859-1') + HTTP_INTERNAL_ERROR, partial(self.write_body, None, iter(()), False)
+        
+        def reject(self, status):
+            """Queue an error response to a malformed request, after which the connection is closed."""
+            
+            self.expect()
+            self.environ = env = {'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_CONNECTION': 'close', 'wsgi.input': EMPTY}
+            
+            if self.protocol.stats is not None:
+                self.protocol.stats.rejected += 1
+            
+            self.queue.append([env, (b"HTTP/1.1 " + status + HTTP_ERROR_BODY, partial(self.write_body, None, iter(()), False))])
+            self.flush()
+        
+        def compose_response(self, env):
+            # log.debug("Composing response.")
             
-            if b'server' not in present:
-                headers.append((b'Server', VERSION_STRING))
+            if 'marrow.stats' in env:
+                env['marrow.stats'][3] = clock()
             
-            if b'date' not in present:
-                headers.append((b'Date', bytestring(formatdate(time.time(), False, True))))
+            if self.protocol.filter_ingress is not None:
+                self.protocol.filter_ingress(env)
+            
+            result = self.protocol.application(env)
+            
+            if not isinstance(result, tuple):
+                pending = suspend(result, self.server.io, self.protocol.completions.push)
+                
+                if pending is not None:
+                    return pending
+            
+            status, headers, body = result
+            return self.compose(env, status, headers, body)
+        
+        def compose(self, env, status, headers, body):
+            if self.protocol.filter_egress is not None:
+                status, headers, body = self.protocol.filter_egress(env, status, headers, body)
+            
+            # Canonicalize the names of the headers returned by the application.
+            present = [i[0].lower() for i in headers]
+            
+            if self.protocol.strict:
+                # These checks are optional; if the application is well-behaved they can be disabled (strict=False).
+                # Of course, if disabled, m.s.http isn't WSGI 2 compliant. (But it is faster!)
+                assert isinstance(status, binary), "Response status must be a bytestring."
+                
+                for i, j in headers:
+                    assert isinstance(i, binary), "Response header names must be bytestrings."
+                    assert isinstance(j, binary), "Response header values must be bytestrings."
+                
+                assert b'transfer-encoding' not in present, "Applications must not set the Transfer-Encoding header."
+                assert b'connection' not in present, "Applications must not set the Connection header."
             
             is_head = env.get('marrow.head', False)
+            sendable = descriptor(body)
+            
+            if sendable is not None:
+                fd, offset, remaining = sendable
+                
+                if b'content-length' in present:
+                    remaining = min(remaining, int(headers[present.index(b'content-length')][1]))
+                
+                else:
+                    # The size of a regular file is known in advance; there is no need for chunked encoding.
+                    # Determined for HEAD requests too, so they are framed as the equivalent GET would be.
+                    headers.append((b'Content-Length', unicode(remaining).encode('ascii')))
+                    present.append(b'content-length')
+            
             if is_head:
                 try: body.close()
                 except AttributeError: pass
                 
                 body = []
+                sendable = None
+            
+            captured = None
+            
+            if sendable is None and 'marrow.cache' in env:
+                captured, body = self.protocol.cache.capture(env, status, headers, present, body, is_head)
             
-            if env['SERVER_PROTOCOL'] == "HTTP/1.1" and b'content-length' not in present:
-                headers.append((b"Transfer-Encoding", b"chunked"))
-                headers = env['SERVER_PROTOCOL'].encode('iso-8859-1') + b" " + status + CRLF + CRLF.join([(i + b': ' + j) for i, j in headers]) + dCRLF
-                return headers, partial(self.write_body if is_head else self.write_body_chunked, body, iter(body))
+            # Responses to these statuses never have a body, so there is nothing to frame.
+            bodiless = status[:3] in (b'204', b'304') or status[:1] == b'1'
             
-            headers = env['SERVER_PROTOCOL'].encode('iso-8859-1') + b" " + status + CRLF + CRLF.join([(i + b': ' + j) for i, j in headers]) + dCRLF
-            return headers, partial(self.write_body, body, iter(body))
+            if self.protocol.draining is not None:
+                headers.append((b'Connection', b'close'))
+            
+            chunked = env['SERVER_PROTOCOL'] == "HTTP/1.1" and b'content-length' not in present and not bodiless
+            headers = self.protocol.head(env['SERVER_PROTOCOL'], status, headers, b'server' not in present, b'date' not in present, chunked)
+            
+            if captured is not None:
+                env['marrow.cache.entry'] = (captured, headers + b''.join(body))
+            
+            # The same writer is used as the write callback for every batch of the body.
+            writer = partial(self.write_body, body, iter(body), chunked and not is_head)
+            
+            if sendable is not None:
+                writer = SendFile(self, body, fd, offset, remaining, writer)
+            
+            return headers, writer
         
-        def deliver(self, response):
-            # TODO: expand with 'self.client.writer' callable to support threading efficiently.
-            # Single-threaded we can write directly to the stream, multi-threaded we need to queue responses for the main thread to deliver.
+        def flush(self):
+            """Deliver the response at the head of the queue if it is ready and no other response is being written.
             
-            # log.debug("Delivering the response.")
+            Responses to pipelined requests may be composed out of order, but are always delivered in request order.
+            """
+            
+            if self.writer is not None or not self.queue or self.client.closed():
+                return
             
-            self.client.write(*response)
+            response = self.queue[0][1]
+            
+            if response is not None:
+                self.deliver(response)
         
-        def write_body(self, original, body):
+        def deliver(self, response):
+            # log.debug("Delivering the response.")
+            head, self.writer = response
+            env = self.queue[0][0]
+            self.sent = 0
+            
+            if 'marrow.stats' in env:
+                env['marrow.stats'][5] = clock()
+            
             try:
-                chunk = next(body)
-                assert isinstance(chunk, binary), "Body iterators must yield bytestrings."
-                # log.debug('Sending body: %s', chunk)
-                self.client.write(chunk, partial(self.write_body, original, body))
+                self.writer(head)
             
-            except StopIteration:
-                self.finish()
+            except:
+                # Nothing has been written if the first batch of the body failed; the client can be told.
+                log.exception("Unhandled application exception.")
+                self.queue[0][1] = head, self.writer = self.failure(self.queue[0][0])
+                self.writer(head)
+        
+        def write_body(self, original, body, chunked, head=None, first=None):
+            """Write the next batch of the response body, preceded by the response head if given.
+            
+            Body chunks are gathered until at least `gather` bytes are waiting or the body is exhausted, then written in a
+            single call.  When chunked, each batch is framed as a single chunk.
+            
+            If the body yields a future in place of a chunk, the batch gathered so far is written and delivery resumes,
+            beginning with the `first` chunk, once the future's result is available.
+            """
+            
+            parts = [head or b'', b'']
+            limit = self.protocol.gather
+            stats = self.protocol.stats
+            size = 0
+            pending = None
+            
+            if first:
+                parts.append(first)
+                size = len(first)
+            
+            try:
+                for chunk in body:
+                    if not isinstance(chunk, binary):
+                        pending = future(chunk, self.server.io)
+                        if pending is not None: break
+                    
+                    assert isinstance(chunk, binary), "Body iterators must yield bytestrings."
+                    
+                    if not chunk:
+                        # An empty chunk would prematurely terminate chunked encoding.
+                        continue
+                    
+                    parts.append(chunk)
+                    size += len(chunk)
+                    
+                    if size >= limit:
+                        break
                 
-                try:
-                    original.close()
-                except AttributeError: # pragma: no cover
-                    pass
+                else:
+                    body = None
             
             except:
                 try:
@@ -311,49 +914,101 @@ class HTTPProtocol(Protocol):
                 except AttributeError:
                     pass
                 raise
+            
+            if chunked and size:
+                parts[1] = bytestring(hex(size)[2:]) + CRLF
+                parts.append(CRLF)
+            
+            if pending is not None:
+                data = b''.join(parts)
+                if stats is not None: stats.sent += len(data)
+                self.sent += size
+                if data: self.client.write(data)
+                
+                pending.add_done_callback(partial(self.completed, partial(self.resumed_body, original)))
+                return
+            
+            if body is not None:
+                # log.debug('Sending body: %d bytes', size)
+                data = b''.join(parts)
+                if stats is not None: stats.sent += len(data)
+                self.sent += size
+                self.client.write(data, self.writer)
+                return
+            
+            try:
+                original.close()
+            except AttributeError: # pragma: no cover
+                pass
+            
+            if chunked:
+                parts.append(b"0" + dCRLF)
+            
+            data = b''.join(parts)
+            
+            if not data:
+                self.finish()
+                return
+            
+            if stats is not None: stats.sent += len(data)
+            self.sent += size
+            self.client.write(data, self.finish)
         
-        def write_body_chunked(self, original, body):
+        def resumed_body(self, original, future):
+            if self.client.closed():
+                # The body is closed along with the connection; see closed().
+                return
+            
             try:
-                chunk = next(body)
+                chunk = future.result()
                 assert isinstance(chunk, binary), "Body iterators must yield bytestrings."
-                chunk = bytestring(hex(len(chunk))[2:]) + CRLF + chunk + CRLF
-                self.client.write(chunk, partial(self.write_body_chunked, original, body))
-            
-            except StopIteration:
-                try:
-                    original.close()
-                except AttributeError:
-                    pass
                 
-                self.client.write(b"0" + dCRLF, self.finish)
+                self.writer(None, chunk)
+                return
             
-            except: # pragma: no cover TODO EDGE CASE
-                try:
-                    original.close()
-                except AttributeError:
-                    pass
-                raise
+            except:
+                # The response head has likely been sent; all that can be done is to abort.
+                log.exception("Unhandled exception in asynchronous response body.")
+                self.client.close()
+            
+            try:
+                original.close()
+            except AttributeError:
+                pass
         
         def _finish(self):
-            # TODO: Pre-calculate this and pass self.client.close as the body writer callback only if we need to disconnect.
-            # TODO: Execute self.client.read_until in write_body if we aren't disconnecting.
-            # These are to support threading, where the body writer callback is executed in the main thread.
-            env = self.environ
-            disconnect = True
+            env, response = self.queue.pop(0)
+            disconnect = not self.persistent(env)
+            self.protocol.completed += 1
             
-            if self.pipeline:
-                if env['SERVER_PROTOCOL'] == 'HTTP/1.1':
-                    disconnect = env.get('HTTP_CONNECTION', None) == "close"
-                
-                elif env['CONTENT_LENGTH'] is not None or env['REQUEST_METHOD'] in ('HEAD', 'GET'):
-                    disconnect = env.get('HTTP_CONNECTION', '').lower() != 'keep-alive'
+            if 'marrow.stats' in env:
+                self.protocol.stats.record(env['marrow.stats'], clock())
+            
+            if self.protocol.access is not None:
+                # The "head" of pre-serialized responses includes their body.
+                head = response[0]
+                received = env.get('marrow.received')
+                self.protocol.access.record(env, head[9:12], self.sent + len(head) - head.find(dCRLF) - 4,
+                        None if received is None else clock() - received)
+            
+            input_ = env.get('wsgi.input') # The application may have removed or replaced it.
+            
+            if isinstance(input_, StreamingInput) and not input_.finished:
+                # The application responded without consuming the whole request body.
+                disconnect = True
             
             self.finished = False
+            self.writer = None
             
             # log.debug("Disconnect client? %r", disconnect)
             
             if disconnect:
+                self.expect()
                 self.client.close()
                 return
             
-            self.client.read_until(dCRLF, self.headers)
+            if self.waiting is not None and len(self.queue) <= self.waiting[0]:
+                callback, self.waiting = self.waiting[1], None
+                callback()
+            
+            self.flush()
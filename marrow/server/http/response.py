@@ -0,0 +1,94 @@
+# encoding: utf-8
+
+"""Serialization of HTTP response heads.
+
+The portions of a response head which rarely change are kept pre-encoded: the status line for each protocol and status
+combination seen, the Server header, and the Date header, which is regenerated once per second by an IOLoop periodic
+callback rather than being formatted for every response.
+"""
+
+import time
+
+from email.utils import formatdate
+
+from marrow.io.ioloop import PeriodicCallback
+from marrow.util.compat import bytestring
+
+from marrow.server.http import release
+
+
+__all__ = ['ResponseHead', 'VERSION_STRING']
+log = __import__('logging').getLogger(__name__)
+
+
+CRLF = b"\r\n"
+VERSION_STRING = b'marrow.httpd/' + release.release.encode('iso-8859-1')
+CHUNKED = b"Transfer-Encoding: chunked\r\n"
+
+
+
+class ResponseHead(object):
+    """Build complete response heads as bytestrings.
+    
+    Instances are safe to share between the IOLoop thread and executor threads; cached values are replaced, never
+    mutated, and the status line cache only ever grows to `cache_size` entries.
+    """
+    
+    cache_size = 128
+    
+    def __init__(self, server=VERSION_STRING):
+        self.server = b"Server: " + server + CRLF
+        self.prefixes = dict()
+        self.timer = None
+        self.refresh()
+    
+    def start(self, io):
+        """Begin refreshing the Date header once per second using the given IOLoop."""
+        
+        self.refresh()
+        self.timer = PeriodicCallback(self.refresh, 1000, io)
+        self.timer.start()
+    
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
+    
+    def refresh(self):
+        self.date = b"Date: " + bytestring(formatdate(time.time(), False, True)) + CRLF
+    
+    def prefix(self, protocol, status):
+        """Return the encoded status line for a native protocol string and bytestring status."""
+        
+        key = (protocol, status)
+        prefix = self.prefixes.get(key)
+        
+        if prefix is None:
+            prefix = protocol.encode('iso-8859-1') + b" " + status + CRLF
+            
+            if len(self.prefixes) < self.cache_size:
+                self.prefixes[key] = prefix
+        
+        return prefix
+    
+    def __call__(self, protocol, status, headers, server=True, date=True, chunked=False):
+        """Serialize a complete response head, including the terminating blank line.
+        
+        The Server and Date headers are appended if `server` or `date` are true, respectively; `chunked` appends a
+        Transfer-Encoding header.
+        """
+        
+        if self.timer is None:
+            # Not attached to an IOLoop; keep the Date header accurate regardless.
+            self.refresh()
+        
+        parts = [i + b': ' + j + CRLF for i, j in headers]
+        parts.insert(0, self.prefix(protocol, status))
+        
+        if server: parts.append(self.server)
+        if date: parts.append(self.date)
+        if chunked: parts.append(CHUNKED)
+        
+        parts.append(CRLF)
+        
+        return b''.join(parts)
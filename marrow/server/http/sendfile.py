@@ -0,0 +1,190 @@
+# encoding: utf-8
+
+"""Zero-copy delivery of file-backed response bodies.
+
+Applications may return the result of `environ['wsgi.file_wrapper'](file)`, or a plain file object, as the response
+body.  Where the platform provides `os.sendfile` and the file is a regular file the body is transmitted by the kernel
+directly from the page cache to the socket; otherwise the body is iterated and written as usual.  Streams able to
+transmit files themselves (such as the asyncio backend's, using `loop.sendfile`) are handed the whole file instead.
+"""
+
+import os
+import stat
+import errno
+
+
+__all__ = ['FileWrapper', 'SendFile', 'descriptor']
+log = __import__('logging').getLogger(__name__)
+
+
+sendfile = getattr(os, 'sendfile', None)
+
+
+
+class FileWrapper(object):
+    """The `wsgi.file_wrapper` callable; an iterable over a file-like object, read in `blksize` blocks."""
+    
+    def __init__(self, filelike, blksize=8192):
+        self.filelike = filelike
+        self.blksize = blksize
+        
+        if hasattr(filelike, 'close'):
+            self.close = filelike.close
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        data = self.filelike.read(self.blksize)
+        
+        if data:
+            return data
+        
+        raise StopIteration
+    
+    next = __next__
+
+
+def descriptor(body):
+    """Determine the file descriptor, offset, and size of a response body able to be sent using sendfile.
+    
+    Returns None if the body is not a regular file, or if sendfile is unavailable.
+    """
+    
+    if sendfile is None:
+        return None
+    
+    filelike = body.filelike if isinstance(body, FileWrapper) else body
+    
+    try:
+        fd = filelike.fileno()
+        info = os.fstat(fd)
+        offset = filelike.tell()
+    
+    except (AttributeError, ValueError, EnvironmentError):
+        # Not a file, or a file-like object (such as BytesIO) without a usable descriptor.
+        return None
+    
+    if not stat.S_ISREG(info.st_mode):
+        return None
+    
+    return fd, offset, max(info.st_size - offset, 0)
+
+
+class SendFile(object):
+    """A body writer transmitting a file with sendfile.
+    
+    Sends at most `blksize` bytes per IOLoop iteration so large files do not monopolize the loop, waiting for the
+    socket to become writable again whenever the kernel's send buffer fills.  If sendfile is refused by the kernel
+    before any data has been sent, delivery falls back to the `fallback` writer.
+    """
+    
+    def __init__(self, connection, original, fd, offset, remaining, fallback, blksize=1048576):
+        self.connection = connection
+        self.client = connection.client
+        self.original = original
+        self.fd = fd
+        self.offset = offset
+        self.remaining = remaining
+        self.fallback = fallback
+        self.blksize = blksize
+        self.started = False
+    
+    def __call__(self, head=None):
+        if head:
+            # The head must leave the stream's buffer before the kernel can append to the socket.
+            self.count(len(head), True)
+            self.client.write(head, self)
+            return
+        
+        if self.client.closed():
+            self.close()
+            return
+        
+        if self.remaining <= 0:
+            self.close()
+            self.connection.finish()
+            return
+        
+        transmit = getattr(self.client, 'sendfile', None)
+        
+        if transmit is not None:
+            transmit(self.fd, self.offset, self.remaining, self.transmitted)
+            return
+        
+        try:
+            sent = sendfile(self.client.socket.fileno(), self.fd, self.offset, min(self.remaining, self.blksize))
+        
+        except EnvironmentError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                sent = 0
+            
+            elif not self.started and e.errno in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+                log.debug("Kernel refused sendfile, falling back to iteration: %s", e)
+                self.connection.writer = self.fallback
+                self.fallback()
+                return
+            
+            elif e.errno in (errno.EPIPE, errno.ECONNRESET, errno.ENOTCONN):
+                log.debug("Client disconnected during file transmission.")
+                self.close()
+                self.client.close()
+                return
+            
+            else:
+                self.close()
+                raise
+        
+        else:
+            if not sent:
+                # The file was truncated after the response head was composed; the promised length can't be met.
+                log.warning("File truncated during delivery; %d bytes unsent.", self.remaining)
+                self.close()
+                self.client.close()
+                return
+        
+        self.started = True
+        self.count(sent)
+        self.offset += sent
+        self.remaining -= sent
+        
+        if self.remaining > 0:
+            # Writing nothing requests a callback once the socket is next writable.
+            self.client.write(b'', self)
+            return
+        
+        self.close()
+        self.connection.finish()
+    
+    def transmitted(self, sent):
+        """Called back by streams transmitting the file themselves, once complete."""
+        
+        self.count(sent)
+        self.offset += sent
+        self.remaining -= sent
+        self.close()
+        
+        if self.client.closed():
+            return
+        
+        if self.remaining > 0:
+            log.warning("File truncated during delivery; %d bytes unsent.", self.remaining)
+            self.client.close()
+            return
+        
+        self.connection.finish()
+    
+    def count(self, sent, head=False):
+        if not head:
+            self.connection.sent += sent
+        
+        stats = self.connection.protocol.stats
+        
+        if stats is not None:
+            stats.sent += sent
+    
+    def close(self):
+        try:
+            self.original.close()
+        except AttributeError:
+            pass
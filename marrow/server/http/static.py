@@ -0,0 +1,404 @@
+# encoding: utf-8
+
+"""A WSGI 2 application serving static files.
+
+Files are located beneath a root directory, rejecting any path which would escape it.  Open descriptors and stat
+results are kept in an LRU cache, revalidated against the file's modification time, size, and inode at most once every
+`valid` seconds.  Files of at most `small` bytes are held in memory and served from there; larger files are served
+from the cached descriptor, allowing the protocol to transmit them using sendfile.
+
+Conditional requests (If-None-Match, If-Modified-Since) are answered with 304 Not Modified and single byte ranges
+(Range, with If-Range) with 206 Partial Content, without reading the file.
+
+Mount alongside another application by passing it as `application`; requests outside of `prefix`, or for files which
+don't exist, are passed to it.
+"""
+
+import os
+import stat
+import time
+import threading
+import mimetypes
+
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_tz, mktime_tz
+
+from marrow.util.compat import unicode
+
+
+__all__ = ['Static', 'FileCache']
+log = __import__('logging').getLogger(__name__)
+
+
+pread = getattr(os, 'pread', None)
+
+NOT_FOUND = (b"404 Not Found", [(b'Content-Type', b'text/plain'), (b'Content-Length', b'9')], [b"Not Found"])
+
+
+
+class Entry(object):
+    __slots__ = ('path', 'fd', 'size', 'mtime', 'inode', 'content', 'etag', 'modified', 'type', 'checked', 'users',
+            'retired')
+    
+    def __init__(self, path, info, fd, content, checked):
+        self.path = path
+        self.fd = fd
+        self.size = info.st_size
+        self.mtime = info.st_mtime
+        self.inode = info.st_ino
+        self.content = content
+        self.etag = ('"%x-%x"' % (int(info.st_mtime * 1000000), info.st_size)).encode('ascii')
+        self.modified = formatdate(info.st_mtime, False, True).encode('ascii')
+        self.checked = checked
+        self.users = 0
+        self.retired = False
+        
+        kind, encoding = mimetypes.guess_type(path)
+        self.type = (kind if kind and not encoding else 'application/octet-stream').encode('ascii')
+    
+    def current(self, info):
+        return info.st_mtime == self.mtime and info.st_size == self.size and info.st_ino == self.inode
+
+
+class Segment(object):
+    """A response body transmitting a portion of a cached file, holding its descriptor open until closed."""
+    
+    blksize = 65536
+    
+    def __init__(self, cache, entry, offset, length):
+        self.cache = cache
+        self.entry = entry
+        self.offset = offset
+        self.length = length
+    
+    # Used by the protocol to transmit the file using sendfile; the descriptor's own position is never moved.
+    
+    def fileno(self):
+        return self.entry.fd
+    
+    def tell(self):
+        return self.offset
+    
+    def __iter__(self):
+        offset, remaining = self.offset, self.length
+        
+        if pread is None: # pragma: no cover
+            with open(self.entry.path, 'rb') as fh:
+                fh.seek(offset)
+                
+                while remaining > 0:
+                    data = fh.read(min(self.blksize, remaining))
+                    if not data: break
+                    remaining -= len(data)
+                    yield data
+            
+            return
+        
+        while remaining > 0:
+            data = pread(self.entry.fd, min(self.blksize, remaining), offset)
+            if not data: break
+            offset += len(data)
+            remaining -= len(data)
+            yield data
+    
+    def close(self):
+        entry, self.entry = self.entry, None
+        
+        if entry is not None:
+            self.cache.release(entry)
+
+
+class FileCache(object):
+    """An LRU cache of at most `size` open files and their metadata, safe to use from any thread.
+    
+    Entries are revalidated using stat at most once every `valid` seconds.  Files no larger than `small` bytes are
+    read into memory and their descriptors closed immediately.
+    """
+    
+    def __init__(self, size=1024, valid=1, small=65536):
+        self.size = size
+        self.valid = valid
+        self.small = small
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def acquire(self, path):
+        """Return the cache entry for the regular file at the given path, or None if there is no such file.
+        
+        Unless its content is held in memory, the entry's descriptor remains open until `release` is called.
+        """
+        
+        now = time.time()
+        
+        with self.lock:
+            entry = self.entries.pop(path, None)
+            
+            if entry is not None and now - entry.checked >= self.valid:
+                try:
+                    info = os.stat(path)
+                
+                except EnvironmentError:
+                    info = None
+                
+                if info is not None and entry.current(info):
+                    entry.checked = now
+                
+                else:
+                    self.retire(entry)
+                    entry = None
+            
+            if entry is None:
+                entry = self.open(path, now)
+                
+                if entry is None:
+                    return None
+            
+            self.entries[path] = entry
+            entry.users += 1
+            
+            while len(self.entries) > self.size:
+                self.retire(self.entries.popitem(False)[1])
+            
+            return entry
+    
+    def open(self, path, now):
+        try:
+            fd = os.open(path, os.O_RDONLY | getattr(os, 'O_CLOEXEC', 0))
+        
+        except EnvironmentError:
+            return None
+        
+        try:
+            info = os.fstat(fd)
+            
+            if not stat.S_ISREG(info.st_mode):
+                os.close(fd)
+                return None
+            
+            if info.st_size > self.small:
+                return Entry(path, info, fd, None, now)
+            
+            content = []
+            remaining = info.st_size
+            
+            while remaining > 0:
+                data = os.read(fd, remaining)
+                if not data: break
+                content.append(data)
+                remaining -= len(data)
+        
+        except EnvironmentError:
+            os.close(fd)
+            return None
+        
+        os.close(fd)
+        return Entry(path, info, None, b''.join(content), now)
+    
+    def release(self, entry):
+        with self.lock:
+            entry.users -= 1
+            
+            if entry.retired and not entry.users:
+                self.close(entry)
+    
+    def retire(self, entry):
+        # Called with the lock held; the descriptor may still be in use by responses being delivered.
+        entry.retired = True
+        
+        if not entry.users:
+            self.close(entry)
+    
+    def close(self, entry):
+        if entry.fd is not None:
+            os.close(entry.fd)
+            entry.fd = None
+    
+    def clear(self):
+        with self.lock:
+            while self.entries:
+                self.retire(self.entries.popitem()[1])
+
+
+class Static(object):
+    """Serve files beneath the `root` directory for requests whose path begins with `prefix`.
+    
+    Directory requests are served the `index` file within, if present.  Responses include a Cache-Control max-age
+    header if `max_age` (in seconds) is given.  Requests not under `prefix`, or for missing files, are passed to
+    `application` if given; otherwise they are answered with 404 Not Found.
+    """
+    
+    def __init__(self, root, prefix='/', application=None, index='index.html', max_age=None, cache=None):
+        self.root = os.path.realpath(root)
+        self.prefix = prefix.rstrip('/') + '/'
+        self.application = application
+        self.index = index
+        self.cache = cache if cache is not None else FileCache()
+        self.cache_control = None if max_age is None else ('max-age=' + unicode(max_age)).encode('ascii')
+    
+    def resolve(self, path):
+        """Return the filesystem path for the given request path, or None if it lies outside the root."""
+        
+        parts = []
+        
+        for part in path[len(self.prefix):].split('/'):
+            if part in ('', '.'):
+                continue
+            
+            if part == '..' or '\\' in part or '\0' in part or os.sep in part:
+                return None
+            
+            parts.append(part)
+        
+        filename = os.path.join(self.root, *parts)
+        
+        # Symbolic links must not lead outside the root, either.
+        resolved = os.path.realpath(filename)
+        
+        if resolved != self.root and not resolved.startswith(os.path.join(self.root, '')):
+            return None
+        
+        return filename
+    
+    def __call__(self, environ):
+        path = environ['PATH_INFO']
+        
+        if not (path + '/').startswith(self.prefix):
+            return self.fallback(environ)
+        
+        filename = self.resolve(path)
+        entry = None if filename is None else self.cache.acquire(filename)
+        
+        if entry is None and filename is not None and self.index and os.path.isdir(filename):
+            entry = self.cache.acquire(os.path.join(filename, self.index))
+        
+        if entry is None:
+            return self.fallback(environ)
+        
+        if environ['REQUEST_METHOD'] != 'GET':
+            self.cache.release(entry)
+            return b"405 Method Not Allowed", [(b'Allow', b'GET, HEAD'), (b'Content-Length', b'0')], []
+        
+        headers = [(b'ETag', entry.etag), (b'Last-Modified', entry.modified)]
+        
+        if self.cache_control is not None:
+            headers.append((b'Cache-Control', self.cache_control))
+        
+        if not self.modified(environ, entry):
+            self.cache.release(entry)
+            return b"304 Not Modified", headers, []
+        
+        status = b"200 OK"
+        start, length = 0, entry.size
+        requested = environ.get('HTTP_RANGE')
+        
+        if requested and self.matches(environ.get('HTTP_IF_RANGE'), entry):
+            span = self.range(requested, entry.size)
+            
+            if span is False:
+                self.cache.release(entry)
+                headers.append((b'Content-Range', ('bytes */' + unicode(entry.size)).encode('ascii')))
+                headers.append((b'Content-Length', b'0'))
+                return b"416 Range Not Satisfiable", headers, []
+            
+            if span is not None:
+                status = b"206 Partial Content"
+                start, length = span
+                headers.append((b'Content-Range', ('bytes %d-%d/%d' % (start, start + length - 1, entry.size)).encode('ascii')))
+        
+        headers.append((b'Content-Type', entry.type))
+        headers.append((b'Accept-Ranges', b'bytes'))
+        headers.append((b'Content-Length', unicode(length).encode('ascii')))
+        
+        if entry.content is not None:
+            self.cache.release(entry)
+            return status, headers, [entry.content[start:start + length] if length != entry.size else entry.content]
+        
+        return status, headers, Segment(self.cache, entry, start, length)
+    
+    def fallback(self, environ):
+        if self.application is not None:
+            return self.application(environ)
+        
+        return NOT_FOUND[0], list(NOT_FOUND[1]), list(NOT_FOUND[2])
+    
+    def modified(self, environ, entry):
+        """Determine if the entry has been modified according to the request's conditional headers."""
+        
+        tags = environ.get('HTTP_IF_NONE_MATCH')
+        
+        if tags is not None:
+            # Weak comparison; If-Modified-Since is ignored when If-None-Match is present.
+            etag = entry.etag.decode('ascii')
+            
+            for tag in tags.split(','):
+                tag = tag.strip()
+                
+                if tag.startswith('W/'):
+                    tag = tag[2:]
+                
+                if tag == '*' or tag == etag:
+                    return False
+            
+            return True
+        
+        since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        
+        if since is not None:
+            parsed = parsedate_tz(since)
+            
+            if parsed is not None and int(entry.mtime) <= mktime_tz(parsed):
+                return False
+        
+        return True
+    
+    def matches(self, condition, entry):
+        """Determine if an If-Range condition, if any, permits a partial response."""
+        
+        if condition is None:
+            return True
+        
+        if condition.startswith('"'):
+            return condition.encode('ascii', 'replace') == entry.etag
+        
+        return condition.encode('ascii', 'replace') == entry.modified
+    
+    def range(self, value, size):
+        """Parse a Range header into an (offset, length) tuple.
+        
+        Returns None if the whole file should be served instead (including for multiple ranges, which are not
+        supported), or False if the range is unsatisfiable.
+        """
+        
+        unit, _, spec = value.partition('=')
+        
+        if unit.strip().lower() != 'bytes' or ',' in spec:
+            return None
+        
+        first, _, last = spec.strip().partition('-')
+        
+        try:
+            if not first:
+                suffix = int(last)
+                
+                if suffix <= 0 or not size:
+                    return False
+                
+                return max(size - suffix, 0), min(suffix, size)
+            
+            first = int(first)
+            last = int(last) if last else size - 1
+        
+        except ValueError:
+            return None
+        
+        if first >= size:
+            return False
+        
+        if first > last:
+            return None
+        
+        last = min(last, size - 1)
+        return first, last - first + 1
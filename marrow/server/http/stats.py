@@ -0,0 +1,172 @@
+# encoding: utf-8
+
+"""Request timing and counters.
+
+When enabled, each request is timestamped as it passes through each phase of its handling:
+
+* `parse` -- parsing the request head;
+* `receive` -- receiving the request body, if any;
+* `queue` -- waiting for an executor thread, if threaded;
+* `application` -- running filters and the application, until the response is ready to deliver;
+* `write` -- waiting behind earlier pipelined responses, then delivering the response;
+* `total` -- from the arrival of the request head until the response has been delivered.
+
+Durations are aggregated into fixed, logarithmic histograms alongside counters of connections, requests, persistent
+connection reuse, bytes received and sent, errors, rejected requests, 100-continue responses, and requests shed by
+admission control.  All recording happens in the IOLoop thread; nothing is locked, and statistics are kept per worker
+process.
+
+Cumulative snapshots are periodically passed to each configured sink, a callable accepting a dictionary, and may also
+be requested over HTTP; see the `stats_path` protocol option.
+"""
+
+import os
+import json
+import time
+import logging
+
+from bisect import bisect_left
+
+from marrow.io.ioloop import PeriodicCallback
+
+
+__all__ = ['Statistics', 'Histogram', 'LoggingSink', 'clock']
+log = __import__('logging').getLogger(__name__)
+
+
+clock = getattr(time, 'monotonic', time.time)
+
+PHASES = ('parse', 'receive', 'queue', 'application', 'write', 'total')
+COUNTERS = ('connections', 'requests', 'reused', 'received', 'sent', 'errors', 'rejected', 'continues', 'shed')
+
+# Bucket upper bounds, in seconds: powers of two from one microsecond to a little over a minute.
+BOUNDS = tuple(2 ** i / 1000000.0 for i in range(27))
+
+
+
+class Histogram(object):
+    __slots__ = ('counts', 'count', 'total')
+    
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+    
+    def record(self, duration):
+        self.counts[bisect_left(BOUNDS, duration)] += 1
+        self.count += 1
+        self.total += duration
+    
+    def percentile(self, fraction):
+        """The upper bound, in seconds, of the bucket containing the given fraction of recorded durations."""
+        
+        if not self.count:
+            return None
+        
+        target = self.count * fraction
+        seen = 0
+        
+        for bound, count in zip(BOUNDS, self.counts):
+            seen += count
+            
+            if seen >= target:
+                return bound
+        
+        return float('inf')
+    
+    def snapshot(self):
+        """Summarize the histogram, in milliseconds."""
+        
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+        
+        return dict(
+                count = self.count,
+                mean = ms(self.total / self.count) if self.count else None,
+                p50 = ms(self.percentile(0.5)),
+                p99 = ms(self.percentile(0.99)),
+                p999 = ms(self.percentile(0.999)),
+                buckets = [[ms(bound), count] for bound, count in zip(BOUNDS + (None, ), self.counts) if count]
+            )
+
+
+class Statistics(object):
+    """Counters and phase histograms for a single worker process.
+    
+    Snapshots are passed to each of `sinks` every `interval` seconds once started.
+    """
+    
+    def __init__(self, sinks=None, interval=60):
+        self.sinks = list(sinks) if sinks else []
+        self.interval = interval
+        self.started = time.time()
+        self.timer = None
+        
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        
+        self.histograms = dict((name, Histogram()) for name in PHASES)
+    
+    def start(self, io):
+        if self.sinks and self.interval:
+            self.timer = PeriodicCallback(self.flush, self.interval * 1000, io)
+            self.timer.start()
+    
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
+            self.flush()
+    
+    def record(self, timing, finished):
+        """Record the phases of a completed request from its list of timestamps.
+        
+        The timestamps are: head received, head parsed, dispatched, composition began, response ready, and delivery
+        began.  Any may be None if the request skipped that phase.
+        """
+        
+        received, parsed, dispatched, began, ready, delivering = timing
+        histograms = self.histograms
+        
+        histograms['parse'].record(parsed - received)
+        histograms['total'].record(finished - received)
+        
+        if dispatched is not None:
+            histograms['receive'].record(dispatched - parsed)
+            
+            if began is not None:
+                histograms['queue'].record(began - dispatched)
+                
+                if ready is not None:
+                    histograms['application'].record(ready - began)
+        
+        if delivering is not None:
+            histograms['write'].record(finished - delivering)
+    
+    def snapshot(self):
+        result = dict((name, getattr(self, name)) for name in COUNTERS)
+        result['pid'] = os.getpid()
+        result['uptime'] = round(time.time() - self.started, 3)
+        result['phases'] = dict((name, histogram.snapshot()) for name, histogram in self.histograms.items())
+        return result
+    
+    def flush(self):
+        snapshot = self.snapshot()
+        
+        for sink in self.sinks:
+            try:
+                sink(snapshot)
+            
+            except:
+                log.exception("Unhandled exception in statistics sink.")
+
+
+class LoggingSink(object):
+    """A statistics sink writing each snapshot, as JSON, to a logger."""
+    
+    def __init__(self, logger=__name__, level=logging.INFO):
+        self.logger = logging.getLogger(logger)
+        self.level = level
+    
+    def __call__(self, snapshot):
+        self.logger.log(self.level, json.dumps(snapshot, sort_keys=True))
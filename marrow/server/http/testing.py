@@ -11,14 +11,16 @@ import os
 import sys
 import time
 import socket
+import threading
 
 from marrow.util.compat import unicode
+from marrow.io.iostream import IOStream
 from marrow.server.testing import ServerTestCase
 from marrow.server.http.protocol import HTTPProtocol
 
 
 log = __import__('logging').getLogger(__name__)
-__all__ = ['CRLF', 'EOH', 'Response', 'HTTPTestCase', 'Hello', 'hello']
+__all__ = ['CRLF', 'EOH', 'Response', 'HTTPTestCase', 'AsyncioHTTPTestCase', 'Hello', 'hello']
 
 
 CRLF = b"\r\n"
@@ -90,7 +92,11 @@ class HTTPTestCase(ServerTestCase):
         
         response = Response(headers, b"")
         
-        if response.get(b"transfer-encoding", None) == b"chunked":
+        if method == b"HEAD":
+            # Framed as the equivalent GET would be, but without a body to read.
+            pass
+        
+        elif response.get(b"transfer-encoding", None) == b"chunked":
             while True:
                 self.client.read_until(CRLF, self.stop)
                 length = self.wait()[:-2]
@@ -118,6 +124,39 @@ class HTTPTestCase(ServerTestCase):
         return response
 
 
+class AsyncioHTTPTestCase(HTTPTestCase):
+    """Run the tests of an HTTPTestCase against the asyncio backend.
+    
+    Mix in ahead of an existing test case.  The asyncio server runs its own event loop in a background thread; the
+    test client remains a marrow.io IOStream, reconnected to the asyncio server.
+    """
+    
+    def setUp(self):
+        super(AsyncioHTTPTestCase, self).setUp()
+        
+        from marrow.server.http.aio import HTTPServer
+        
+        self.backend = HTTPServer('127.0.0.1', 0, **self.arguments)
+        self.backend.start(testing=True)
+        
+        self.backend_thread = threading.Thread(target=self.backend.loop.run_forever)
+        self.backend_thread.daemon = True
+        self.backend_thread.start()
+        
+        self.client.close()
+        self.client = IOStream(socket.create_connection(self.backend.address), io_loop=self.io_loop)
+    
+    def tearDown(self):
+        self.client.close()
+        
+        self.backend.loop.call_soon_threadsafe(self.backend.loop.stop)
+        self.backend_thread.join()
+        self.backend.stop()
+        self.backend.loop.close()
+        
+        super(AsyncioHTTPTestCase, self).tearDown()
+
+
 class Hello(object):
     def __init__(self, name="world"):
         self.name = unicode(name).encode('utf8')
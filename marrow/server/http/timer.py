@@ -0,0 +1,81 @@
+# encoding: utf-8
+
+"""A hashed timer wheel for coarse, frequently rescheduled connection deadlines.
+
+Connection deadlines are armed and cancelled far more often than they expire, and need only be accurate to within a
+second or so.  Rather than registering an IOLoop timeout (a heap operation) for each, deadlines are hashed by expiry
+tick into one of `size` buckets; arming and cancelling are a set insertion and removal, and a single IOLoop periodic
+callback advances the wheel once per `resolution` seconds, expiring the contents of one bucket.
+"""
+
+import math
+
+from marrow.io.ioloop import PeriodicCallback
+
+
+__all__ = ['TimerWheel', 'Timeout']
+log = __import__('logging').getLogger(__name__)
+
+
+
+class Timeout(object):
+    __slots__ = ('tick', 'callback')
+    
+    def __init__(self, tick, callback):
+        self.tick = tick
+        self.callback = callback
+
+
+class TimerWheel(object):
+    """Schedule callbacks to run after a delay, to within one `resolution` (in seconds).
+    
+    Not thread safe; all methods must be called from the IOLoop thread.
+    """
+    
+    def __init__(self, resolution=1.0, size=512):
+        self.resolution = resolution
+        self.slots = [set() for i in range(size)]
+        self.tick = 0
+        self.timer = None
+    
+    def __len__(self):
+        return sum(len(i) for i in self.slots)
+    
+    def start(self, io):
+        self.timer = PeriodicCallback(self.advance, self.resolution * 1000, io)
+        self.timer.start()
+    
+    def stop(self):
+        if self.timer is not None:
+            self.timer.stop()
+            self.timer = None
+    
+    def schedule(self, delay, callback):
+        """Run the callback no sooner than `delay` seconds from now, returning a Timeout able to be cancelled."""
+        
+        # The current tick is already partially elapsed; count from the next.
+        timeout = Timeout(self.tick + int(math.ceil(delay / self.resolution)) + 1, callback)
+        self.slots[timeout.tick % len(self.slots)].add(timeout)
+        return timeout
+    
+    def cancel(self, timeout):
+        self.slots[timeout.tick % len(self.slots)].discard(timeout)
+    
+    def advance(self):
+        """Move the wheel forward one tick, running any callbacks which have expired."""
+        
+        self.tick = tick = self.tick + 1
+        slot = self.slots[tick % len(self.slots)]
+        
+        # Deadlines further away than one revolution share the bucket; only those due now are expired.
+        expired = [i for i in slot if i.tick <= tick]
+        
+        for timeout in expired:
+            slot.discard(timeout)
+        
+        for timeout in expired:
+            try:
+                timeout.callback()
+            
+            except:
+                log.exception("Unhandled exception in timeout callback.")
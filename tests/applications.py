@@ -3,15 +3,23 @@
 """This file contains appliation test rigs for use in unit tests."""
 
 
+import os
+import threading
+
 from pprint import pformat
+from concurrent.futures import Future
 from marrow.util.compat import unicode
 
 
+source = os.path.splitext(__file__)[0] + '.py'
+
+
 def prune(request, input=False):
     """A helper function to clean the request of un-testable variables."""
     del request['SERVER_NAME']
     del request['SERVER_PORT']
     del request['wsgi.errors']
+    del request['wsgi.file_wrapper']
     
     if not input:
         del request['wsgi.input']
@@ -34,6 +42,52 @@ def generator(request):
     return b"200 OK", [(b'Content-Length', b'10')], inner()
 
 
+def wrapped(request):
+    return b"200 OK", [(b'Content-Type', b'text/plain')], request['wsgi.file_wrapper'](open(source, 'rb'))
+
+
+def later(value, delay=0.01):
+    """Return a future resolved with the given value, from another thread, after a short delay."""
+    
+    future = Future()
+    threading.Timer(delay, future.set_result, (value, )).start()
+    return future
+
+
+def deferred(request):
+    greeting = yield later(b"Hello")
+    yield b"200 OK", [(b'Content-Type', b'text/plain')], [greeting, later(b" world"), b"!"]
+
+
+class Stalled(list):
+    """A response body whose delivery stalls after its first chunk, recording when it is closed."""
+    
+    closed = False
+    
+    def __init__(self):
+        super(Stalled, self).__init__([b"partial", Future()])
+    
+    def close(self):
+        self.closed = True
+
+
+consumed = dict(finished=threading.Event())
+
+
+def consume(request):
+    """Read the request body in full, recording any error raised in doing so."""
+    
+    try:
+        request['wsgi.input'].read()
+        consumed['error'] = None
+    
+    except IOError as e:
+        consumed['error'] = e
+    
+    consumed['finished'].set()
+    return b"200 OK", [(b'Content-Length', b'0')], []
+
+
 def die(request):
     1/0
 
@@ -0,0 +1,104 @@
+# encoding: utf-8
+
+import os
+import json
+import tempfile
+
+from io import StringIO
+from unittest import TestCase
+
+from marrow.server.http.access import AccessLog, common, combined, jsonl
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+ENV = {'REMOTE_ADDR': '10.0.0.1', 'REQUEST_METHOD': 'GET', 'PATH_INFO': '/path', 'QUERY_STRING': 'a=1',
+        'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_USER_AGENT': 'agent/1.0'}
+
+RECORD = (0.5, '10.0.0.1', 'GET', '/path', 'a=1', 'HTTP/1.1', b'200', 15, 0.0025, None, 'agent/1.0')
+
+
+
+class TestFormats(TestCase):
+    def test_common(self):
+        self.assertEquals(common(RECORD), '10.0.0.1 - - [01/Jan/1970:00:00:00 +0000] "GET /path?a=1 HTTP/1.1" 200 15')
+    
+    def test_combined(self):
+        self.assertEquals(combined(RECORD), common(RECORD) + ' "-" "agent/1.0"')
+    
+    def test_empty(self):
+        record = (0, ('::1', 1234), None, None, None, None, b'400', 0, None, None, None)
+        self.assertEquals(common(record), '::1 - - [01/Jan/1970:00:00:00 +0000] "- / -" 400 -')
+    
+    def test_escaped(self):
+        record = RECORD[:3] + ('/x\n10.0.0.2 - -', 'q="\\"') + RECORD[5:9] + (None, 'agent "1.0"\x7f')
+        line = combined(record)
+        
+        self.assertEquals(line.count('\n'), 0)
+        self.assertTrue('"GET /x\\x0a10.0.0.2 - -?q=\\"\\\\\\" HTTP/1.1"' in line)
+        self.assertTrue(line.endswith(' "agent \\"1.0\\"\\x7f"'))
+    
+    def test_json(self):
+        entry = json.loads(jsonl(RECORD))
+        
+        self.assertEquals(entry['status'], 200)
+        self.assertEquals(entry['duration'], 2.5)
+        self.assertEquals(entry['referer'], None)
+        self.assertEquals(entry['path'], '/path')
+
+
+class TestAccessLog(TestCase):
+    def test_buffered(self):
+        target = StringIO()
+        access = AccessLog(target, 'common', interval=60)
+        access.start()
+        
+        access.record(ENV, b'200', 15, 0.001)
+        access.record(dict(ENV, **{'marrow.head': True}), b'200', 0, 0.001)
+        self.assertEquals(target.getvalue(), '')
+        
+        access.stop()
+        lines = target.getvalue().splitlines()
+        
+        self.assertEquals(len(lines), 2)
+        self.assertTrue(lines[0].endswith('"GET /path?a=1 HTTP/1.1" 200 15'))
+        self.assertTrue(lines[1].endswith('"HEAD /path?a=1 HTTP/1.1" 200 -'))
+    
+    def test_overflow(self):
+        target = StringIO()
+        access = AccessLog(target, size=4)
+        
+        for i in range(6):
+            access.record(ENV, b'200', 15, 0.001)
+        
+        self.assertEquals(access.dropped, 2)
+        self.assertEquals(access.flush(), 4)
+        
+        access.record(ENV, b'200', 15, 0.001)
+        self.assertEquals(access.flush(), 1)
+        self.assertEquals(len(target.getvalue().splitlines()), 5)
+    
+    def test_sampling(self):
+        access = AccessLog(StringIO(), sample=0)
+        
+        access.record(ENV, b'200', 15, 0.001)
+        access.record(ENV, b'503', 15, 0.001)
+        
+        self.assertEquals(access.flush(), 1)
+    
+    def test_path(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        
+        try:
+            access = AccessLog(path, 'json')
+            access.start()
+            access.record(ENV, b'200', 15, 0.001)
+            access.stop()
+            
+            with open(path) as fh:
+                self.assertEquals(json.loads(fh.read())['agent'], 'agent/1.0')
+        
+        finally:
+            os.unlink(path)
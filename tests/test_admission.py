@@ -0,0 +1,82 @@
+# encoding: utf-8
+
+from unittest import TestCase
+from concurrent.futures import ThreadPoolExecutor
+
+from marrow.server.http.admission import Admission
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class TestAdmission(TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(4)
+    
+    def tearDown(self):
+        self.executor.shutdown()
+    
+    def test_defaults(self):
+        admission = Admission()
+        admission.start(self.executor)
+        
+        self.assertEquals(admission.minimum, 4)
+        self.assertEquals(admission.limit, 8)
+    
+    def test_refusal(self):
+        admission = Admission(initial=2)
+        admission.start(self.executor)
+        
+        self.assertEquals(admission.limit, 4)
+        self.assertTrue(all(admission.admit() for i in range(4)))
+        self.assertFalse(admission.admit())
+        self.assertEquals(admission.snapshot()['refused'], 1)
+        
+        admission.release(0.01)
+        self.assertTrue(admission.admit())
+    
+    def test_queue(self):
+        admission = Admission(queue=1)
+        admission.start(self.executor)
+        
+        self.assertTrue(all(admission.admit() for i in range(5)))
+        self.assertEquals(admission.queued, 1)
+        self.assertFalse(admission.admit())
+    
+    def test_growth(self):
+        admission = Admission(maximum=50)
+        admission.start(self.executor)
+        
+        for i in range(200):
+            while admission.inflight < int(admission.limit):
+                admission.admit()
+            
+            admission.release(0.01)
+        
+        self.assertEquals(admission.limit, 50)
+    
+    def test_idle(self):
+        admission = Admission()
+        admission.start(self.executor)
+        
+        for i in range(200):
+            admission.admit()
+            admission.release(0.01)
+        
+        self.assertEquals(admission.limit, 8)
+    
+    def test_shrinks(self):
+        admission = Admission(maximum=100)
+        admission.start(self.executor)
+        admission.limit = 100
+        
+        for i in range(1000):
+            admission.admit()
+            admission.release(0.01)
+        
+        for i in range(50):
+            admission.admit()
+            admission.release(0.1)
+        
+        self.assertEquals(admission.limit, 4)
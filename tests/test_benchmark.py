@@ -0,0 +1,53 @@
+# encoding: utf-8
+
+from unittest import TestCase
+
+from marrow.server.http.benchmark.client import Connection
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class TestResponseParsing(TestCase):
+    def connection(self, request=b"GET / HTTP/1.1\r\n\r\n", pending=1):
+        connection = Connection(None, request)
+        connection.pending.extend([0] * pending)
+        return connection
+    
+    def complete(self, connection, data):
+        connection.buffer += data
+        results = []
+        
+        while connection.pending and connection.parse():
+            results.append(connection.complete()[1])
+        
+        return results
+    
+    def test_length(self):
+        connection = self.connection(pending=2)
+        response = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+        
+        self.assertEquals(self.complete(connection, response + response[:20]), [200])
+        self.assertEquals(self.complete(connection, response[20:]), [200])
+        self.assertTrue(connection.persistent)
+    
+    def test_chunked(self):
+        connection = self.connection()
+        
+        self.assertEquals(self.complete(connection, b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhel"), [])
+        self.assertEquals(self.complete(connection, b"lo\r\n0\r\n\r\n"), [200])
+        self.assertEquals(len(connection.buffer), 0)
+    
+    def test_persistence(self):
+        connection = self.connection(b"GET / HTTP/1.0\r\n\r\n")
+        self.complete(connection, b"HTTP/1.0 200 OK\r\nContent-Length: 0\r\n\r\n")
+        self.assertFalse(connection.persistent)
+        
+        connection = self.connection(b"GET / HTTP/1.0\r\nConnection: keep-alive\r\n\r\n")
+        self.complete(connection, b"HTTP/1.0 200 OK\r\nContent-Length: 0\r\n\r\n")
+        self.assertTrue(connection.persistent)
+        
+        connection = self.connection(b"GET / HTTP/1.1\r\nConnection: close\r\n\r\n")
+        self.complete(connection, b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+        self.assertFalse(connection.persistent)
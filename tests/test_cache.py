@@ -0,0 +1,122 @@
+# encoding: utf-8
+
+from unittest import TestCase
+
+from marrow.server.http.cache import ResponseCache
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class Client(object):
+    def closed(self):
+        return False
+
+
+class Connection(object):
+    """A stand-in for HTTPProtocol.Connection recording how each request was answered."""
+    
+    client = Client()
+    
+    def __init__(self):
+        self.dispatched = []
+        self.flushed = 0
+    
+    def cached(self, data):
+        return data, None
+    
+    def flush(self):
+        self.flushed += 1
+    
+    def dispatch(self, slot):
+        self.dispatched.append(slot)
+
+
+def environ(path='/', **kw):
+    env = dict(REQUEST_METHOD='GET', SERVER_PROTOCOL='HTTP/1.1', PATH_INFO=path, QUERY_STRING='', HTTP_HOST='localhost')
+    env['wsgi.url_scheme'] = 'http'
+    env.update(kw)
+    return env
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.cache = ResponseCache(ttl=10)
+        self.connection = Connection()
+    
+    def test_lifetime(self):
+        lifetime = self.cache.lifetime
+        self.assertEquals(lifetime(b"200 OK", [], []), 10)
+        self.assertEquals(lifetime(b"500 Internal Server Error", [], []), None)
+        self.assertEquals(lifetime(b"200 OK", [(b'Cache-Control', b'public, max-age=2')], [b'cache-control']), 2)
+        self.assertEquals(lifetime(b"200 OK", [(b'Cache-Control', b'private')], [b'cache-control']), None)
+        self.assertEquals(lifetime(b"200 OK", [(b'Set-Cookie', b'a=b')], [b'set-cookie']), None)
+        self.assertEquals(lifetime(b"200 OK", [(b'Vary', b'Accept-Encoding')], [b'vary']), 10)
+        self.assertEquals(lifetime(b"200 OK", [(b'Vary', b'Cookie')], [b'vary']), None)
+    
+    def test_uncacheable_request(self):
+        slot = [environ(REQUEST_METHOD='POST'), None]
+        self.assertFalse(self.cache.served(self.connection, slot))
+        self.assertFalse('marrow.cache' in slot[0])
+    
+    def test_collapsed(self):
+        first, second, third = [environ(), None], [environ(), None], [environ(), None]
+        
+        self.assertFalse(self.cache.served(self.connection, first))
+        self.assertTrue(self.cache.served(self.connection, second))
+        
+        first[0]['marrow.cache.entry'] = (10, b"response")
+        self.cache.complete(first[0])
+        
+        self.assertEquals(second[1], (b"response", None))
+        self.assertEquals(len(self.cache), 1)
+        
+        self.assertTrue(self.cache.served(self.connection, third))
+        self.assertEquals(third[1], (b"response", None))
+        self.assertEquals(self.connection.dispatched, [])
+    
+    def test_not_shared(self):
+        first, second = [environ(), None], [environ(), None]
+        
+        self.cache.served(self.connection, first)
+        self.cache.served(self.connection, second)
+        self.cache.complete(first[0])
+        
+        self.assertEquals(self.connection.dispatched, [second])
+        self.assertEquals(len(self.cache), 0)
+    
+    def test_vary(self):
+        slot = [environ(HTTP_ACCEPT_ENCODING='gzip'), None]
+        self.cache.served(self.connection, slot)
+        slot[0]['marrow.cache.entry'] = (10, b"compressed")
+        self.cache.complete(slot[0])
+        
+        self.assertFalse(self.cache.served(self.connection, [environ(), None]))
+    
+    def test_cookies(self):
+        cache = self.cache
+        env = environ(HTTP_COOKIE='session=1')
+        
+        self.assertEquals(cache.capture(env, b"200 OK", [], [], [b"personal"], False), (None, [b"personal"]))
+        
+        headers = [(b'Cache-Control', b'public')]
+        self.assertEquals(cache.capture(env, b"200 OK", headers, [b'cache-control'], [b"shared"], False)[0], 10)
+        self.assertTrue(env['marrow.cache.shared'])
+        
+        # Responses stored without explicitly permitting shared caching aren't used to answer requests with cookies.
+        cache.store(cache.key(environ()), float('inf'), b"response")
+        self.assertFalse(cache.served(self.connection, [environ(HTTP_COOKIE='session=1'), None]))
+        self.assertTrue(cache.served(self.connection, [environ(), None]))
+        
+        cache.store(cache.key(environ()), float('inf'), b"response", True)
+        self.assertTrue(cache.served(self.connection, [environ(HTTP_COOKIE='session=1'), None]))
+    
+    def test_eviction(self):
+        cache = ResponseCache(size=10)
+        cache.store('a', 0, b'12345')
+        cache.store('b', 0, b'12345')
+        cache.store('c', 0, b'12345')
+        
+        self.assertEquals(list(cache.entries), ['b', 'c'])
+        self.assertEquals(cache.used, 10)
@@ -0,0 +1,50 @@
+# encoding: utf-8
+
+from unittest import TestCase
+
+from marrow.server.http.chain import ingress, egress
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+def mark(name):
+    def ingress_(env):
+        env.setdefault('order', []).append(name)
+    
+    return ingress_
+
+
+def append(name):
+    def egress_(env, status, headers, body):
+        return status, headers + [(b'X-Filter', name)], body
+    
+    return egress_
+
+
+class TestChain(TestCase):
+    def test_empty(self):
+        self.assertEquals(ingress([]), None)
+        self.assertEquals(egress(None), None)
+    
+    def test_ingress(self):
+        env = dict()
+        result = ingress([mark(1), mark(2), mark(3)])(env)
+        
+        self.assertEquals(result, None)
+        self.assertEquals(env['order'], [1, 2, 3])
+    
+    def test_egress(self):
+        filters = [append(b'1'), append(b'2')]
+        status, headers, body = egress(filters)({}, b'200 OK', [], [b'body'])
+        
+        self.assertEquals(status, b'200 OK')
+        self.assertEquals(headers, [(b'X-Filter', b'1'), (b'X-Filter', b'2')])
+        self.assertEquals(body, [b'body'])
+    
+    def test_long(self):
+        env = dict()
+        ingress([mark(i) for i in range(100)])(env)
+        
+        self.assertEquals(env['order'], list(range(100)))
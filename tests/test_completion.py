@@ -0,0 +1,82 @@
+# encoding: utf-8
+
+import select
+import threading
+
+from functools import partial
+from unittest import TestCase
+
+from marrow.server.http.completion import CompletionQueue
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class Loop(object):
+    READ = 1
+    
+    def __init__(self):
+        self.handlers = dict()
+    
+    def add_handler(self, fd, handler, events):
+        self.handlers[fd] = handler
+    
+    def remove_handler(self, fd):
+        del self.handlers[fd]
+
+
+class TestCompletionQueue(TestCase):
+    def setUp(self):
+        self.io = Loop()
+        self.queue = CompletionQueue()
+        self.queue.start(self.io)
+    
+    def tearDown(self):
+        self.queue.stop()
+    
+    def readable(self):
+        return bool(select.select([self.queue.reader], [], [], 0)[0])
+    
+    def test_registered(self):
+        self.assertEquals(list(self.io.handlers), [self.queue.reader])
+    
+    def test_batched(self):
+        results = []
+        
+        self.assertFalse(self.readable())
+        
+        for i in range(3):
+            self.queue.push(lambda i=i: results.append(i))
+        
+        self.assertTrue(self.readable())
+        self.assertEquals(results, [])
+        
+        self.queue.drain()
+        
+        self.assertEquals(results, [0, 1, 2])
+        self.assertFalse(self.readable())
+    
+    def test_threads(self):
+        results = []
+        threads = [threading.Thread(target=self.queue.push, args=(partial(results.append, i), )) for i in range(8)]
+        
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        
+        self.queue.drain()
+        self.assertEquals(sorted(results), list(range(8)))
+    
+    def test_failure(self):
+        results = []
+        
+        self.queue.push(lambda: 1 / 0)
+        self.queue.push(lambda: results.append(True))
+        self.queue.drain()
+        
+        self.assertEquals(results, [True])
+    
+    def test_stop(self):
+        self.queue.stop()
+        self.assertEquals(self.io.handlers, dict())
+        self.queue.stop()
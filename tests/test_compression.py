@@ -0,0 +1,142 @@
+# encoding: utf-8
+
+import zlib
+
+from unittest import TestCase
+from concurrent.futures import Future
+
+from marrow.server.http.compression import CompressionFilter, LRUCache
+
+
+log = __import__('logging').getLogger(__name__)
+
+TEXT = b"The quick brown fox jumps over the lazy dog. " * 100
+
+
+
+def gunzip(body):
+    return zlib.decompress(b''.join(body), 16 + zlib.MAX_WBITS)
+
+
+class Body(list):
+    closed = False
+    
+    def close(self):
+        self.closed = True
+
+
+class TestNegotiation(TestCase):
+    def setUp(self):
+        self.filter = CompressionFilter()
+    
+    def test_preference(self):
+        self.assertEquals(self.filter.negotiate('gzip, deflate, br'), 'gzip')
+        self.assertEquals(self.filter.negotiate('deflate'), 'deflate')
+        self.assertEquals(self.filter.negotiate('deflate;q=1.0, gzip;q=0.5'), 'deflate')
+    
+    def test_refused(self):
+        self.assertEquals(self.filter.negotiate(''), None)
+        self.assertEquals(self.filter.negotiate('br'), None)
+        self.assertEquals(self.filter.negotiate('gzip;q=0, deflate;q=0'), None)
+        self.assertEquals(self.filter.negotiate('*;q=0'), None)
+        self.assertEquals(self.filter.negotiate('*'), 'gzip')
+
+
+class TestCompressionFilter(TestCase):
+    def setUp(self):
+        self.filter = CompressionFilter()
+        self.env = dict(HTTP_ACCEPT_ENCODING='gzip', HTTP_HOST='localhost', PATH_INFO='/', QUERY_STRING='')
+    
+    def call(self, headers, body, **env):
+        environ = dict(self.env, **env)
+        status, headers, body = self.filter(environ, b"200 OK", headers, body)
+        return dict((i.lower(), j) for i, j in headers), body
+    
+    def test_streaming(self):
+        original = Body([TEXT, TEXT])
+        headers, body = self.call([(b'Content-Type', b'text/plain'), (b'Content-Length', b'9000')], original)
+        
+        self.assertEquals(headers[b'content-encoding'], b'gzip')
+        self.assertEquals(headers[b'vary'], b'Accept-Encoding')
+        self.assertFalse(b'content-length' in headers)
+        self.assertEquals(gunzip(body), TEXT * 2)
+        
+        body.close()
+        self.assertTrue(original.closed)
+    
+    def test_skipped(self):
+        headers, body = self.call([(b'Content-Type', b'image/png'), (b'Content-Length', b'4500')], [TEXT])
+        self.assertFalse(b'content-encoding' in headers)
+        
+        headers, body = self.call([(b'Content-Type', b'text/plain'), (b'Content-Length', b'5')], [b"Hello"])
+        self.assertFalse(b'content-encoding' in headers)
+        self.assertEquals(headers[b'content-length'], b'5')
+        
+        headers, body = self.call([(b'Content-Type', b'text/plain')], [TEXT], HTTP_ACCEPT_ENCODING='identity')
+        self.assertFalse(b'content-encoding' in headers)
+        self.assertEquals(headers[b'vary'], b'Accept-Encoding')
+    
+    def test_partial(self):
+        headers = [(b'Content-Type', b'text/plain'), (b'ETag', b'"abc"'), (b'Content-Range', b'bytes 0-999/4500'),
+                (b'Content-Length', b'1000')]
+        
+        status, result, body = self.filter(dict(self.env), b"206 Partial Content", list(headers), [TEXT[:1000]])
+        self.assertEquals(result, headers)
+        self.assertEquals(body, [TEXT[:1000]])
+        
+        status, result, body = self.filter(dict(self.env), b"200 OK", list(headers), [TEXT[:1000]])
+        self.assertEquals(result, headers)
+        self.assertEquals(len(self.filter.cache), 0)
+    
+    def test_etag_cache(self):
+        for i in range(2):
+            original = Body([TEXT])
+            headers, body = self.call([(b'Content-Type', b'text/html'), (b'ETag', b'"abc"')], original)
+            self.assertEquals(headers[b'etag'], b'W/"abc"')
+            self.assertEquals(gunzip(body), TEXT)
+        
+        # The second response is served from the cache without iterating the original body.
+        self.assertTrue(original.closed)
+        self.assertEquals(headers[b'content-length'], str(len(b''.join(body))).encode('ascii'))
+        self.assertEquals(len(self.filter.cache), 1)
+    
+    def test_hash_cache(self):
+        headers = [(b'Content-Type', b'application/json'), (b'Cache-Control', b'public, max-age=60'),
+                (b'Content-Length', b'4500')]
+        
+        for i in range(2):
+            result, body = self.call(list(headers), Body([TEXT]))
+            self.assertEquals(gunzip(body), TEXT)
+        
+        self.assertEquals(len(self.filter.cache), 1)
+        
+        self.call(list(headers), Body([TEXT]), HTTP_ACCEPT_ENCODING='deflate')
+        self.assertEquals(len(self.filter.cache), 2)
+    
+    def test_hash_asynchronous(self):
+        headers = [(b'Content-Type', b'application/json'), (b'Cache-Control', b'public, max-age=60'),
+                (b'Content-Length', b'9000')]
+        
+        pending = Future()
+        pending.set_result(TEXT)
+        original = Body([TEXT, pending])
+        result, body = self.call(headers, original)
+        
+        parts = [i if isinstance(i, bytes) else i.result() for i in body]
+        self.assertEquals(gunzip(parts), TEXT * 2)
+        
+        body.close()
+        self.assertTrue(original.closed)
+
+
+class TestLRUCache(TestCase):
+    def test_eviction(self):
+        cache = LRUCache(10)
+        cache.set('a', b'1234')
+        cache.set('b', b'1234')
+        cache.get('a')
+        cache.set('c', b'1234')
+        
+        self.assertEquals(cache.get('b'), None)
+        self.assertEquals(cache.get('a'), b'1234')
+        self.assertEquals(cache.used, 8)
@@ -2,15 +2,21 @@
 
 from __future__ import unicode_literals
 
+import os
+import zlib
+import json
+import time
 import socket
 
 from pprint import pformat
 
 from marrow.server.http.testing import HTTPTestCase, CRLF, EOH
+from marrow.server.http.compression import CompressionFilter
+from marrow.server.http.stats import Statistics
 
 from marrow.util.compat import unicode
 
-from applications import die, generator
+from applications import die, generator, wrapped, deferred, later, source, Stalled
 
 
 log = __import__('logging').getLogger(__name__)
@@ -37,3 +43,89 @@ class TestHTTPProtocolGenerator(HTTPTestCase):
         self.assertEquals(response.status, b"OK")
         self.assertEquals(response[b'content-length'], b"10")
         self.assertEquals(response.body, b"0123456789")
+
+
+class TestHTTPProtocolFileWrapper(HTTPTestCase):
+    arguments = dict(application=wrapped)
+    
+    def test_file_wrapper(self):
+        with open(source, 'rb') as fh:
+            expect = fh.read()
+        
+        response = self.request()
+        self.assertEquals(response.code, b"200")
+        self.assertEquals(response[b'content-length'], unicode(len(expect)).encode('ascii'))
+        self.assertFalse(b'transfer-encoding' in response)
+        self.assertEquals(response.body, expect)
+    
+    def test_file_wrapper_head(self):
+        response = self.request(b"HEAD")
+        self.assertEquals(response.code, b"200")
+        self.assertEquals(response[b'content-length'], unicode(os.path.getsize(source)).encode('ascii'))
+        self.assertFalse(b'transfer-encoding' in response)
+        self.assertEquals(response.body, b"")
+
+
+class TestHTTPProtocolAsynchronous(HTTPTestCase):
+    arguments = dict(application=deferred)
+    
+    def test_generator(self):
+        response = self.request()
+        self.assertEquals(response.code, b"200")
+        self.assertEquals(response[b'transfer-encoding'], b"chunked")
+        self.assertEquals(response.body, b"Hello world!")
+
+
+class TestHTTPProtocolAsynchronousFuture(HTTPTestCase):
+    arguments = dict(application=lambda request: later((b"200 OK", [(b'Content-Length', b'2')], [b"OK"])))
+    
+    def test_future(self):
+        response = self.request()
+        self.assertEquals(response.code, b"200")
+        self.assertEquals(response.body, b"OK")
+
+
+class TestHTTPProtocolDisconnect(HTTPTestCase):
+    arguments = dict(application=lambda request: (b"200 OK", [], TestHTTPProtocolDisconnect.body))
+    
+    def test_body_closed(self):
+        TestHTTPProtocolDisconnect.body = body = Stalled()
+        
+        self.client.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        self.client.read_until(EOH, self.stop)
+        self.wait()
+        
+        self.client.close()
+        self.io_loop.add_timeout(time.time() + 0.1, self.stop)
+        self.wait()
+        
+        self.assertTrue(body.closed)
+
+
+class TestHTTPProtocolCompression(HTTPTestCase):
+    arguments = dict(application=wrapped, egress=[CompressionFilter()])
+    
+    def test_compressed(self):
+        with open(source, 'rb') as fh:
+            expect = fh.read()
+        
+        response = self.request(headers=[(b'Accept-Encoding', b'gzip')])
+        self.assertEquals(response.code, b"200")
+        self.assertEquals(response[b'content-encoding'], b"gzip")
+        self.assertEquals(response[b'transfer-encoding'], b"chunked")
+        self.assertEquals(zlib.decompress(response.body, 16 + zlib.MAX_WBITS), expect)
+
+
+class TestHTTPProtocolStatistics(HTTPTestCase):
+    arguments = dict(application=wrapped, stats=Statistics(), stats_path='/_stats')
+    
+    def test_snapshot(self):
+        self.request()
+        
+        response = self.request(path=b'/_stats')
+        self.assertEquals(response.code, b"200")
+        self.assertEquals(response[b'content-type'], b"application/json")
+        
+        snapshot = json.loads(response.body.decode('ascii'))
+        self.assertEquals(snapshot['phases']['application']['count'], 1)
+        self.assertTrue(snapshot['sent'] > 0)
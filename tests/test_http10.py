@@ -1,11 +1,13 @@
 # encoding: utf-8
 
+import sys
 import socket
 
 from functools import partial
 from pprint import pformat
+from unittest import skipIf
 
-from marrow.server.http.testing import HTTPTestCase, CRLF, EOH
+from marrow.server.http.testing import HTTPTestCase, AsyncioHTTPTestCase, CRLF, EOH
 
 from marrow.util.compat import unicode
 
@@ -51,7 +53,7 @@ class TestHTTP10Protocol(HTTPTestCase):
                 'wsgi.url_scheme': 'http',
                 'wsgi.version': (2, 0),
                 'REQUEST_URI': b'/',
-                'wsgi.async': False,
+                'wsgi.async': True,
                 'wsgi.uri_encoding': 'utf8'
             }
         
@@ -70,3 +72,8 @@ class TestHTTP10Protocol(HTTPTestCase):
         two = self.request(protocol=b"HTTP/1.0", headers=[(b'Connection', b'keep-alive')])
         
         self.assertEquals(one, two)
+
+
+@skipIf(sys.version_info < (3, 7), "The asyncio backend requires Python 3.7 or later.")
+class TestAsyncioHTTP10Protocol(AsyncioHTTPTestCase, TestHTTP10Protocol):
+    pass
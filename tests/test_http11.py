@@ -1,11 +1,13 @@
 # encoding: utf-8
 
+import sys
 import socket
 
 from functools import partial
 from pprint import pformat
+from unittest import skipIf
 
-from marrow.server.http.testing import HTTPTestCase, CRLF, EOH
+from marrow.server.http.testing import HTTPTestCase, AsyncioHTTPTestCase, Response, CRLF, EOH
 
 from marrow.util.compat import unicode
 
@@ -59,7 +61,7 @@ class TestHTTP11Protocol(HTTPTestCase):
                 'wsgi.url_scheme': 'http',
                 'wsgi.version': (2, 0),
                 'REQUEST_URI': b'http://localhost/',
-                'wsgi.async': False,
+                'wsgi.async': True,
                 'wsgi.uri_encoding': 'utf8'
             }
         
@@ -114,7 +116,7 @@ class TestChunkedHTTP11Protocol(HTTPTestCase):
                 'wsgi.url_scheme': 'http',
                 'wsgi.version': (2, 0),
                 'REQUEST_URI': b'http://localhost/',
-                'wsgi.async': False,
+                'wsgi.async': True,
                 'wsgi.uri_encoding': 'utf8'
             }
         
@@ -156,7 +158,7 @@ class TestHTTP11BodyProtocol(HTTPTestCase):
                 'wsgi.url_scheme': 'http',
                 'wsgi.version': (2, 0),
                 'REQUEST_URI': b'http://localhost/',
-                'wsgi.async': False,
+                'wsgi.async': True,
                 'wsgi.uri_encoding': 'utf8',
                 'wsgi.input': b"Hello world!"
             }
@@ -195,9 +197,70 @@ class TestHTTP11BodyProtocol(HTTPTestCase):
                 'wsgi.url_scheme': 'http',
                 'wsgi.version': (2, 0),
                 'REQUEST_URI': b'http://localhost/',
-                'wsgi.async': False,
+                'wsgi.async': True,
                 'wsgi.uri_encoding': 'utf8',
                 'wsgi.input': b'Hello world!'
             }
         
         self.assertEquals(request, expect)
+    
+    def test_negative_length(self):
+        response = self.request(b"PUT", headers=[(b'Content-Length', b"-5")])
+        self.assertEquals(response.code, b"400")
+    
+    def test_signed_length(self):
+        response = self.request(b"PUT", headers=[(b'Content-Length', b"+5")], body=[b"Hello"])
+        self.assertEquals(response.code, b"400")
+
+
+class TestStreamingHTTP11Protocol(HTTPTestCase):
+    arguments = dict(application=consume, threaded=2, streaming=True)
+    
+    def test_malformed_chunk(self):
+        consumed['finished'].clear()
+        
+        self.client.set_close_callback(self.stop)
+        self.client.write(b"PUT / HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n"
+                b"5\r\nHello\r\nzz\r\n")
+        self.wait()
+        
+        # The application, already reading the body, is woken rather than left waiting for the remainder.
+        self.assertTrue(consumed['finished'].wait(5))
+        self.assertTrue(isinstance(consumed['error'], IOError))
+
+
+class TestPipelinedHTTP11Protocol(HTTPTestCase):
+    arguments = dict(application=partial(echo, False))
+    
+    def test_pipelined(self):
+        self.client.write(b"GET /one HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                b"GET /two HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                b"GET /three HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        
+        for path in ('/one', '/two', '/three'):
+            self.client.read_until(EOH, self.stop)
+            response = Response(self.wait(), b"")
+            self.assertEquals(response.code, b"200")
+            
+            self.client.read_bytes(int(response[b'content-length']), self.stop)
+            self.assertEquals(eval(self.wait())['PATH_INFO'], path)
+
+
+@skipIf(sys.version_info < (3, 7), "The asyncio backend requires Python 3.7 or later.")
+class TestAsyncioHTTP11Protocol(AsyncioHTTPTestCase, TestHTTP11Protocol):
+    pass
+
+
+@skipIf(sys.version_info < (3, 7), "The asyncio backend requires Python 3.7 or later.")
+class TestAsyncioChunkedHTTP11Protocol(AsyncioHTTPTestCase, TestChunkedHTTP11Protocol):
+    pass
+
+
+@skipIf(sys.version_info < (3, 7), "The asyncio backend requires Python 3.7 or later.")
+class TestAsyncioHTTP11BodyProtocol(AsyncioHTTPTestCase, TestHTTP11BodyProtocol):
+    pass
+
+
+@skipIf(sys.version_info < (3, 7), "The asyncio backend requires Python 3.7 or later.")
+class TestAsyncioPipelinedHTTP11Protocol(AsyncioHTTPTestCase, TestPipelinedHTTP11Protocol):
+    pass
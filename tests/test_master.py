@@ -0,0 +1,107 @@
+# encoding: utf-8
+
+import gc
+import os
+import sys
+import time
+import signal
+import threading
+
+from unittest import TestCase
+
+from marrow.server.http.master import Master, processors, memory, resident
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class TestProcessors(TestCase):
+    def test_count(self):
+        available = processors()
+        
+        self.assertTrue(available >= 1)
+        self.assertEquals(processors(0), available)
+        self.assertEquals(processors(3), 3)
+        self.assertEquals(processors(-available), 1)
+
+
+class TestMemory(TestCase):
+    def test_memory(self):
+        usage = memory()
+        
+        if usage is None:
+            return # Not Linux.
+        
+        self.assertTrue(usage['rss'] > 0)
+        self.assertEquals(usage['rss'], usage['shared'] + usage['private'])
+        self.assertEquals(memory(2 ** 30), None)
+        self.assertTrue(resident() > 0)
+
+
+class TestMaster(TestCase):
+    def test_workers(self):
+        reader, writer = os.pipe()
+        
+        def target(index):
+            os.write(writer, str(index).encode('ascii'))
+        
+        master = Master(target, 3, affinity=True)
+        master.run()
+        os.close(writer)
+        
+        self.assertEquals(master.workers, dict())
+        self.assertEquals(sorted(os.read(reader, 16).decode('ascii')), ['0', '1', '2'])
+        os.close(reader)
+    
+    def test_stop(self):
+        def target(index):
+            time.sleep(30)
+        
+        master = Master(target, 2)
+        threading.Timer(0.2, os.kill, (os.getpid(), signal.SIGTERM)).start()
+        
+        started = time.time()
+        master.run()
+        
+        self.assertTrue(time.time() - started < 10)
+        self.assertTrue(master.stopping)
+        self.assertEquals(master.workers, dict())
+    
+    def test_freeze(self):
+        if not hasattr(gc, 'freeze'):
+            return
+        
+        reader, writer = os.pipe()
+        
+        def target(index):
+            os.write(writer, str((gc.isenabled(), gc.get_threshold()[2] > 1000000)).encode('ascii'))
+        
+        gc.disable()
+        
+        try:
+            Master(target, 1, freeze=True, full_collections=False).run()
+            self.assertTrue(gc.get_freeze_count() > 0)
+        
+        finally:
+            gc.unfreeze()
+            gc.enable()
+            os.close(writer)
+        
+        self.assertEquals(os.read(reader, 64), b"(True, True)")
+        os.close(reader)
+    
+    def test_restart(self):
+        reader, writer = os.pipe()
+        
+        def target(index):
+            os.write(writer, b'.')
+        
+        master = Master(target, 1, restart=True)
+        master.minimum = 0.05
+        threading.Timer(0.5, os.kill, (os.getpid(), signal.SIGTERM)).start()
+        master.run()
+        os.close(writer)
+        
+        self.assertTrue(len(os.read(reader, 1024)) > 1)
+        os.close(reader)
@@ -0,0 +1,105 @@
+# encoding: utf-8
+
+from __future__ import unicode_literals
+
+from unittest import TestCase
+
+from marrow.server.http.parser import HeadParser, ParseError
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class TestHeadParser(TestCase):
+    def setUp(self):
+        self.parser = HeadParser('utf8', max_headers=4, max_size=256)
+    
+    def parse(self, head):
+        return self.parser(head, dict())
+    
+    def test_request_line(self):
+        environ = self.parse(b"GET /foo%20bar;baz?q=1#top HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        
+        self.assertEquals(environ['REQUEST_METHOD'], 'GET')
+        self.assertEquals(environ['REQUEST_URI'], b'/foo%20bar;baz?q=1#top')
+        self.assertEquals(environ['SERVER_PROTOCOL'], 'HTTP/1.1')
+        self.assertEquals(environ['PATH_INFO'], '/foo bar')
+        self.assertEquals(environ['PARAMETERS'], 'baz')
+        self.assertEquals(environ['QUERY_STRING'], 'q=1')
+        self.assertEquals(environ['FRAGMENT'], 'top')
+        self.assertEquals(environ['wsgi.uri_encoding'], 'utf8')
+        self.assertEquals(environ['HTTP_HOST'], 'localhost')
+        self.assertEquals(environ['CONTENT_LENGTH'], None)
+        self.assertEquals(environ['CONTENT_TYPE'], None)
+    
+    def test_absolute_uri(self):
+        environ = self.parse(b"GET https://example.com/ HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        
+        self.assertEquals(environ['wsgi.url_scheme'], 'https')
+        self.assertEquals(environ['HTTP_HOST'], 'example.com')
+        self.assertEquals(environ['PATH_INFO'], '/')
+    
+    def test_head(self):
+        environ = self.parse(b"HEAD / HTTP/1.0\r\n\r\n")
+        
+        self.assertEquals(environ['REQUEST_METHOD'], 'GET')
+        self.assertEquals(environ['marrow.head'], True)
+    
+    def test_fallback_encoding(self):
+        environ = self.parse(b"GET /caf%E9 HTTP/1.1\r\n\r\n")
+        
+        self.assertEquals(environ['wsgi.uri_encoding'], 'iso-8859-1')
+        self.assertEquals(environ['PATH_INFO'], '/caf\xe9')
+    
+    def test_headers(self):
+        environ = self.parse(b"POST / HTTP/1.1\r\nContent-Type: text/plain\r\ncontent-length:  12 \r\nX-Custom-Header: yes\r\n\r\n")
+        
+        self.assertEquals(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEquals(environ['CONTENT_LENGTH'], '12')
+        self.assertEquals(environ['HTTP_X_CUSTOM_HEADER'], 'yes')
+    
+    def test_repeated_headers(self):
+        environ = self.parse(b"GET / HTTP/1.1\r\nAccept: text/html\r\nAccept: text/plain\r\nCookie: a=1\r\nCookie: b=2\r\n\r\n")
+        
+        self.assertEquals(environ['HTTP_ACCEPT'], 'text/html, text/plain')
+        self.assertEquals(environ['HTTP_COOKIE'], 'a=1; b=2')
+    
+    def test_continuation(self):
+        environ = self.parse(b"GET / HTTP/1.1\r\nX-Folded: one\r\n  two\r\n\tthree\r\n\r\n")
+        self.assertEquals(environ['HTTP_X_FOLDED'], 'one two three')
+    
+    def test_bad_continuation(self):
+        self.assertRaises(ParseError, self.parse, b"GET / HTTP/1.1\r\n folded: no\r\n\r\n")
+    
+    def test_malformed(self):
+        self.assertRaises(ParseError, self.parse, b"GET /\r\n\r\n")
+        self.assertRaises(ParseError, self.parse, b"GET / HTTP/1.1\r\nNo-Colon\r\n\r\n")
+        self.assertRaises(ParseError, self.parse, b"GET / HTTP/1.1\r\nSpace : before\r\n\r\n")
+    
+    def test_limits(self):
+        try:
+            self.parse(b"GET / HTTP/1.1\r\n" + b"A: b\r\n" * 5 + b"\r\n")
+        
+        except ParseError as e:
+            self.assertEquals(e.status, b"431 Request Header Fields Too Large")
+        
+        else:
+            self.fail("Header count limit not enforced.")
+        
+        try:
+            self.parse(b"GET / HTTP/1.1\r\nA: " + b"b" * 256 + b"\r\n\r\n")
+        
+        except ParseError as e:
+            self.assertEquals(e.status, b"431 Request Header Fields Too Large")
+        
+        else:
+            self.fail("Header size limit not enforced.")
+    
+    def test_key_cache(self):
+        self.parser.cache_size = 1
+        
+        self.parse(b"GET / HTTP/1.1\r\nX-One: 1\r\nX-Two: 2\r\n\r\n")
+        
+        self.assertTrue('x-one' in self.parser.keys)
+        self.assertFalse('x-two' in self.parser.keys)
@@ -0,0 +1,87 @@
+# encoding: utf-8
+
+import os
+
+from io import BytesIO
+from unittest import TestCase
+
+from marrow.server.http import pool
+from marrow.server.http.pool import ProcessPool, compose
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+def echo(env):
+    body = env['wsgi.input'].read()
+    env['wsgi.errors'].write("logged\n")
+    return b'200 OK', [(b'Content-Type', b'text/plain')], iter([str(os.getpid()).encode('ascii'), b':', body])
+
+
+def unsent(env):
+    return b'200 OK', [], [','.join(sorted(i for i in env if i.startswith('x.'))).encode('ascii')]
+
+
+class TestCompose(TestCase):
+    def setUp(self):
+        self.previous, pool.application = pool.application, echo
+    
+    def tearDown(self):
+        pool.application = self.previous
+    
+    def test_body(self):
+        status, headers, body = compose(dict(), b'hello')
+        
+        self.assertEquals(status, b'200 OK')
+        self.assertEquals(headers, [(b'Content-Type', b'text/plain')])
+        self.assertEquals(body, [str(os.getpid()).encode('ascii') + b':hello'])
+    
+    def test_asynchronous(self):
+        pool.application = lambda env: None
+        self.assertRaises(TypeError, compose, dict(), b'')
+
+
+class TestProcessPool(TestCase):
+    def test_roundtrip(self):
+        processes = ProcessPool(2)
+        processes.start(echo)
+        
+        try:
+            input_ = BytesIO(b'hello')
+            status, headers, body = processes.submit({'wsgi.input': input_}).result(10)
+        
+        finally:
+            processes.stop()
+        
+        pid, _, data = body[0].partition(b':')
+        
+        self.assertEquals(status, b'200 OK')
+        self.assertEquals(data, b'hello')
+        self.assertNotEqual(int(pid), os.getpid())
+        self.assertEquals(input_.read(), b'hello')
+    
+    def test_eager(self):
+        processes = ProcessPool(2)
+        processes.start(echo)
+        
+        try:
+            # Processes are started before any request is submitted.
+            self.assertTrue(len(processes.executor._processes) >= 1)
+            self.assertTrue(all(i.is_alive() for i in processes.executor._processes.values()))
+        
+        finally:
+            processes.stop()
+    
+    def test_unsendable(self):
+        processes = ProcessPool(1)
+        processes.start(unsent)
+        
+        try:
+            env = {'wsgi.input': BytesIO(), 'x.text': 'a', 'x.tuple': ('b', 1), 'x.object': object(), 'x.lambda': len}
+            status, headers, body = processes.submit(env).result(10)
+        
+        finally:
+            processes.stop()
+        
+        self.assertEquals(body, [b'x.text,x.tuple'])
@@ -0,0 +1,93 @@
+# encoding: utf-8
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+
+from unittest import TestCase
+
+from marrow.server.http.profiler import Profiler
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+def busy(finished):
+    while not finished.is_set():
+        sum(range(1000))
+
+
+class TestProfiler(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = Profiler(self.directory, rate=500, signal=None)
+    
+    def tearDown(self):
+        self.profiler.uninstall()
+        shutil.rmtree(self.directory)
+    
+    def test_idle(self):
+        self.assertEquals(self.profiler.stop(), None)
+        self.assertFalse(self.profiler.running)
+    
+    def test_sample(self):
+        finished = threading.Event()
+        worker = threading.Thread(target=busy, args=(finished, ), name="worker")
+        worker.start()
+        
+        try:
+            self.assertTrue(self.profiler.start())
+            self.assertFalse(self.profiler.start())
+            time.sleep(0.1)
+            path = self.profiler.stop()
+        
+        finally:
+            finished.set()
+            worker.join()
+        
+        self.assertTrue(self.profiler.samples > 0)
+        self.assertEquals(os.path.dirname(path), self.directory)
+        
+        with open(path) as fh:
+            lines = fh.read().splitlines()
+        
+        sampled = [line.rpartition(' ') for line in lines if line.startswith('worker;')]
+        self.assertTrue(any(stack.split(';')[-1].startswith('busy (') for stack, _, count in sampled))
+        self.assertEquals(sum(int(count) for stack, _, count in sampled), self.profiler.samples)
+        self.assertFalse(any('marrow.server.http.profiler' in line for line in lines))
+    
+    def test_signal(self):
+        import signal
+        
+        self.profiler.signal = signal.SIGUSR2
+        self.profiler.install()
+        
+        os.kill(os.getpid(), signal.SIGUSR2)
+        self.assertTrue(self.profiler.running)
+        
+        time.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGUSR2)
+        self.assertFalse(self.profiler.running)
+        self.assertTrue(self.profiler.written)
+    
+    def test_control(self):
+        state = self.profiler.control(dict(QUERY_STRING='start'))
+        self.assertTrue(state['running'])
+        self.assertEquals(state['pid'], os.getpid())
+        
+        time.sleep(0.05)
+        
+        state = self.profiler.control(dict(QUERY_STRING='stop'))
+        self.assertFalse(state['running'])
+        self.assertTrue(os.path.exists(state['written']))
+    
+    def test_duration(self):
+        self.profiler.duration = 0.05
+        self.profiler.start()
+        self.profiler.thread.join(5)
+        
+        self.assertFalse(self.profiler.running)
+        self.assertTrue(self.profiler.written)
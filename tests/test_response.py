@@ -0,0 +1,36 @@
+# encoding: utf-8
+
+from unittest import TestCase
+
+from marrow.server.http.response import ResponseHead
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class TestResponseHead(TestCase):
+    def setUp(self):
+        self.head = ResponseHead(b'test')
+    
+    def test_complete(self):
+        head = self.head("HTTP/1.1", b"200 OK", [(b'Content-Length', b'2')], chunked=True)
+        lines = head.split(b"\r\n")
+        
+        self.assertEquals(lines[0], b"HTTP/1.1 200 OK")
+        self.assertEquals(lines[1], b"Content-Length: 2")
+        self.assertEquals(lines[2], b"Server: test")
+        self.assertTrue(lines[3].startswith(b"Date: "))
+        self.assertEquals(lines[4], b"Transfer-Encoding: chunked")
+        self.assertEquals(lines[5:], [b"", b""])
+    
+    def test_suppressed(self):
+        head = self.head("HTTP/1.0", b"404 Not Found", [(b'Server', b'app'), (b'Date', b'now')], False, False)
+        self.assertEquals(head, b"HTTP/1.0 404 Not Found\r\nServer: app\r\nDate: now\r\n\r\n")
+    
+    def test_prefix_cache(self):
+        self.head.cache_size = 1
+        
+        self.assertEquals(self.head.prefix("HTTP/1.1", b"200 OK"), b"HTTP/1.1 200 OK\r\n")
+        self.assertEquals(self.head.prefix("HTTP/1.1", b"204 No Content"), b"HTTP/1.1 204 No Content\r\n")
+        self.assertEquals(list(self.head.prefixes), [("HTTP/1.1", b"200 OK")])
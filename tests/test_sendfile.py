@@ -0,0 +1,87 @@
+# encoding: utf-8
+
+import socket
+import tempfile
+
+from unittest import TestCase, skipIf
+
+from marrow.server.http.sendfile import SendFile, sendfile
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class Client(object):
+    """A stand-in for an IOStream, writing nothing itself."""
+    
+    def __init__(self, sock):
+        self.socket = sock
+        self.writes = []
+        self._closed = False
+    
+    def write(self, data, callback=None):
+        self.writes.append(data)
+    
+    def closed(self):
+        return self._closed
+    
+    def close(self):
+        self._closed = True
+
+
+class Protocol(object):
+    stats = None
+
+
+class Connection(object):
+    protocol = Protocol()
+    
+    def __init__(self, client):
+        self.client = client
+        self.sent = 0
+        self.finished = False
+    
+    def finish(self):
+        self.finished = True
+
+
+class Body(object):
+    closed = False
+    
+    def close(self):
+        self.closed = True
+
+
+@skipIf(sendfile is None, "The sendfile system call is unavailable.")
+class TestSendFile(TestCase):
+    def setUp(self):
+        self.file = tempfile.TemporaryFile()
+        self.file.write(b"x" * 1024 * 1024)
+        self.file.flush()
+        
+        self.local, self.remote = socket.socketpair()
+        self.local.setblocking(False)
+        
+        self.client = Client(self.local)
+        self.connection = Connection(self.client)
+        self.body = Body()
+    
+    def tearDown(self):
+        self.file.close()
+        self.local.close()
+        self.remote.close()
+    
+    def test_disconnect(self):
+        writer = SendFile(self.connection, self.body, self.file.fileno(), 0, 1024 * 1024, None, blksize=4096)
+        
+        writer()
+        self.assertEquals(self.connection.sent, 4096)
+        
+        # The peer goes away without reading what was sent; the remainder can't be delivered.
+        self.remote.close()
+        writer()
+        
+        self.assertTrue(self.body.closed)
+        self.assertTrue(self.client.closed())
+        self.assertFalse(self.connection.finished)
@@ -0,0 +1,115 @@
+# encoding: utf-8
+
+import os
+import time
+import shutil
+import tempfile
+
+from unittest import TestCase
+
+from marrow.server.http.static import Static, FileCache
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+def environ(path, **kw):
+    env = dict(REQUEST_METHOD='GET', PATH_INFO=path)
+    env.update(kw)
+    return env
+
+
+class TestStatic(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        
+        with open(os.path.join(self.root, 'index.html'), 'wb') as fh:
+            fh.write(b"<h1>Hello</h1>")
+        
+        with open(os.path.join(self.root, 'large.bin'), 'wb') as fh:
+            fh.write(b"x" * 100000)
+        
+        self.static = Static(self.root, prefix='/static', application=lambda env: (b"200 OK", [], [b"app"]))
+    
+    def tearDown(self):
+        self.static.cache.clear()
+        shutil.rmtree(self.root)
+    
+    def headers(self, response):
+        return dict((i.lower(), j) for i, j in response[1])
+    
+    def test_small(self):
+        status, headers, body = self.static(environ('/static/index.html'))
+        self.assertEquals(status, b"200 OK")
+        self.assertEquals(body, [b"<h1>Hello</h1>"])
+        self.assertEquals(dict(headers)[b'Content-Type'], b"text/html")
+    
+    def test_index(self):
+        self.assertEquals(self.static(environ('/static/'))[2], [b"<h1>Hello</h1>"])
+        self.assertEquals(self.static(environ('/static'))[2], [b"<h1>Hello</h1>"])
+    
+    def test_large(self):
+        status, headers, body = self.static(environ('/static/large.bin'))
+        self.assertEquals(self.headers((status, headers))[b'content-length'], b"100000")
+        self.assertEquals(body.tell(), 0)
+        self.assertEquals(b''.join(body), b"x" * 100000)
+        
+        entry = body.entry
+        self.assertEquals(entry.users, 1)
+        body.close()
+        self.assertEquals(entry.users, 0)
+    
+    def test_fallback(self):
+        self.assertEquals(self.static(environ('/other'))[2], [b"app"])
+        self.assertEquals(self.static(environ('/static/missing'))[2], [b"app"])
+        self.assertEquals(self.static(environ('/static/../' + os.path.basename(self.root) + '/index.html'))[2], [b"app"])
+    
+    def test_not_modified(self):
+        etag = self.headers(self.static(environ('/static/index.html')))[b'etag'].decode('ascii')
+        
+        self.assertEquals(self.static(environ('/static/index.html', HTTP_IF_NONE_MATCH=etag))[0], b"304 Not Modified")
+        self.assertEquals(self.static(environ('/static/index.html', HTTP_IF_NONE_MATCH='W/' + etag))[0], b"304 Not Modified")
+        self.assertEquals(self.static(environ('/static/index.html', HTTP_IF_NONE_MATCH='"other"'))[0], b"200 OK")
+        
+        since = 'Sat, 01 Jan 2050 00:00:00 GMT'
+        self.assertEquals(self.static(environ('/static/index.html', HTTP_IF_MODIFIED_SINCE=since))[0], b"304 Not Modified")
+    
+    def test_range(self):
+        status, headers, body = self.static(environ('/static/index.html', HTTP_RANGE='bytes=4-8'))
+        self.assertEquals(status, b"206 Partial Content")
+        self.assertEquals(self.headers((status, headers))[b'content-range'], b"bytes 4-8/14")
+        self.assertEquals(body, [b"Hello"])
+        
+        status, headers, body = self.static(environ('/static/large.bin', HTTP_RANGE='bytes=-10'))
+        self.assertEquals(self.headers((status, headers))[b'content-range'], b"bytes 99990-99999/100000")
+        self.assertEquals(body.tell(), 99990)
+        body.close()
+        
+        self.assertEquals(self.static(environ('/static/index.html', HTTP_RANGE='bytes=100-'))[0], b"416 Range Not Satisfiable")
+        self.assertEquals(self.static(environ('/static/index.html', HTTP_RANGE='bytes=0-1,4-5'))[0], b"200 OK")
+        self.assertEquals(self.static(environ('/static/index.html', HTTP_RANGE='bytes=4-8', HTTP_IF_RANGE='"stale"'))[0], b"200 OK")
+
+
+class TestFileCache(TestCase):
+    def test_invalidation(self):
+        handle, path = tempfile.mkstemp()
+        os.write(handle, b"before")
+        os.close(handle)
+        
+        try:
+            cache = FileCache(valid=0)
+            entry = cache.acquire(path)
+            cache.release(entry)
+            self.assertEquals(entry.content, b"before")
+            
+            with open(path, 'wb') as fh:
+                fh.write(b"after!!")
+            
+            os.utime(path, (time.time() + 10, time.time() + 10))
+            
+            self.assertEquals(cache.acquire(path).content, b"after!!")
+            self.assertTrue(entry.retired)
+        
+        finally:
+            os.unlink(path)
@@ -0,0 +1,84 @@
+# encoding: utf-8
+
+from unittest import TestCase
+
+from marrow.server.http.stats import Statistics, Histogram, LoggingSink
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class TestHistogram(TestCase):
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertEquals(histogram.percentile(0.5), None)
+        self.assertEquals(histogram.snapshot()['mean'], None)
+    
+    def test_percentiles(self):
+        histogram = Histogram()
+        
+        for i in range(99):
+            histogram.record(0.0001)
+        
+        histogram.record(0.5)
+        
+        self.assertEquals(histogram.count, 100)
+        self.assertEquals(histogram.percentile(0.5), 128 / 1000000.0)
+        self.assertEquals(histogram.percentile(1.0), 524288 / 1000000.0)
+        
+        snapshot = histogram.snapshot()
+        self.assertEquals(snapshot['p50'], 0.128)
+        self.assertEquals(snapshot['buckets'], [[0.128, 99], [524.288, 1]])
+    
+    def test_overflow(self):
+        histogram = Histogram()
+        histogram.record(3600)
+        self.assertEquals(histogram.percentile(0.5), float('inf'))
+
+
+class TestStatistics(TestCase):
+    def test_record(self):
+        stats = Statistics()
+        stats.record([1.0, 1.5, 2.0, 2.5, 3.5, 4.0], 5.0)
+        
+        phases = stats.snapshot()['phases']
+        
+        for name in ('parse', 'receive', 'queue', 'application', 'write', 'total'):
+            self.assertEquals(phases[name]['count'], 1)
+        
+        self.assertEquals(phases['application']['mean'], 1000.0)
+        self.assertEquals(phases['total']['mean'], 4000.0)
+    
+    def test_record_partial(self):
+        stats = Statistics()
+        stats.record([1.0, 1.5, 2.0, None, None, 4.0], 5.0)
+        
+        phases = stats.snapshot()['phases']
+        self.assertEquals(phases['receive']['count'], 1)
+        self.assertEquals(phases['queue']['count'], 0)
+        self.assertEquals(phases['application']['count'], 0)
+        self.assertEquals(phases['write']['count'], 1)
+    
+    def test_flush(self):
+        snapshots = []
+        
+        def broken(snapshot):
+            raise ValueError()
+        
+        stats = Statistics([broken, snapshots.append])
+        stats.requests += 2
+        stats.flush()
+        
+        self.assertEquals(len(snapshots), 1)
+        self.assertEquals(snapshots[0]['requests'], 2)
+    
+    def test_logging_sink(self):
+        records = []
+        sink = LoggingSink()
+        sink.logger.log = lambda level, message: records.append(message)
+        
+        sink(Statistics().snapshot())
+        
+        self.assertEquals(len(records), 1)
+        self.assertTrue(records[0].startswith('{'))
@@ -0,0 +1,54 @@
+# encoding: utf-8
+
+from unittest import TestCase
+
+from marrow.server.http.timer import TimerWheel
+
+
+log = __import__('logging').getLogger(__name__)
+
+
+
+class TestTimerWheel(TestCase):
+    def setUp(self):
+        self.wheel = TimerWheel(1, 8)
+        self.expired = []
+    
+    def advance(self, ticks):
+        for i in range(ticks):
+            self.wheel.advance()
+    
+    def test_expiry(self):
+        self.wheel.schedule(3, lambda: self.expired.append(3))
+        self.wheel.schedule(1, lambda: self.expired.append(1))
+        
+        self.advance(2)
+        self.assertEquals(self.expired, [1])
+        
+        self.advance(2)
+        self.assertEquals(self.expired, [1, 3])
+        self.assertEquals(len(self.wheel), 0)
+    
+    def test_rounds(self):
+        self.wheel.schedule(20, lambda: self.expired.append(20))
+        
+        self.advance(20)
+        self.assertEquals(self.expired, [])
+        
+        self.advance(1)
+        self.assertEquals(self.expired, [20])
+    
+    def test_cancel(self):
+        timeout = self.wheel.schedule(1, lambda: self.expired.append(1))
+        self.wheel.cancel(timeout)
+        self.wheel.cancel(timeout)
+        
+        self.advance(8)
+        self.assertEquals(self.expired, [])
+    
+    def test_failure(self):
+        self.wheel.schedule(1, lambda: 1 / 0)
+        self.wheel.schedule(1, lambda: self.expired.append(1))
+        
+        self.advance(2)
+        self.assertEquals(self.expired, [1])